@@ -0,0 +1,74 @@
+import sys
+import json
+from typing import List, Dict
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float = 1.2, min_seconds: float = 0.005)-> List:
+    """
+    Compares two benchmark result files stage by stage.
+
+    Args:
+        baseline (Dict): Results of `run_benchmarks.py` for the reference commit.
+        candidate (Dict): Results for the commit under test.
+        threshold (float): Wall time or peak memory ratio above which a stage is a regression.
+        min_seconds (float): Stages faster than this in both runs are too noisy to be flagged.
+
+    Returns:
+        List: One row per stage found in both files with the wall time and memory ratios
+        and whether the stage regressed.
+    """
+    baseline_scenarios = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    rows = []
+
+    for scenario in candidate['scenarios']:
+        if scenario['name'] not in baseline_scenarios:
+            continue
+
+        baseline_stages = baseline_scenarios[scenario['name']]['stages']
+
+        for stage, measures in scenario['stages'].items():
+            if stage not in baseline_stages:
+                continue
+
+            old, new = baseline_stages[stage], measures
+            time_ratio = new['wall_seconds'] / old['wall_seconds'] if old['wall_seconds'] else None
+
+            memory_ratio = None
+            if old.get('peak_bytes') and new.get('peak_bytes') is not None:
+                memory_ratio = new['peak_bytes'] / old['peak_bytes']
+
+            slower = (time_ratio is not None and time_ratio > threshold
+                      and max(old['wall_seconds'], new['wall_seconds']) >= min_seconds)
+            heavier = memory_ratio is not None and memory_ratio > threshold
+
+            rows.append({"scenario": scenario['name'],
+                         "stage": stage,
+                         "baseline_seconds": old['wall_seconds'],
+                         "candidate_seconds": new['wall_seconds'],
+                         "time_ratio": time_ratio,
+                         "memory_ratio": memory_ratio,
+                         "regression": slower or heavier})
+
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python benchmarks/compare_benchmarks.py <baseline.json> <candidate.json> [threshold]")
+        sys.exit(2)
+
+    with open(sys.argv[1], 'r') as f:
+        baseline = json.load(f)
+    with open(sys.argv[2], 'r') as f:
+        candidate = json.load(f)
+
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 1.2
+    rows = compare(baseline, candidate, threshold)
+
+    for row in rows:
+        time_ratio = f"{row['time_ratio']:6.2f}x" if row['time_ratio'] is not None else "      -"
+        memory_ratio = f"{row['memory_ratio']:6.2f}x" if row['memory_ratio'] is not None else "      -"
+        flag = "REGRESSION" if row['regression'] else ""
+        print(f"{row['scenario']:<16}{row['stage']:<28}{row['baseline_seconds'] * 1000:10.2f} ms {row['candidate_seconds'] * 1000:10.2f} ms {time_ratio} {memory_ratio} {flag}")
+
+    sys.exit(1 if any(row['regression'] for row in rows) else 0)
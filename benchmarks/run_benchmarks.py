@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from typing import List, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import cv2
+from benchmarks.synthetic import generate_dataset
+from utils.annotation_index import AnnotationIndex
+from utils.helper import append_to_coco, save_results
+from utils.tile_selector import TileSelector, crop_tiles
+
+
+STAGES = ["tile_image", "group_polygons", "identify_informative_tiles", "crop_tiles", "append_to_coco", "save_results"]
+
+
+def run_stages(image: np.ndarray, image_annotations: List, file_name: str, scenario: Dict, tiles_dir: str, clock)-> Dict:
+    """
+    Runs the tiling stages of one image, measuring each of them with `clock`.
+
+    `clock` is a context manager factory taking the stage name, used either to time the
+    stages or to trace their peak memory.
+    """
+    selector = TileSelector(image=None,
+                            tile_size=scenario['tile_size'],
+                            stride=scenario['stride'],
+                            image_annotations=image_annotations,
+                            polygon_visibility_threshold=scenario.get('polygon_visibility_threshold', 0.8),
+                            image_size=image.shape[:2],
+                            selection_mode=scenario.get('selection_mode', 'greedy'),
+                            time_budget=scenario.get('selection_time_budget', 1.0),
+                            candidate_mode=scenario.get('candidate_mode', 'grid'))
+
+    # The private stages are reached through their mangled names to time them separately
+    with clock("tile_image"):
+        tiles = selector._TileSelector__tile_image()
+    with clock("group_polygons"):
+        tiles_annotations = selector._TileSelector__group_polygons(tiles)
+    with clock("identify_informative_tiles"):
+        selected_ids = set(selector._TileSelector__indentify_informative_tiles([tile_annotations['tile_id'] for tile_annotations in tiles_annotations],
+                                                                               [tile_annotations['selected_annotation_ids'] for tile_annotations in tiles_annotations]))
+
+    entry = {"tiles": [tile for tile in tiles if tile['id'] in selected_ids],
+             "tiles_annotations": [tile_annotations for tile_annotations in tiles_annotations if tile_annotations['tile_id'] in selected_ids]}
+
+    with clock("crop_tiles"):
+        entry['tiles'] = crop_tiles(image, entry['tiles'])
+    with clock("append_to_coco"):
+        append_to_coco(coco_data={"images": [], "annotations": [], "categories": []}, entry=entry, file_name=file_name)
+    with clock("save_results"):
+        save_results(output_dir=tiles_dir, entry=entry, file_name=file_name)
+
+    return {"candidate_tiles": len(tiles),
+            "selected_tiles": len(entry['tiles']),
+            "gain_evaluations": selector.selection_stats.get("gain_evaluations", 0)}
+
+
+class StageTimer():
+
+    def __init__(self)-> None:
+
+        self.seconds = {stage: 0.0 for stage in STAGES}
+
+    def __call__(self, stage: str)-> "StageTimer":
+
+        self.stage = stage
+        return self
+
+    def __enter__(self)-> None:
+
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info)-> None:
+
+        self.seconds[self.stage] += time.perf_counter() - self.start
+
+
+class StageMemory():
+
+    def __init__(self)-> None:
+
+        self.peak_bytes = {stage: 0 for stage in STAGES}
+
+    def __call__(self, stage: str)-> "StageMemory":
+
+        self.stage = stage
+        return self
+
+    def __enter__(self)-> None:
+
+        tracemalloc.reset_peak()
+        self.start = tracemalloc.get_traced_memory()[0]
+
+    def __exit__(self, *exc_info)-> None:
+
+        peak = tracemalloc.get_traced_memory()[1] - self.start
+        self.peak_bytes[self.stage] = max(self.peak_bytes[self.stage], peak)
+
+
+def run_pipeline(dataset: Dict, scenario: Dict, output_dir: str)-> float:
+
+    from pipeline_multiple_images import app_multiple_images
+
+    arguments = {"input_annotation_path": dataset['annotation_path'],
+                 "images_dir": dataset['images_dir'],
+                 "tile_size": list(scenario['tile_size']),
+                 "stride": list(scenario['stride']),
+                 "polygon_visibility_threshold": scenario.get('polygon_visibility_threshold', 0.8),
+                 "output_dir": output_dir}
+    arguments.update(scenario.get('pipeline_arguments', {}))
+
+    start = time.perf_counter()
+    result = app_multiple_images.handler(arguments, "")
+    seconds = time.perf_counter() - start
+
+    if not result['success']:
+        raise RuntimeError(f"Pipeline failed: {result['error']}")
+
+    return seconds
+
+
+def run_scenario(scenario: Dict, repeat: int, work_dir: str)-> Dict:
+    """
+    Benchmarks one scenario: generates its dataset, then times each stage over all its
+    images (best of `repeat` runs), traces the peak memory of each stage and, when
+    "pipeline" is set, times the multiple-images pipeline end to end.
+    """
+    scenario_dir = os.path.join(work_dir, scenario['name'])
+    dataset = generate_dataset(output_dir=scenario_dir,
+                               num_images=scenario.get('num_images', 1),
+                               image_size=scenario['image_size'],
+                               seed=scenario.get('seed', 0),
+                               **scenario.get('annotations', {}))
+
+    annotation_index = AnnotationIndex.load(dataset['annotation_path'], use_cache=False)
+    images = {file_name: cv2.imread(os.path.join(dataset['images_dir'], file_name)) for file_name in annotation_index}
+
+    tiles_dir = os.path.join(scenario_dir, "tiles")
+    os.makedirs(tiles_dir, exist_ok=True)
+
+    def run_all(clock):
+        counts = {}
+        for file_name, image in images.items():
+            for key, value in run_stages(image, annotation_index.annotations[file_name], file_name, scenario, tiles_dir, clock).items():
+                counts[key] = counts.get(key, 0) + value
+        return counts
+
+    best_seconds = None
+    for _ in range(repeat):
+        timer = StageTimer()
+        counts = run_all(timer)
+        if best_seconds is None:
+            best_seconds = dict(timer.seconds)
+        else:
+            best_seconds = {stage: min(best_seconds[stage], timer.seconds[stage]) for stage in STAGES}
+
+    memory = StageMemory()
+    tracemalloc.start()
+    try:
+        run_all(memory)
+    finally:
+        tracemalloc.stop()
+
+    stages = {stage: {"wall_seconds": best_seconds[stage],
+                      "peak_bytes": memory.peak_bytes[stage]} for stage in STAGES}
+
+    if scenario.get('pipeline'):
+        pipeline_seconds = min(run_pipeline(dataset, scenario, os.path.join(scenario_dir, f"output_{index}")) for index in range(repeat))
+        stages["pipeline"] = {"wall_seconds": pipeline_seconds, "peak_bytes": None}
+
+    return {"name": scenario['name'],
+            "parameters": {key: value for key, value in scenario.items() if key != 'name'},
+            "annotations": sum(len(annotations) for annotations in annotation_index.annotations.values()),
+            "counts": counts,
+            "stages": stages}
+
+
+def get_commit()-> str:
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(config: Dict)-> Dict:
+    """
+    Runs every scenario of a benchmark config and returns the machine-readable results.
+
+    Args:
+        config (Dict): Benchmark config with "scenarios", "repeat" and optionally "work_dir"
+            (kept when given, a temporary directory is used and removed otherwise).
+
+    Returns:
+        Dict: Environment metadata and one entry per scenario with per-stage
+        "wall_seconds" and "peak_bytes".
+    """
+    work_dir = config.get('work_dir') or tempfile.mkdtemp(prefix="roi_cropping_benchmark_")
+
+    try:
+        scenarios = [run_scenario(scenario, config.get('repeat', 3), work_dir) for scenario in config['scenarios']]
+    finally:
+        if not config.get('work_dir'):
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"commit": get_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "scenarios": scenarios}
+
+
+if __name__ == "__main__":
+    config_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "config_benchmark.json")
+
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+
+    results = run(config)
+
+    output_path = config.get('output_path') or "benchmark_results.json"
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=1)
+
+    for scenario in results['scenarios']:
+        print(scenario['name'])
+        for stage, measures in scenario['stages'].items():
+            peak = f"{measures['peak_bytes'] / 2**20:9.2f} MiB" if measures['peak_bytes'] is not None else ""
+            print(f"    {stage:<28}{measures['wall_seconds'] * 1000:10.2f} ms {peak}")
+
+    print(f"Results written to {output_path}")
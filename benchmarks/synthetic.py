@@ -0,0 +1,126 @@
+import os
+import json
+import numpy as np
+import cv2
+from typing import Tuple, List, Dict
+
+
+def generate_annotations(image_size: Tuple, num_annotations: int, polygon_fraction: float = 0.0, num_vertices: int = 8,
+                         num_clusters: int = 0, cluster_spread: float = 0.05, box_size: Tuple = (20, 300),
+                         num_categories: int = 1, seed: int = 0, image_id: int = 0, first_annotation_id: int = 0)-> List:
+    """
+    Generates synthetic COCO annotations for one image.
+
+    Args:
+        image_size (Tuple): (image_height, image_width).
+        num_annotations (int): Number of annotations.
+        polygon_fraction (float): Fraction of annotations with a polygon `segmentation`, the 
+            others only have a `bbox`.
+        num_vertices (int): Vertex count of the generated polygons. They are convex (inscribed 
+            in the annotation box), so clipping by a tile always yields a single polygon.
+        num_clusters (int): When > 0, annotation centers are drawn around this many cluster 
+            centers instead of uniformly over the image.
+        cluster_spread (float): Standard deviation of the clusters, relative to the image size.
+        box_size (Tuple): (min, max) side of the annotation boxes in pixels.
+        num_categories (int): Number of categories the labels are drawn from.
+        seed (int): Random seed.
+        image_id (int): COCO id of the image.
+        first_annotation_id (int): COCO id of the first annotation.
+
+    Returns:
+        List: COCO annotations.
+    """
+    rng = np.random.default_rng(seed)
+    image_height, image_width = image_size
+
+    widths = rng.integers(box_size[0], box_size[1], num_annotations, endpoint=True)
+    heights = rng.integers(box_size[0], box_size[1], num_annotations, endpoint=True)
+
+    if num_clusters > 0:
+        centers = rng.uniform((0, 0), (image_width, image_height), (num_clusters, 2))
+        offsets = rng.normal(0, cluster_spread, (num_annotations, 2)) * (image_width, image_height)
+        points = centers[rng.integers(0, num_clusters, num_annotations)] + offsets
+    else:
+        points = rng.uniform((0, 0), (image_width, image_height), (num_annotations, 2))
+
+    x_mins = np.clip(points[:, 0] - widths / 2, 0, image_width - widths).astype(int)
+    y_mins = np.clip(points[:, 1] - heights / 2, 0, image_height - heights).astype(int)
+
+    is_polygon = rng.random(num_annotations) < polygon_fraction
+    angles = np.linspace(0, 2 * np.pi, num_vertices, endpoint=False)
+
+    annotations = []
+
+    for index in range(num_annotations):
+        x_min, y_min, w, h = int(x_mins[index]), int(y_mins[index]), int(widths[index]), int(heights[index])
+
+        annotation = {"id": first_annotation_id + index,
+                      "image_id": image_id,
+                      "category_id": int(rng.integers(0, num_categories)),
+                      "bbox": [x_min, y_min, w, h],
+                      "area": w * h,
+                      "iscrowd": 0}
+
+        if is_polygon[index]:
+            phase = rng.uniform(0, 2 * np.pi)
+            xs = x_min + w / 2 + w / 2 * np.cos(angles + phase)
+            ys = y_min + h / 2 + h / 2 * np.sin(angles + phase)
+            annotation["segmentation"] = [np.round(np.stack([xs, ys], axis=1)).astype(int).ravel().tolist()]
+
+        annotations.append(annotation)
+
+    return annotations
+
+
+def generate_dataset(output_dir: str, num_images: int, image_size: Tuple, write_images: bool = True, seed: int = 0, **annotation_options)-> Dict:
+    """
+    Generates a synthetic COCO dataset and, optionally, its images.
+
+    Images are flat gray with a little noise, so encoding cost stays realistic without
+    making the dataset heavy to generate.
+
+    Args:
+        output_dir (str): Directory receiving "images/" and "annotations.json".
+        num_images (int): Number of images.
+        image_size (Tuple): (image_height, image_width) of every image.
+        write_images (bool): Whether to write the image files.
+        seed (int): Random seed.
+        **annotation_options: Options of `generate_annotations`.
+
+    Returns:
+        Dict: Paths of the generated "annotation_path" and "images_dir".
+    """
+    images_dir = os.path.join(output_dir, "images")
+    os.makedirs(images_dir, exist_ok=True)
+
+    image_height, image_width = image_size
+    coco_data = {"images": [], "annotations": [], "categories": []}
+
+    for image_id in range(num_images):
+        file_name = f"synthetic_{image_id:05d}.jpg"
+
+        coco_data["images"].append({"id": image_id,
+                                    "file_name": file_name,
+                                    "height": image_height,
+                                    "width": image_width})
+        coco_data["annotations"] += generate_annotations(image_size,
+                                                         seed=seed + image_id,
+                                                         image_id=image_id,
+                                                         first_annotation_id=len(coco_data["annotations"]),
+                                                         **annotation_options)
+
+        if write_images:
+            rng = np.random.default_rng(seed + image_id)
+            image = np.full((image_height, image_width, 3), 127, dtype=np.uint8)
+            image += rng.integers(0, 16, (image_height, image_width, 1), dtype=np.uint8)
+            cv2.imwrite(os.path.join(images_dir, file_name), image)
+
+    num_categories = annotation_options.get('num_categories', 1)
+    coco_data["categories"] = [{"id": category_id, "name": f"category_{category_id}"} for category_id in range(num_categories)]
+
+    annotation_path = os.path.join(output_dir, "annotations.json")
+    with open(annotation_path, 'w') as f:
+        json.dump(coco_data, f, separators=(',', ':'))
+
+    return {"annotation_path": annotation_path,
+            "images_dir": images_dir}
@@ -0,0 +1,36 @@
+from pipeline_merge_parts import pred_merge_parts
+import sys
+from utils.helper import create_error, report
+import os
+
+
+def run(arguments):
+
+    if arguments.get('input_annotation_paths') is not None:
+        if type(arguments['input_annotation_paths']) != list or not arguments['input_annotation_paths']:
+            error = create_error(104, "input_annotation_paths should be a non-empty list of paths.", arguments['input_annotation_paths'], __file__, sys._getframe().f_lineno)
+            return report(success=False, error=error, summary_code=700)
+
+        for input_annotation_path in arguments['input_annotation_paths']:
+            if not os.path.exists(str(input_annotation_path)):
+                error = create_error(101, "A path of input_annotation_paths does not exist.", input_annotation_path, __file__, sys._getframe().f_lineno)
+                return report(success=False, error=error, summary_code=700)
+
+    # The parts are looked up in annotations_dir when they are not listed
+    elif not os.path.isdir(str(arguments.get('annotations_dir'))):
+        error = create_error(102, "annotations_dir  does not exist.", arguments.get('annotations_dir'), __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if type(arguments.get('output_annotation_path')) != str:
+        error = create_error(104, "output_annotation_path should be a string.", arguments.get('output_annotation_path'), __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    return pred_merge_parts.run(arguments)
+
+def handler(event, context):
+    try:
+        return run(event)
+    except Exception as e:
+        exe_type, _, exc_tb = sys.exc_info()
+        error = create_error(401, "An error occurred in handler function.", str(e), __file__, exc_tb.tb_lineno, exe_type)
+        return report(success=False, error=error , summary_code=700)
@@ -0,0 +1,22 @@
+def run(arguments):
+    try:
+        import sys
+        from utils.helper import create_error, report
+        from utils.coco_writer import find_partial_annotations, merge_coco
+
+        # Initialize parameters
+        if arguments.get('input_annotation_paths'):
+            partial_annotation_paths = arguments['input_annotation_paths']
+        else:
+            partial_annotation_paths = find_partial_annotations(arguments['annotations_dir'])
+
+        output_annotation_path = arguments['output_annotation_path']
+
+        counts = merge_coco(partial_annotation_paths, output_annotation_path)
+
+        return report(success=True, result=counts)
+
+    except Exception as e :
+        exc_type, _, exc_tb = sys.exc_info()
+        error = create_error(401, "An error occurred in run function.", str(e), __file__, exc_tb.tb_lineno, exc_type)
+        return report(success=False, error=error, summary_code=700)
@@ -1,6 +1,7 @@
 from pipeline_multiple_images import pred_multiple_images
 import sys
 from utils.helper import create_error, report
+from utils.instrumentation import MetricsHook
 import os
 
 
@@ -10,7 +11,12 @@ def run(arguments):
         error = create_error(101, "input_annotation_path does not exist.", arguments['input_annotation_path'], __file__, sys._getframe().f_lineno)
         return report(success=False, error=error, summary_code=700)
     
-    if not os.path.isdir(arguments['images_dir']):
+    if arguments.get('video_path') is not None and not os.path.isfile(str(arguments['video_path'])):
+        error = create_error(101, "video_path does not exist.", arguments['video_path'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    # Frames of a video are decoded from the video file, not read from images_dir
+    if arguments.get('video_path') is None and not os.path.isdir(arguments['images_dir']):
         error = create_error(102, "images_dir  does not exist.", arguments['images_dir'], __file__, sys._getframe().f_lineno)
         return report(success=False, error=error, summary_code=700)
     
@@ -27,6 +33,118 @@ def run(arguments):
     except:
         error = create_error(104, "polygon_visibility_threshold should be a float number.", arguments['polygon_visibility_threshold'], __file__, sys._getframe().f_lineno)
         return report(success=False, error=error, summary_code=700)
+
+    arguments['num_workers'] = arguments.get('num_workers', 1)
+    if type(arguments['num_workers']) != int or arguments['num_workers'] < 1:
+        error = create_error(104, "num_workers should be a positive integer.", arguments['num_workers'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['num_shards'] = arguments.get('num_shards', 1)
+    if type(arguments['num_shards']) != int or arguments['num_shards'] < 1:
+        error = create_error(104, "num_shards should be a positive integer.", arguments['num_shards'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['shard_index'] = arguments.get('shard_index', 0)
+    if type(arguments['shard_index']) != int or not 0 <= arguments['shard_index'] < arguments['num_shards']:
+        error = create_error(104, "shard_index should be an integer between 0 and num_shards - 1.", arguments['shard_index'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['queue_size'] = arguments.get('queue_size', 2)
+    if type(arguments['queue_size']) != int or arguments['queue_size'] < 1:
+        error = create_error(104, "queue_size should be a positive integer.", arguments['queue_size'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('max_inflight_bytes') is not None and (type(arguments['max_inflight_bytes']) != int or arguments['max_inflight_bytes'] <= 0):
+        error = create_error(104, "max_inflight_bytes should be a positive integer.", arguments['max_inflight_bytes'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['tile_format'] = arguments.get('tile_format') or 'jpg'
+    if arguments['tile_format'] not in ('jpg', 'png', 'webp'):
+        error = create_error(104, "tile_format should be one of jpg, png or webp.", arguments['tile_format'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('tile_quality') is not None and (type(arguments['tile_quality']) != int or not 0 <= arguments['tile_quality'] <= 100):
+        error = create_error(104, "tile_quality should be an integer between 0 and 100.", arguments['tile_quality'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('png_compression') is not None and (type(arguments['png_compression']) != int or not 0 <= arguments['png_compression'] <= 9):
+        error = create_error(104, "png_compression should be an integer between 0 and 9.", arguments['png_compression'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['num_writer_threads'] = arguments.get('num_writer_threads') or 4
+    if type(arguments['num_writer_threads']) != int or arguments['num_writer_threads'] < 1:
+        error = create_error(104, "num_writer_threads should be a positive integer.", arguments['num_writer_threads'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('cache_dir') is not None and type(arguments['cache_dir']) != str:
+        error = create_error(104, "cache_dir should be a string.", arguments['cache_dir'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('cache_max_bytes') is not None and (type(arguments['cache_max_bytes']) != int or arguments['cache_max_bytes'] < 0):
+        error = create_error(104, "cache_max_bytes should be a non-negative integer.", arguments['cache_max_bytes'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['plan_only'] = arguments.get('plan_only') or False
+    if type(arguments['plan_only']) != bool:
+        error = create_error(104, "plan_only should be a boolean.", arguments['plan_only'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['output_mode'] = arguments.get('output_mode') or 'tiles'
+    if arguments['output_mode'] not in ('tiles', 'manifest', 'shards'):
+        error = create_error(104, "output_mode should be one of tiles, manifest or shards.", arguments['output_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('shard_max_bytes') is not None and (type(arguments['shard_max_bytes']) != int or arguments['shard_max_bytes'] <= 0):
+        error = create_error(104, "shard_max_bytes should be a positive integer.", arguments['shard_max_bytes'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments['output_mode'] == 'shards' and arguments.get('cache_dir') is not None:
+        error = create_error(104, "cache_dir is not supported with the shards output mode.", arguments['cache_dir'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['selection_mode'] = arguments.get('selection_mode') or 'greedy'
+    if arguments['selection_mode'] not in ('greedy', 'exact'):
+        error = create_error(104, "selection_mode should be either greedy or exact.", arguments['selection_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('selection_time_budget') is not None and (type(arguments['selection_time_budget']) not in (int, float) or arguments['selection_time_budget'] <= 0):
+        error = create_error(104, "selection_time_budget should be a positive number of seconds.", arguments['selection_time_budget'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['candidate_mode'] = arguments.get('candidate_mode') or 'grid'
+    if arguments['candidate_mode'] not in ('grid', 'anchored'):
+        error = create_error(104, "candidate_mode should be either grid or anchored.", arguments['candidate_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('trace_path') is not None and type(arguments['trace_path']) != str:
+        error = create_error(104, "trace_path should be a string.", arguments['trace_path'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['sequence_mode'] = arguments.get('sequence_mode') or arguments.get('video_path') is not None
+    if type(arguments['sequence_mode']) != bool:
+        error = create_error(104, "sequence_mode should be a boolean.", arguments['sequence_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    # Frames are selected in order, each one from the tiles of the previous one
+    if arguments['sequence_mode'] and arguments['num_workers'] != 1:
+        error = create_error(104, "num_workers should be 1 in the sequence mode.", arguments['num_workers'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments['sequence_mode'] and arguments['num_shards'] != 1:
+        error = create_error(104, "num_shards is not supported in the sequence mode.", arguments['num_shards'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments['sequence_mode'] and arguments.get('cache_dir') is not None:
+        error = create_error(104, "cache_dir is not supported in the sequence mode.", arguments['cache_dir'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('video_path') is not None and arguments['output_mode'] == 'manifest':
+        error = create_error(104, "The manifest output mode needs image files and is not supported with video_path.", arguments['output_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('metrics_hooks') is not None and not all(isinstance(hook, MetricsHook) for hook in arguments['metrics_hooks']):
+        error = create_error(104, "metrics_hooks should be a list of MetricsHook.", str(arguments['metrics_hooks']), __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
      
     return pred_multiple_images.run(arguments)
 
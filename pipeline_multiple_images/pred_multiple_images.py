@@ -1,20 +1,480 @@
 
 
+def init_worker():
+    import cv2
+
+    # Each worker handles a whole image; OpenCV's own thread pool would only oversubscribe the cores
+    cv2.setNumThreads(1)
+
+
+def select_image(image_record, image_annotations, settings):
+    """
+    Selects the informative tiles of one image, the first stage of `process_image`.
+
+    Tiles are planned from the width and height of the COCO image record, so the image is 
+    only opened here when the record does not declare them. When a cache is configured and 
+    holds the result of an unchanged image whose tiles are still in "tiles_dir", that result 
+    is used instead.
+
+    Args:
+        image_record (Dict): COCO image record; "file_name" is looked up in `settings['images_dir']`.
+        image_annotations (List): COCO annotations of the image.
+        settings (Dict): Pipeline settings, see `process_image`.
+
+    Returns:
+        Dict: State of the image passed to `read_image` and `write_image`: "file_name", 
+        "image_path", "results" of `TileSelector.run()` (without pixels), "image_size", 
+        "image_source" when the image had to be opened, "cache_hit", "cache_key" and the 
+        `StageMetrics` of the image under "metrics".
+    """
+    from utils.helper import tile_file_name
+    from utils.tile_selector import TileSelector
+    from utils.image_source import open_image_source
+    from utils.result_cache import ResultCache
+    from utils.instrumentation import StageMetrics
+    import os
+
+    metrics = StageMetrics()
+
+    image_name = image_record['file_name']
+    image_path = os.path.join(settings['images_dir'], image_name)
+
+    state = {"file_name": image_name,
+             "image_path": image_path,
+             "image_source": None,
+             "cache_hit": False,
+             "cache_key": None,
+             "metrics": metrics}
+
+    if settings.get('cache'):
+        with metrics.stage("cache_lookup"):
+            cache = ResultCache(**settings['cache'])
+
+            # Only the settings changing the tiles, the writer threads do not
+            key_settings = {key: settings[key] for key in ('tile_size', 'stride', 'polygon_visibility_threshold', 'selection_mode', 'candidate_mode')}
+            key_settings['tile_writer'] = {key: settings['tile_writer'][key] for key in ('tile_format', 'quality', 'png_compression')}
+
+            state['cache_key'] = ResultCache.make_key(image_path=image_path,
+                                                      image_annotations=image_annotations,
+                                                      settings=key_settings)
+
+            cached_results = cache.get(state['cache_key'])
+
+            cache_hit = cached_results is not None and (settings.get('plan_only') or all(
+                os.path.exists(os.path.join(settings['tiles_dir'], tile_file_name(image_name, tile['id'], settings['tile_writer']['tile_format'])))
+                for tile in cached_results['tiles']))
+
+        if cache_hit:
+            metrics.count("cache_hits")
+            return {**state, "cache_hit": True, "results": cached_results}
+
+    try:
+        # Without declared dimensions the image has to be opened to be planned
+        if image_record.get('height') and image_record.get('width'):
+            image_size = (image_record['height'], image_record['width'])
+        else:
+            with metrics.stage("decode"):
+                state['image_source'] = open_image_source(image_path)
+            image_size = state['image_source'].shape[:2]
+
+        tileselector = TileSelector(image=None,
+                                    tile_size=settings['tile_size'],
+                                    stride=settings['stride'],
+                                    image_annotations=image_annotations,
+                                    polygon_visibility_threshold=settings['polygon_visibility_threshold'],
+                                    image_size=image_size,
+                                    metrics=metrics,
+                                    selection_mode=settings['selection_mode'],
+                                    time_budget=settings['selection_time_budget'],
+                                    candidate_mode=settings['candidate_mode'])
+        state['results'] = tileselector.run()
+        state['image_size'] = image_size
+    except BaseException:
+        if state['image_source'] is not None:
+            state['image_source'].close()
+        raise
+
+    return state
+
+
+def select_frame(image_record, image_annotations, settings, sequence_selector, frame=None):
+    """
+    Selects the informative tiles of one frame of a sequence, the first stage of the
+    pipeline in the sequence mode, in place of `select_image`.
+
+    The selection of the previous frame is reused when it still covers the annotations
+    (`SequenceTileSelector`), so frames must come in order and from a single thread.
+
+    Args:
+        image_record (Dict): COCO image record of the frame.
+        image_annotations (List): COCO annotations of the frame.
+        settings (Dict): Pipeline settings, see `process_image`.
+        sequence_selector (SequenceTileSelector): Selector shared by the frames.
+        frame (np.ndarray): The decoded frame when it comes from a video. Otherwise the
+            frame is read from `settings['images_dir']` like an image.
+
+    Returns:
+        Dict: State of the frame, see `select_image`.
+    """
+    from utils.image_source import open_image_source, ArrayImageSource
+    from utils.instrumentation import StageMetrics
+    import os
+
+    metrics = StageMetrics()
+
+    image_name = image_record['file_name']
+
+    state = {"file_name": image_name,
+             "image_path": os.path.join(settings['images_dir'], image_name) if frame is None else None,
+             "image_source": ArrayImageSource(frame) if frame is not None else None,
+             "cache_hit": False,
+             "cache_key": None,
+             "metrics": metrics}
+
+    try:
+        if frame is not None:
+            image_size = frame.shape[:2]
+        elif image_record.get('height') and image_record.get('width'):
+            image_size = (image_record['height'], image_record['width'])
+        else:
+            with metrics.stage("decode"):
+                state['image_source'] = open_image_source(state['image_path'])
+            image_size = state['image_source'].shape[:2]
+
+        state['results'] = sequence_selector.select(image_size, image_annotations, metrics)
+        state['image_size'] = image_size
+    except BaseException:
+        if state['image_source'] is not None:
+            state['image_source'].close()
+        raise
+
+    return state
+
+
+def needs_pixels(state, settings):
+    """
+    Whether the selected tiles of an image have to be read and written.
+    """
+    return not state['cache_hit'] and bool(state['results']['tiles']) and not settings.get('plan_only')
+
+
+def skip_image(state, error):
+    """
+    Drops the selection of an image whose size differs from its record: its tiles were
+    planned on the wrong grid, so the image is left out of the output.
+    """
+    if state['image_source'] is not None:
+        state['image_source'].close()
+        state['image_source'] = None
+
+    state['skipped'] = str(error)
+    state['results'] = {"tiles": [], "tiles_annotations": []}
+
+    return state
+
+
+def read_image(state, settings):
+    """
+    Reads the pixels of the selected tiles into the tiles ("data"), the read stage of the 
+    streaming pipeline. The image is closed afterwards, so only the tiles stay in memory.
+
+    Args:
+        state (Dict): State returned by `select_image`.
+        settings (Dict): Pipeline settings, see `process_image`.
+
+    Returns:
+        Dict: The same state.
+    """
+    from utils.image_source import open_image_source, ImageSizeError
+    import numpy as np
+
+    if not needs_pixels(state, settings):
+        return state
+
+    metrics = state['metrics']
+
+    try:
+        with metrics.stage("decode"):
+            if state['image_source'] is None:
+                try:
+                    state['image_source'] = open_image_source(state['image_path'], state['image_size'])
+                except ImageSizeError as error:
+                    return skip_image(state, error)
+
+            image_source = state['image_source']
+
+            for tile in state['results']['tiles']:
+                x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+                # A copy, so a tile does not keep a whole decoded image alive
+                tile['data'] = np.array(image_source.read_region(x_start, y_start, x_end, y_end))
+    finally:
+        if state['image_source'] is not None:
+            state['image_source'].close()
+            state['image_source'] = None
+
+    return state
+
+
+def write_image(state, settings, tile_writer):
+    """
+    Writes the selected tiles of an image and returns its compact result, the last stage 
+    of `process_image`.
+
+    Tiles read by `read_image` are written from their "data", others are read from the 
+    image one at a time while being written.
+
+    Args:
+        state (Dict): State returned by `select_image` or `read_image`.
+        settings (Dict): Pipeline settings, see `process_image`.
+        tile_writer (TileWriter): Background writer of the tiles.
+
+    Returns:
+        Dict: Compact per-image result, see `process_image`.
+    """
+    from utils.helper import save_results, strip_tile_data
+    from utils.image_source import open_image_source, ImageSizeError
+    from utils.shard_writer import encode_tiles
+    from utils.result_cache import ResultCache
+
+    metrics = state['metrics']
+
+    if state['cache_hit']:
+        return {**state['results'], "metrics": metrics.to_dict()}
+
+    if state['image_source'] is None and needs_pixels(state, settings) and not all('data' in tile for tile in state['results']['tiles']):
+        with metrics.stage("decode"):
+            try:
+                state['image_source'] = open_image_source(state['image_path'], state['image_size'])
+            except ImageSizeError as error:
+                skip_image(state, error)
+
+    if state.get('skipped'):
+        return {**state['results'], "skipped": state['skipped'], "metrics": metrics.to_dict()}
+
+    results = state['results']
+
+    encoded_tiles = None
+
+    try:
+        if needs_pixels(state, settings):
+
+            if settings.get('output_mode') == 'shards':
+                # Tiles are packed into the shards by the caller, in input order
+                with metrics.stage("encode_tiles"):
+                    encoded_tiles = encode_tiles(results['tiles'], state['image_source'], **settings['tile_writer'])
+            else:
+                # Time spent reading the tiles and handing them to the writer, including waits for a free slot
+                with metrics.stage("write_tiles"):
+                    save_results(output_dir=settings['tiles_dir'],
+                                 entry=results,
+                                 file_name=state['file_name'],
+                                 tile_writer=tile_writer,
+                                 image_source=state['image_source'])
+    finally:
+        if state['image_source'] is not None:
+            state['image_source'].close()
+            state['image_source'] = None
+
+    results = strip_tile_data(results)
+
+    if settings.get('cache'):
+        with metrics.stage("flush_tiles"):
+            tile_writer.flush()
+        with metrics.stage("cache_store"):
+            ResultCache(**settings['cache']).put(state['cache_key'], results)
+
+    if encoded_tiles is not None:
+        results['encoded_tiles'] = encoded_tiles
+
+    return {**results, "metrics": metrics.to_dict()}
+
+
+def process_image(image_record, image_annotations, settings, tile_writer=None):
+    """
+    Selects the informative tiles of one image and writes them to disk.
+
+    This is the unit of work of the pipeline when run in worker processes: `select_image` 
+    and `write_image` one after the other. Tiles are planned from the width and height of 
+    the COCO image record, and the image is only opened when tiles were selected. With 
+    "plan_only" in the settings it is never opened and nothing is written. `.npy`, `.raw` 
+    and PPM/PGM images are read tile by tile (`utils.image_source`), other formats are 
+    decoded whole.
+
+    Args:
+        image_record (Dict): COCO image record; "file_name" is looked up in `settings['images_dir']`.
+        image_annotations (List): COCO annotations of the image.
+        settings (Dict): Pipeline settings with "images_dir", "tiles_dir", "tile_size", 
+            "stride", "polygon_visibility_threshold", "selection_mode", "selection_time_budget", "candidate_mode", the `TileWriter` arguments under 
+            "tile_writer" and the optional `ResultCache` arguments under "cache".
+        tile_writer (TileWriter): Shared background writer. When None a writer is created 
+            for this image and flushed before returning.
+
+    When a cache is configured and holds the result of an unchanged image whose tiles are 
+    still in "tiles_dir", that result is returned without decoding the image. Otherwise the 
+    result is cached once its tiles are flushed to disk, so an interrupted run resumes from 
+    the last completed image.
+
+    Returns:
+        Dict: Compact per-image result ready for `append_to_coco`, with the tile pixel 
+        arrays removed (in the "shards" output mode the encoded tiles are returned under 
+        "encoded_tiles" instead of being written), and the stage timings and counters of the image under "metrics" 
+        (`StageMetrics.to_dict`). "bytes_written" is only counted here when the image had its 
+        own writer, a shared writer is accounted for by the caller. An image whose size 
+        differs from its record gets no tiles and the error under "skipped".
+    """
+    from utils.tile_writer import TileWriter
+    from utils.instrumentation import StageMetrics
+
+    if tile_writer is None:
+        metrics = StageMetrics()
+
+        with TileWriter(**settings['tile_writer']) as tile_writer:
+            results = process_image(image_record, image_annotations, settings, tile_writer)
+            metrics.merge(results['metrics'])
+
+            with metrics.stage("flush_tiles"):
+                tile_writer.flush()
+
+        metrics.count("bytes_written", tile_writer.bytes_written)
+
+        return {**results, "metrics": metrics.to_dict()}
+
+    state = select_image(image_record, image_annotations, settings)
+
+    return write_image(state, settings, tile_writer)
+
+
+def create_streaming_pipeline(settings, tile_writer, queue_size=2, max_inflight_bytes=None, sequence_selector=None):
+    """
+    Builds the in-process pipeline of the images: a `StreamingPipeline` of three stages, 
+    tile selection (`select_image`), reading of the selected tiles (`read_image`) and 
+    writing (`write_image`), each on its own thread and at most `queue_size` images ahead 
+    of the next stage. Its `run` takes (image record, image annotations) pairs and yields 
+    the results of `process_image` in input order.
+
+    With a `sequence_selector`, the images are the frames of a sequence and are selected
+    with `select_frame`. Its `run` then takes (image record, image annotations, frame)
+    triples, the frame being None when it is read from the images directory.
+
+    The read stage acquires the raw bytes of the tiles of an image from the pipeline byte 
+    budget before reading them, and they are released once the tiles are handed to the 
+    writer, so the pixels held between the stages stay under `max_inflight_bytes`. The 
+    bytes of an image decoded whole (formats other than `is_windowed`, video frames) are 
+    counted too until its tiles are read. Images decoded by the selection stage, when their 
+    record has no size, and video frames are decoded before the budget is acquired.
+
+    Args:
+        settings (Dict): Pipeline settings, see `process_image`.
+        tile_writer (TileWriter): Background writer shared by the images.
+        queue_size (int): Capacity of the queues between the stages.
+        max_inflight_bytes (int): Ceiling on the tile bytes read but not yet written. None 
+            for no ceiling.
+        sequence_selector (SequenceTileSelector): Selector reusing the tiles of the
+            previous frame, for frame sequences.
+
+    Returns:
+        StreamingPipeline: The pipeline, with its `ByteBudget` as `byte_budget`.
+    """
+    from utils.streaming import StreamingPipeline, ByteBudget
+    from utils.image_source import open_image_source, is_windowed, ArrayImageSource, ImageSizeError
+
+    byte_budget = ByteBudget(max_inflight_bytes)
+
+    def inflight_bytes(state):
+        """
+        Bytes of the tiles of an image and of the image itself when it is decoded whole.
+        """
+        if not needs_pixels(state, settings):
+            return 0, 0
+
+        image_source = state['image_source']
+
+        # A windowed source only reads its header when opened, its layout gives the tile bytes
+        if image_source is None and is_windowed(state['image_path']):
+            with state['metrics'].stage("decode"):
+                image_source = state['image_source'] = open_image_source(state['image_path'], state['image_size'])
+
+        if image_source is not None:
+            channels = image_source.shape[2] if len(image_source.shape) == 3 else 1
+            pixel_bytes = channels * image_source.dtype.itemsize
+        else:
+            # `cv2.imread` decodes to 3 channel 8-bit images
+            pixel_bytes = 3
+
+        tiles_bytes = sum((tile['coordinates'][2] - tile['coordinates'][0]) * (tile['coordinates'][5] - tile['coordinates'][1]) * pixel_bytes
+                          for tile in state['results']['tiles'])
+
+        # An image decoded whole is held until its tiles are read
+        if image_source is None or isinstance(image_source, ArrayImageSource):
+            return tiles_bytes, state['image_size'][0] * state['image_size'][1] * pixel_bytes
+
+        return tiles_bytes, 0
+
+    def select(item):
+
+        if sequence_selector is not None:
+            image_record, image_annotations, frame = item
+
+            return select_frame(image_record, image_annotations, settings, sequence_selector, frame)
+
+        image_record, image_annotations = item
+
+        return select_image(image_record, image_annotations, settings)
+
+    def read(state):
+
+        try:
+            try:
+                state['nbytes'], image_bytes = inflight_bytes(state)
+            except ImageSizeError as error:
+                skip_image(state, error)
+                state['nbytes'], image_bytes = 0, 0
+
+            with state['metrics'].stage("wait_memory"):
+                byte_budget.acquire(state['nbytes'] + image_bytes)
+        except BaseException:
+            if state['image_source'] is not None:
+                state['image_source'].close()
+            raise
+
+        try:
+            return read_image(state, settings)
+        finally:
+            byte_budget.release(image_bytes)
+
+    def write(state):
+
+        try:
+            return write_image(state, settings, tile_writer)
+        finally:
+            byte_budget.release(state['nbytes'])
+
+    return StreamingPipeline(stages=[("select", select), ("read", read), ("write", write)],
+                             queue_size=queue_size,
+                             byte_budget=byte_budget)
 
 
 def run(arguments):
     try:
         import sys
         from utils.helper import (create_error,
-                            report,
-                            append_to_coco,
-                            export_annotation,
-                            save_results)
-        from utils.tile_selector import TileSelector
+                            report)
+        from utils.annotation_index import AnnotationIndex, image_shard
+        from utils.coco_writer import CocoWriter
+        from utils.coco_builder import CocoBuilder
+        from utils.tile_writer import TileWriter
+        from utils.result_cache import ResultCache
+        from utils.tile_dataset import ManifestWriter
+        from utils.shard_writer import ShardWriter
+        from utils.instrumentation import StageMetrics, create_hooks
+        from utils.sequence import SequenceTileSelector, video_frame_indices, iter_video_frames
         import os
-        import cv2
-        from pycocotools.coco import COCO
+        import time
         from tqdm import tqdm
+        from concurrent.futures import ProcessPoolExecutor
+        from contextlib import nullcontext
+        from itertools import repeat
+        import logging
 
         
 
@@ -22,64 +482,236 @@ def run(arguments):
         input_annotation_path = arguments['input_annotation_path']
         
         images_dir = arguments['images_dir']
-        images_name = os.listdir(images_dir)
+
+        # Frames of a video, or of a directory of frames, reuse the selection of the previous frame
+        video_path = arguments.get('video_path')
+        sequence_mode = arguments.get('sequence_mode', False) or video_path is not None
 
         tile_size = arguments['tile_size']
         stride = arguments['stride']
         polygon_visibility_threshold=arguments['polygon_visibility_threshold']
+        num_workers = arguments.get('num_workers', 1)
+        
+        # Every node of a multi-node run processes the images of its own shard
+        num_shards = arguments.get('num_shards', 1)
+        shard_index = arguments.get('shard_index', 0)
+        part_suffix = f".part-{shard_index:05d}-of-{num_shards:05d}" if num_shards > 1 else ""
         
         output_dir=arguments['output_dir']
-        os.makedirs(f"{output_dir}/tiles", exist_ok=True)
         os.makedirs(f"{output_dir}/annotations", exist_ok=True)
 
+        input_stem, input_extension = os.path.splitext(os.path.basename(input_annotation_path))
+
         output_annotation_path = os.path.join(output_dir,
                                               "annotations", 
-                                              f"output_{os.path.basename(input_annotation_path)}")
+                                              f"output_{input_stem}{part_suffix}{input_extension}")
 
-        # Initialize coco annotation
-        new_coco_data = {"images":[],
-                     "annotations":[],
-                     "categories":[]}
-        
-        coco = COCO(input_annotation_path)
+        tile_format = arguments.get('tile_format', 'jpg')
+        output_mode = arguments.get('output_mode', 'tiles')
 
-        new_coco_data['categories'] = coco.dataset['categories'] 
-        
-        for image_name in tqdm(images_name, desc="Processing"):
-
-            image_id = next((image['id'] for image in coco.dataset['images'] if image['file_name']==image_name), None)
-
-            if image_id is None:
-                raise ValueError(f"The file {image['file_name']} referenced in the annotation could not be found in the dataset.")
-
-            annotations_ids = coco.getAnnIds(imgIds=image_id)
-            image_annotations = coco.loadAnns(annotations_ids)                    
-            
-            image_path = os.path.join(images_dir,image_name)
-            image = cv2.imread(image_path)
-            tileselector = TileSelector(image=image,
-                                        tile_size=tile_size,
-                                        stride=stride,
-                                        image_annotations=image_annotations,
-                                        polygon_visibility_threshold=polygon_visibility_threshold)
-            results = tileselector.run()
-
-            new_coco_data= append_to_coco(coco_data=new_coco_data,
-                                    entry=results,
-                                    file_name=image_name)
-            
-            save_results(output_dir=f"{output_dir}/tiles",
-                        entry=results,
-                        file_name=image_name)
-            
-        
-        export_annotation(new_coco_data, output_annotation_path)
+        manifest_path = os.path.join(output_dir,
+                                     "annotations",
+                                     f"manifest_{input_stem}{part_suffix}.jsonl")
+
+        settings = {"images_dir": images_dir,
+                    "tiles_dir": f"{output_dir}/tiles",
+                    "tile_size": tile_size,
+                    "stride": stride,
+                    "polygon_visibility_threshold": polygon_visibility_threshold,
+                    "selection_mode": arguments.get('selection_mode', 'greedy'),
+                    "selection_time_budget": arguments.get('selection_time_budget', 1.0),
+                    "candidate_mode": arguments.get('candidate_mode', 'grid'),
+                    # The manifest mode only needs the plan, tiles are cropped when read
+                    "plan_only": arguments.get('plan_only', False) or output_mode == 'manifest',
+                    "output_mode": output_mode,
+                    "tile_writer": {"tile_format": tile_format,
+                                    "quality": arguments.get('tile_quality'),
+                                    "png_compression": arguments.get('png_compression'),
+                                    "num_threads": arguments.get('num_writer_threads', 4)}}
+
+        # Shards and plans hold no tile files
+        if output_mode == 'tiles' and not settings['plan_only']:
+            os.makedirs(settings['tiles_dir'], exist_ok=True)
+
+        if arguments.get('cache_dir'):
+            settings['cache'] = {"cache_dir": arguments['cache_dir'],
+                                 "max_bytes": arguments.get('cache_max_bytes')}
+
+        run_start = time.perf_counter()
+        run_metrics = StageMetrics()
+
+        with run_metrics.stage("load_annotations"):
+            annotation_index = AnnotationIndex.load(input_annotation_path)
+
+        if video_path is not None:
+            # Every record is a frame of the video, taken in frame order
+            frame_indices = dict(zip(annotation_index, video_frame_indices(list(annotation_index.images.values()))))
+            images_name = sorted(annotation_index, key=frame_indices.__getitem__)
+        else:
+            # Images are taken in annotation order, or in file name order for frames, skipping records whose file is not in images_dir
+            available_images = set(os.listdir(images_dir))
+            shard_images = [image_name for image_name in annotation_index if num_shards == 1 or image_shard(image_name, num_shards) == shard_index]
+            images_name = [image_name for image_name in shard_images if image_name in available_images]
+
+            if sequence_mode:
+                images_name.sort()
+
+            run_metrics.count("images", len(images_name))
+            run_metrics.count("images_skipped", len(shard_images) - len(images_name))
+
+        images_record = [annotation_index.images[image_name] for image_name in images_name]
+        images_annotations = [annotation_index.annotations[image_name] for image_name in images_name]
+
+        streaming_pipeline = None
+        sequence_selector = None
+
+        if sequence_mode:
+            # Frames are selected in order by a single stage, each one starting from the tiles of the previous one
+            sequence_selector = SequenceTileSelector(tile_size=tile_size,
+                                                     stride=stride,
+                                                     polygon_visibility_threshold=polygon_visibility_threshold,
+                                                     selection_mode=settings['selection_mode'],
+                                                     time_budget=settings['selection_time_budget'],
+                                                     candidate_mode=settings['candidate_mode'])
+
+        def video_items():
+
+            # Frames are decoded one at a time as the pipeline pulls them, records sharing a frame get the same array
+            image_positions = iter(range(len(images_name)))
+            position = next(image_positions, None)
+
+            for frame_index, frame in iter_video_frames(video_path, [frame_indices[image_name] for image_name in images_name]):
+                while position is not None and frame_indices[images_name[position]] == frame_index:
+                    yield images_record[position], images_annotations[position], frame
+                    position = next(image_positions, None)
+
+        executor = None
+        tile_writer = None
+        streaming_pipeline = None
+        images_results = None
+        hooks = []
+
+        try:
+            hooks = create_hooks(arguments)
+
+            # Records are flushed into the writer after each image, the builder keeps numbering them
+            coco_builder = CocoBuilder(categories=annotation_index.categories,
+                                       id_step=num_shards,
+                                       id_offset=shard_index)
+
+            # The outputs are opened before any image is submitted, so an unwritable path fails before work starts
+            with CocoWriter(output_annotation_path=output_annotation_path,
+                            categories=annotation_index.categories) as new_coco_data, \
+                 (ManifestWriter(manifest_path) if output_mode == 'manifest' else nullcontext()) as manifest_writer, \
+                 (ShardWriter(shards_dir=f"{output_dir}/shards",
+                              max_shard_bytes=arguments.get('shard_max_bytes') or 1 << 30,
+                              shard_prefix=f"shard{part_suffix}",
+                              index_file_name=f"{part_suffix[1:]}.index.jsonl" if part_suffix else "index.jsonl") if output_mode == 'shards' and not settings['plan_only'] else nullcontext()) as shard_writer:
+
+                if num_workers > 1:
+                    # Every worker writes its tiles through its own writer, flushed per image
+                    executor = ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker)
+                    images_results = executor.map(process_image, images_record, images_annotations, repeat(settings))
+                else:
+                    # Selection, reading and writing of consecutive images overlap on threads, with one writer for the whole run
+                    tile_writer = TileWriter(**settings['tile_writer'])
+                    streaming_pipeline = create_streaming_pipeline(settings,
+                                                                   tile_writer,
+                                                                   queue_size=arguments.get('queue_size', 2),
+                                                                   max_inflight_bytes=arguments.get('max_inflight_bytes'),
+                                                                   sequence_selector=sequence_selector)
+
+                    if video_path is not None:
+                        images_results = streaming_pipeline.run(video_items())
+                    elif sequence_selector is not None:
+                        images_results = streaming_pipeline.run(zip(images_record, images_annotations, repeat(None)))
+                    else:
+                        images_results = streaming_pipeline.run(zip(images_record, images_annotations))
+
+                # Results come back in input order, so ids match a serial run whatever the worker count
+                for image_name, results in tqdm(zip(images_name, images_results), total=len(images_name), desc="Processing"):
+
+                    image_metrics = results.pop('metrics')
+                    run_metrics.merge(image_metrics)
+
+                    if 'skipped' in results:
+                        # One image not matching its record does not stop the run
+                        logging.getLogger(__name__).warning("Skipped %s: %s", image_name, results['skipped'])
+                        run_metrics.count("images", -1)
+                        run_metrics.count("images_skipped")
+                        continue
+
+                    for hook in hooks:
+                        hook.on_image(image_name, image_metrics)
+
+                    tile_locations = None
+
+                    if shard_writer is not None:
+                        with run_metrics.stage("write_shards"):
+                            tile_locations = shard_writer.add_entry(entry=results,
+                                                                    file_name=image_name,
+                                                                    tile_format=tile_format)
+                        results.pop('encoded_tiles', None)
+
+                    with run_metrics.stage("write_annotations"):
+                        coco_builder.add_entry(entry=results,
+                                               file_name=image_name,
+                                               tile_format=tile_format,
+                                               include_crop=settings['plan_only'],
+                                               tile_locations=tile_locations)
+                        coco_builder.flush(new_coco_data)
+
+                        if manifest_writer is not None:
+                            image_record = annotation_index.images[image_name]
+                            manifest_writer.add_entry(entry=results,
+                                                      file_name=image_name,
+                                                      tile_format=tile_format,
+                                                      image_size=(image_record['height'], image_record['width']) if image_record.get('height') and image_record.get('width') else None)
+
+                if video_path is not None:
+                    # Records past the end of the video have no frame
+                    run_metrics.count("images", sequence_selector.frames)
+                    run_metrics.count("images_skipped", len(images_name) - sequence_selector.frames)
+
+                if tile_writer is not None:
+                    with run_metrics.stage("flush_tiles"):
+                        tile_writer.flush()
+                    run_metrics.count("bytes_written", tile_writer.bytes_written)
+
+                if shard_writer is not None:
+                    run_metrics.count("bytes_written", shard_writer.bytes_written)
+                    run_metrics.count("shards", shard_writer.shard_count)
+
+            if settings.get('cache'):
+                ResultCache(**settings['cache']).evict()
+
+            # Stage times are summed over the images, so they exceed the wall time with several workers or overlapping stages
+            metrics = {**run_metrics.to_dict(), "wall_seconds": time.perf_counter() - run_start}
+
+            if streaming_pipeline is not None:
+                metrics['queues'] = streaming_pipeline.stats()
+                metrics['inflight_bytes'] = streaming_pipeline.byte_budget.stats()
+
+            if sequence_selector is not None:
+                metrics['selection_reuse'] = sequence_selector.stats()
+
+            for hook in hooks:
+                hook.on_complete(metrics)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if streaming_pipeline is not None and images_results is not None:
+                images_results.close()
+            if tile_writer is not None:
+                tile_writer.close()
+            for hook in hooks:
+                hook.close()
         
-        return report(success=True, result=f'All generated tiles are saved in: {output_dir}')
+        return report(success=True, result=f'All generated tiles are saved in: {output_dir}', metrics=metrics)
 
     except Exception as e :
         exc_type, _, exc_tb = sys.exc_info()
         error = create_error(401, "An error occurred in run function.", str(e), __file__, exc_tb.tb_lineno, exc_type)
         return report(success=False, error=error, summary_code=700)
         
-    
\ No newline at end of file
+    
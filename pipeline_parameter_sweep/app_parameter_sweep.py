@@ -0,0 +1,36 @@
+from pipeline_parameter_sweep import pred_parameter_sweep
+import sys
+from utils.helper import create_error, report
+import os
+
+
+def run(arguments):
+    
+    if not os.path.exists(str(arguments['input_annotation_path'])): 
+        error = create_error(101, "input_annotation_path does not exist.", arguments['input_annotation_path'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+    
+    if arguments.get('images_dir') and not os.path.isdir(arguments['images_dir']):
+        error = create_error(102, "images_dir  does not exist.", arguments['images_dir'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+    
+    for key in ('tile_sizes', 'strides'):
+        if type(arguments[key]) != list or not arguments[key] or any(type(value) != list or len(value) != 2 for value in arguments[key]):
+            error = create_error(104, f"{key} should be a non-empty list of [height, width] lists.", arguments[key], __file__, sys._getframe().f_lineno)
+            return report(success=False, error=error, summary_code=700)
+
+    try:
+        arguments['polygon_visibility_thresholds'] = [float(threshold) for threshold in arguments['polygon_visibility_thresholds']]
+    except:
+        error = create_error(104, "polygon_visibility_thresholds should be a list of float numbers.", arguments['polygon_visibility_thresholds'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+     
+    return pred_parameter_sweep.run(arguments)
+
+def handler(event, context):
+    try:
+        return run(event)
+    except Exception as e:
+        exe_type, _, exc_tb = sys.exc_info()
+        error = create_error(401, "An error occurred in handler function.", str(e), __file__, exc_tb.tb_lineno, exe_type)
+        return report(success=False, error=error , summary_code=700)
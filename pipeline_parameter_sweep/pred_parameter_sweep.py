@@ -0,0 +1,60 @@
+
+
+def run(arguments):
+    try:
+        import sys
+        from utils.helper import (create_error,
+                            report,
+                            export_annotation)
+        from utils.annotation_index import AnnotationIndex
+        from utils.parameter_sweep import ParameterSweep
+        from utils.image_source import open_image_source
+        import os
+        from tqdm import tqdm
+
+        # Initialize parameters
+        input_annotation_path = arguments['input_annotation_path']
+        images_dir = arguments.get('images_dir')
+        output_path = arguments.get('output_path')
+
+        sweep = ParameterSweep(tile_sizes=arguments['tile_sizes'],
+                               strides=arguments['strides'],
+                               polygon_visibility_thresholds=arguments['polygon_visibility_thresholds'])
+
+        annotation_index = AnnotationIndex.load(input_annotation_path)
+
+        # With images_dir, only the images present in it are evaluated
+        available_images = set(os.listdir(images_dir)) if images_dir else None
+
+        for image_name in tqdm(annotation_index, total=len(annotation_index), desc="Sweeping"):
+
+            if available_images is not None and image_name not in available_images:
+                continue
+
+            image_record, image_annotations = annotation_index.get(image_name)
+
+            if image_record.get('height') and image_record.get('width'):
+                image_size = (image_record['height'], image_record['width'])
+            elif images_dir:
+                # Windowed sources only read their header, other formats are decoded
+                with open_image_source(os.path.join(images_dir, image_name)) as image_source:
+                    image_size = image_source.shape[:2]
+            else:
+                raise ValueError(f"The image {image_name} has no width/height in the annotation and no images_dir was given.")
+
+            sweep.add_image(image_size=image_size, image_annotations=image_annotations)
+
+        results = sweep.results()
+
+        if output_path:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            export_annotation(results, output_path, indent=1)
+        
+        return report(success=True, result=results)
+
+    except Exception as e :
+        exc_type, _, exc_tb = sys.exc_info()
+        error = create_error(401, "An error occurred in run function.", str(e), __file__, exc_tb.tb_lineno, exc_type)
+        return report(success=False, error=error, summary_code=700)
+        
+    
@@ -1,6 +1,7 @@
 from pipeline_single_image import pred_single_image
 import sys
 from utils.helper import create_error, report
+from utils.instrumentation import MetricsHook
 import os
 
 
@@ -27,6 +28,60 @@ def run(arguments):
     except:
         error = create_error(104, "polygon_visibility_threshold should be a float number.", arguments['polygon_visibility_threshold'], __file__, sys._getframe().f_lineno)
         return report(success=False, error=error, summary_code=700)
+
+    arguments['tile_format'] = arguments.get('tile_format') or 'jpg'
+    if arguments['tile_format'] not in ('jpg', 'png', 'webp'):
+        error = create_error(104, "tile_format should be one of jpg, png or webp.", arguments['tile_format'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('tile_quality') is not None and (type(arguments['tile_quality']) != int or not 0 <= arguments['tile_quality'] <= 100):
+        error = create_error(104, "tile_quality should be an integer between 0 and 100.", arguments['tile_quality'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('png_compression') is not None and (type(arguments['png_compression']) != int or not 0 <= arguments['png_compression'] <= 9):
+        error = create_error(104, "png_compression should be an integer between 0 and 9.", arguments['png_compression'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['num_writer_threads'] = arguments.get('num_writer_threads') or 4
+    if type(arguments['num_writer_threads']) != int or arguments['num_writer_threads'] < 1:
+        error = create_error(104, "num_writer_threads should be a positive integer.", arguments['num_writer_threads'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['plan_only'] = arguments.get('plan_only') or False
+    if type(arguments['plan_only']) != bool:
+        error = create_error(104, "plan_only should be a boolean.", arguments['plan_only'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['output_mode'] = arguments.get('output_mode') or 'tiles'
+    if arguments['output_mode'] not in ('tiles', 'manifest', 'shards'):
+        error = create_error(104, "output_mode should be one of tiles, manifest or shards.", arguments['output_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('shard_max_bytes') is not None and (type(arguments['shard_max_bytes']) != int or arguments['shard_max_bytes'] <= 0):
+        error = create_error(104, "shard_max_bytes should be a positive integer.", arguments['shard_max_bytes'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['selection_mode'] = arguments.get('selection_mode') or 'greedy'
+    if arguments['selection_mode'] not in ('greedy', 'exact'):
+        error = create_error(104, "selection_mode should be either greedy or exact.", arguments['selection_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('selection_time_budget') is not None and (type(arguments['selection_time_budget']) not in (int, float) or arguments['selection_time_budget'] <= 0):
+        error = create_error(104, "selection_time_budget should be a positive number of seconds.", arguments['selection_time_budget'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    arguments['candidate_mode'] = arguments.get('candidate_mode') or 'grid'
+    if arguments['candidate_mode'] not in ('grid', 'anchored'):
+        error = create_error(104, "candidate_mode should be either grid or anchored.", arguments['candidate_mode'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('trace_path') is not None and type(arguments['trace_path']) != str:
+        error = create_error(104, "trace_path should be a string.", arguments['trace_path'], __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
+
+    if arguments.get('metrics_hooks') is not None and not all(isinstance(hook, MetricsHook) for hook in arguments['metrics_hooks']):
+        error = create_error(104, "metrics_hooks should be a list of MetricsHook.", str(arguments['metrics_hooks']), __file__, sys._getframe().f_lineno)
+        return report(success=False, error=error, summary_code=700)
      
     return pred_single_image.run(arguments)
 
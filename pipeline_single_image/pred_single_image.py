@@ -7,13 +7,18 @@ def run(arguments):
         import sys
         from utils.helper import (create_error,
                             report,
-                            append_to_coco,
-                            export_annotation,
                             save_results)
         from utils.tile_selector import TileSelector
+        from utils.image_source import open_image_source
+        from utils.annotation_index import AnnotationIndex
+        from utils.coco_writer import CocoWriter
+        from utils.coco_builder import CocoBuilder
+        from utils.tile_writer import TileWriter
+        from utils.tile_dataset import ManifestWriter
+        from utils.shard_writer import ShardWriter, encode_tiles
+        from utils.instrumentation import StageMetrics, create_hooks
         import os
-        import cv2
-        from pycocotools.coco import COCO
+        import time
 
         # Initialize parameters
         input_annotation_path = arguments['input_annotation_path']
@@ -21,53 +26,148 @@ def run(arguments):
         tile_size = arguments['tile_size']
         stride = arguments['stride']
         polygon_visibility_threshold=arguments['polygon_visibility_threshold']
+        tile_format = arguments.get('tile_format', 'jpg')
+        output_mode = arguments.get('output_mode', 'tiles')
+
+        # The manifest mode only needs the plan, tiles are cropped when read
+        plan_only = arguments.get('plan_only', False) or output_mode == 'manifest'
         
         output_dir=arguments['output_dir']
-        os.makedirs(f"{output_dir}/tiles", exist_ok=True)
         os.makedirs(f"{output_dir}/annotations", exist_ok=True)
 
+        # Shards and plans hold no tile files
+        if output_mode == 'tiles' and not plan_only:
+            os.makedirs(f"{output_dir}/tiles", exist_ok=True)
+
         output_annotation_path = os.path.join(output_dir,
                                               "annotations", 
                                               f"output_{os.path.basename(input_annotation_path)}")
 
         file_name = os.path.basename(image_path)
+
+        run_start = time.perf_counter()
+        metrics = StageMetrics()
         
-        # Initialize coco annotation
-        new_coco_data = {"images":[],
-                     "annotations":[],
-                     "categories":[]}
-        
-        coco = COCO(input_annotation_path)
+        hooks = create_hooks(arguments)
 
-        new_coco_data['categories'] = coco.dataset['categories'] 
+        try:
+            with metrics.stage("load_annotations"):
+                annotation_index = AnnotationIndex.load(input_annotation_path)
 
-        image_id = next((image['id'] for image in coco.dataset['images'] if image['file_name']==file_name), None)
+            if file_name not in annotation_index:
+                raise ValueError(f"The file {file_name} referenced in the annotation could not be found in the dataset.")
 
-        if image_id is None:
-            raise ValueError(f"The file {image['file_name']} referenced in the annotation could not be found in the dataset.")
+            image_record, image_annotations = annotation_index.get(file_name)
 
-        annotations_ids = coco.getAnnIds(imgIds=image_id)
-        image_annotations = coco.loadAnns(annotations_ids)                    
-                
-        image = cv2.imread(image_path)
-        tileselector = TileSelector(image=image,
-                                    tile_size=tile_size,
-                                    stride=stride,
-                                    image_annotations=image_annotations,
-                                    polygon_visibility_threshold=polygon_visibility_threshold)
-        results = tileselector.run()
+            # Tiles are planned from the declared dimensions, the image is only opened to save the selected tiles
+            if image_record.get('height') and image_record.get('width'):
+                image_source = None
+                image_size = (image_record['height'], image_record['width'])
+            else:
+                with metrics.stage("decode"):
+                    image_source = open_image_source(image_path)
+                image_size = image_source.shape[:2]
 
-        new_coco_data= append_to_coco(coco_data=new_coco_data,
-                                  entry=results,
-                                  file_name=file_name)
-        
-        save_results(output_dir=f"{output_dir}/tiles",
-                    entry=results,
-                    file_name=file_name)
-        
-        export_annotation(new_coco_data, output_annotation_path)
+            tile_locations = None
+
+            try:
+                tileselector = TileSelector(image=None,
+                                            tile_size=tile_size,
+                                            stride=stride,
+                                            image_annotations=image_annotations,
+                                            polygon_visibility_threshold=polygon_visibility_threshold,
+                                            image_size=image_size,
+                                            metrics=metrics,
+                                            selection_mode=arguments.get('selection_mode', 'greedy'),
+                                            time_budget=arguments.get('selection_time_budget', 1.0),
+                                            candidate_mode=arguments.get('candidate_mode', 'grid'))
+                results = tileselector.run()
+
+                if results['tiles'] and not plan_only:
+
+                    # `.npy`, `.raw` and PPM/PGM images are read tile by tile, other formats are decoded whole
+                    if image_source is None:
+                        with metrics.stage("decode"):
+                            image_source = open_image_source(image_path, image_size)
+
+                if output_mode == 'shards' and not plan_only:
+                    with metrics.stage("encode_tiles"):
+                        results['encoded_tiles'] = encode_tiles(results['tiles'],
+                                                                image_source,
+                                                                tile_format=tile_format,
+                                                                quality=arguments.get('tile_quality'),
+                                                                png_compression=arguments.get('png_compression'),
+                                                                num_threads=arguments.get('num_writer_threads', 4))
+
+                    with metrics.stage("write_shards"):
+                        # Named after the image, so images tiled into the same output_dir keep their shards
+                        with ShardWriter(shards_dir=f"{output_dir}/shards",
+                                         max_shard_bytes=arguments.get('shard_max_bytes') or 1 << 30,
+                                         shard_prefix=f"shard.{file_name}",
+                                         index_file_name=f"{file_name}.index.jsonl") as shard_writer:
+                            tile_locations = shard_writer.add_entry(entry=results,
+                                                                    file_name=file_name,
+                                                                    tile_format=tile_format)
+
+                    metrics.count("bytes_written", shard_writer.bytes_written)
+
+                elif results['tiles'] and not plan_only:
+
+                    with TileWriter(tile_format=tile_format,
+                                    quality=arguments.get('tile_quality'),
+                                    png_compression=arguments.get('png_compression'),
+                                    num_threads=arguments.get('num_writer_threads', 4)) as tile_writer:
+
+                        with metrics.stage("write_tiles"):
+                            save_results(output_dir=f"{output_dir}/tiles",
+                                        entry=results,
+                                        file_name=file_name,
+                                        tile_writer=tile_writer,
+                                        image_source=image_source)
+
+                        with metrics.stage("flush_tiles"):
+                            tile_writer.flush()
+
+                    metrics.count("bytes_written", tile_writer.bytes_written)
+            finally:
+                if image_source is not None:
+                    image_source.close()
+
+            with metrics.stage("write_annotations"):
+                # Initialize coco annotation
+                with CocoWriter(output_annotation_path=output_annotation_path,
+                                categories=annotation_index.categories) as new_coco_data:
+
+                    coco_builder = CocoBuilder(categories=annotation_index.categories)
+                    coco_builder.add_entry(entry=results,
+                                           file_name=file_name,
+                                           tile_format=tile_format,
+                                           include_crop=plan_only,
+                                           tile_locations=tile_locations)
+                    coco_builder.flush(new_coco_data)
+
+                if output_mode == 'manifest':
+                    manifest_path = os.path.join(output_dir,
+                                                 "annotations",
+                                                 f"manifest_{os.path.splitext(os.path.basename(input_annotation_path))[0]}.jsonl")
+
+                    with ManifestWriter(manifest_path) as manifest_writer:
+                        manifest_writer.add_entry(entry=results,
+                                                  file_name=file_name,
+                                                  tile_format=tile_format,
+                                                  image_size=image_size)
+
+            metrics.count("images", 1)
+            metrics = {**metrics.to_dict(), "wall_seconds": time.perf_counter() - run_start}
+
+            for hook in hooks:
+                hook.on_image(file_name, metrics)
+                hook.on_complete(metrics)
+        finally:
+            for hook in hooks:
+                hook.close()
         
-        return report(success=True, result=f'All generated tiles are saved in: {output_dir}')
+        return report(success=True, result=f'All generated tiles are saved in: {output_dir}', metrics=metrics)
 
     except Exception as e :
         exc_type, _, exc_tb = sys.exc_info()
@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pipeline_multiple_images import app_multiple_images
+from pipeline_single_image import app_single_image
+from pipeline_parameter_sweep import app_parameter_sweep
+from pipeline_merge_parts import app_merge_parts
+from utils.annotation_index import enable_memory_cache
+from utils.helper import create_error, report
+
+PIPELINES = {"multiple_images": app_multiple_images,
+             "single_image": app_single_image,
+             "parameter_sweep": app_parameter_sweep,
+             "merge_parts": app_merge_parts}
+
+def load_config(default_path, override_path=None):
+    with open(default_path, 'r') as f:
+        config = json.load(f)
+
+    if override_path and os.path.exists(override_path):
+        with open(override_path, 'r') as f:
+            override_config = json.load(f)
+        config.update({k: v for k, v in override_config.items() if v is not None})
+
+    return config
+
+def get_pipeline(event):
+    """
+    Returns the name of the pipeline of a job: its "pipeline" key, or else the one whose
+    arguments it carries ("image_path" for a single image, "tile_sizes" for a sweep,
+    "output_annotation_path" for a merge of partial annotations).
+    """
+    if event.get('pipeline'):
+        return event['pipeline']
+    if 'image_path' in event:
+        return "single_image"
+    if 'tile_sizes' in event:
+        return "parameter_sweep"
+    if 'output_annotation_path' in event:
+        return "merge_parts"
+    return "multiple_images"
+
+def run_job(job_id, line):
+    """
+    Runs one job line through the handler of its pipeline, with the same validation as
+    the run_app scripts, and returns its report tagged with the job id.
+    """
+    try:
+        event = json.loads(line)
+        if type(event) != dict:
+            raise ValueError("A job should be a JSON object.")
+    except ValueError as e:
+        error = create_error(104, "The job is not a valid JSON object.", str(e), __file__, sys._getframe().f_lineno)
+        return {"job_id": job_id, **report(success=False, error=error, summary_code=700)}
+
+    job_id = event.pop('job_id', job_id)
+    pipeline = get_pipeline(event)
+    event.pop('pipeline', None)
+
+    if pipeline not in PIPELINES:
+        error = create_error(104, f"pipeline should be one of {list(PIPELINES)}.", pipeline, __file__, sys._getframe().f_lineno)
+        return {"job_id": job_id, **report(success=False, error=error, summary_code=700)}
+
+    return {"job_id": job_id, "pipeline": pipeline, **PIPELINES[pipeline].handler(event, "")}
+
+def run(jobs_file, output_file, max_concurrent_jobs):
+    """
+    Streams the jobs through a thread pool and writes one report line per job, in input
+    order. At most twice `max_concurrent_jobs` jobs are read ahead, so stdin can be fed
+    while the runner works.
+    """
+    pending = deque()
+
+    def write_result(future):
+        output_file.write(json.dumps(future.result(), default=str))
+        output_file.write('\n')
+        output_file.flush()
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="batch-job") as executor:
+        for line_number, line in enumerate(jobs_file, start=1):
+            if not line.strip():
+                continue
+
+            pending.append(executor.submit(run_job, line_number, line))
+
+            while len(pending) >= 2 * max_concurrent_jobs:
+                write_result(pending.popleft())
+
+        while pending:
+            write_result(pending.popleft())
+
+if __name__ == "__main__":
+    override_config_path = sys.argv[1] if len(sys.argv) > 1 else None
+
+    config = load_config('configs/config_batch_jobs.json', override_config_path)
+
+    sys.argv = [sys.argv[0]]
+
+    # Jobs sharing an annotation file reuse its parsed index
+    enable_memory_cache(config['annotation_cache_size'])
+
+    jobs_file = sys.stdin if config['jobs_path'] in (None, '-') else open(config['jobs_path'], 'r')
+    output_file = sys.stdout if not config.get('output_path') else open(config['output_path'], 'w')
+
+    try:
+        run(jobs_file, output_file, max(1, config['max_concurrent_jobs']))
+    finally:
+        if jobs_file is not sys.stdin:
+            jobs_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from utils.tile_selector import TileSelector
+from utils.incremental_selector import IncrementalTileSelector
+
+IMAGE_SIZE = (800, 1000)
+TILE_SIZE = (256, 256)
+STRIDE = (128, 128)
+
+
+def random_annotation(rng, annotation_id):
+    """
+    A box or a triangle somewhere in the image. Some are larger than a tile, so no tile shows
+    them above the visibility threshold.
+    """
+    x, y = rng.uniform(0, IMAGE_SIZE[1] - 20), rng.uniform(0, IMAGE_SIZE[0] - 20)
+    width, height = rng.uniform(5, 400, 2)
+    category_id = int(rng.integers(3))
+
+    if rng.random() < 0.5:
+        return {"id": annotation_id, "bbox": [x, y, width, height], "category_id": category_id}
+
+    return {"id": annotation_id, "segmentation": [[x, y, x + width, y, x + width / 2, y + height]], "category_id": category_id}
+
+
+def coverable_keys(annotations):
+    """
+    Keys of the annotations a full `TileSelector` pass covers, i.e. every coverable annotation.
+    """
+    keys = list(annotations)
+    result = TileSelector(None, TILE_SIZE, STRIDE, list(annotations.values()), image_size=IMAGE_SIZE).run()
+
+    return {keys[index] for tile_annotations in result['tiles_annotations'] for index in tile_annotations['selected_annotation_ids']}
+
+
+def covered_keys(selector):
+
+    return {key for tile_annotations in selector.run()['tiles_annotations'] for key in tile_annotations['selected_annotation_ids']}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_initial_state_matches_tile_selector(seed):
+
+    rng = np.random.default_rng(seed)
+    image_annotations = [random_annotation(rng, annotation_id) for annotation_id in range(40)]
+
+    expected = TileSelector(None, TILE_SIZE, STRIDE, image_annotations, image_size=IMAGE_SIZE).run()
+    selector = IncrementalTileSelector(IMAGE_SIZE, TILE_SIZE, STRIDE, image_annotations)
+
+    assert selector.run() == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_edits_keep_every_annotation_covered(seed):
+
+    rng = np.random.default_rng(100 + seed)
+    annotations = {annotation_id: random_annotation(rng, annotation_id) for annotation_id in range(30)}
+    next_id = len(annotations)
+
+    selector = IncrementalTileSelector(IMAGE_SIZE, TILE_SIZE, STRIDE, list(annotations.values()))
+    selected_tiles = {tile['id'] for tile in selector.run()['tiles']}
+
+    for _ in range(60):
+        action = rng.choice(["add", "remove", "update"]) if annotations else "add"
+
+        if action == "add":
+            annotations[next_id] = random_annotation(rng, next_id)
+            changes = selector.add_annotation(annotations[next_id])
+            next_id += 1
+        elif action == "remove":
+            key = int(rng.choice(list(annotations)))
+            del annotations[key]
+            changes = selector.remove_annotation(key)
+        else:
+            key = int(rng.choice(list(annotations)))
+            annotations[key] = random_annotation(rng, key)
+            changes = selector.update_annotation(key, annotations[key])
+
+        # The reported changes follow the selection
+        selected_tiles = (selected_tiles - set(changes['deselected_tiles'])) | set(changes['selected_tiles'])
+        assert selected_tiles == {tile['id'] for tile in selector.run()['tiles']}
+
+        coverable = coverable_keys(annotations)
+
+        assert covered_keys(selector) == coverable
+        assert set(selector.uncovered_annotations) == set(annotations) - coverable
+
+    # A full pass over the edited annotations never needs more tiles than it keeps
+    selected_count = len(selected_tiles)
+    selector.reselect()
+
+    assert len(selector.run()['tiles']) <= selected_count
+    assert covered_keys(selector) == coverable_keys(annotations)
+
+
+def test_keys():
+
+    selector = IncrementalTileSelector(IMAGE_SIZE, TILE_SIZE, STRIDE, [{"id": 7, "bbox": [10, 10, 20, 20], "category_id": 0}])
+
+    with pytest.raises(ValueError):
+        selector.add_annotation({"bbox": [50, 50, 20, 20], "category_id": 0}, annotation_id=7)
+
+    with pytest.raises(KeyError):
+        selector.remove_annotation(8)
+
+    selector.add_annotation({"bbox": [50, 50, 20, 20], "category_id": 0})
+
+    assert len(selector) == 2 and 7 in selector
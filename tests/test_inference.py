@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from utils.tile_selector import plan_tiles
+from utils.inference import TileStitcher
+
+
+def detect(tiles, box):
+    """
+    Detections of one object box (image coordinates) in every tile showing part of it.
+    """
+    detections = []
+
+    for tile in tiles:
+        x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+
+        visible = [max(box[0], x_start), max(box[1], y_start), min(box[2], x_end), min(box[3], y_end)]
+
+        if visible[0] < visible[2] and visible[1] < visible[3]:
+            detections.append((tile, np.array([visible]) - [x_start, y_start, x_start, y_start]))
+
+    return detections
+
+
+def stitch(image_size, tile_size, stride, box, edge_margin=16):
+
+    stitcher = TileStitcher(image_size, edge_margin=edge_margin, stride=stride)
+
+    for tile, boxes in detect(plan_tiles(image_size, tile_size, stride), box):
+        stitcher.add(tile, boxes, np.ones(len(boxes)))
+
+    return stitcher.merge(iou_threshold=0.5)
+
+
+def test_object_wider_than_the_overlap_is_kept():
+
+    # 200 pixels do not fit in the 128 - 16 pixels overlap, every tile cuts the object
+    detections = stitch((256, 512), (256, 256), (128, 128), [100, 20, 300, 80])
+
+    assert len(detections['boxes']) == 1
+
+
+def test_object_in_the_overlap_is_kept_once():
+
+    # The first tile holds the object whole, the second one sees it cut by its left edge
+    stitcher = TileStitcher((256, 512), edge_margin=16, stride=(128, 128))
+    tiles = plan_tiles((256, 512), (256, 256), (128, 128))
+    detections = detect(tiles, [120, 20, 140, 80])
+
+    for tile, boxes in detections:
+        stitcher.add(tile, boxes, np.ones(len(boxes)))
+
+    assert len(detections) == 2
+    assert len(stitcher) == 1
+    np.testing.assert_array_equal(stitcher.merge()['boxes'], [[120, 20, 140, 80]])
+
+
+def test_edge_margin_needs_the_stride():
+
+    with pytest.raises(ValueError):
+        TileStitcher((256, 512), edge_margin=16)
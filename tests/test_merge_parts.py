@@ -0,0 +1,102 @@
+import json
+import pytest
+from utils.helper import append_to_coco
+from utils.coco_writer import CocoWriter, find_partial_annotations, merge_coco
+from pipeline_merge_parts import app_merge_parts
+
+CATEGORIES = [{"id": 0, "name": "object"}]
+
+
+def make_entry(num_tiles, polygons_per_tile):
+    """
+    A `TileSelector.run()`-like entry of `num_tiles` tiles with `polygons_per_tile` polygons each.
+    """
+    tiles = [{"id": tile_id, "coordinates": [0, 0, 10, 0, 10, 10, 0, 10]} for tile_id in range(num_tiles)]
+    tiles_annotations = [{"tile_id": tile_id,
+                          "polygons": [[0, 0, 4, 0, 4, 4]] * polygons_per_tile,
+                          "label_indices": [0] * polygons_per_tile} for tile_id in range(num_tiles)]
+
+    return {"tiles": tiles, "tiles_annotations": tiles_annotations}
+
+
+def write_part(annotations_dir, shard_index, num_shards, image_names, id_offset=None):
+
+    path = annotations_dir / f"output_ann.part-{shard_index:05d}-of-{num_shards:05d}.json"
+
+    with CocoWriter(str(path), CATEGORIES) as writer:
+        for image_name in image_names:
+            append_to_coco(coco_data=writer,
+                           entry=make_entry(3, 2),
+                           file_name=image_name,
+                           id_step=num_shards,
+                           id_offset=shard_index if id_offset is None else id_offset)
+
+    return path
+
+
+def test_parts_interleave_without_collisions(tmp_path):
+
+    # Parts of different sizes, as hashing images to shards gives
+    for shard_index, image_names in enumerate([["a.jpg", "b.jpg"], ["c.jpg"], ["d.jpg", "e.jpg", "f.jpg"]]):
+        write_part(tmp_path, shard_index, 3, image_names)
+
+    output_path = tmp_path / "merged.json"
+    counts = merge_coco(find_partial_annotations(str(tmp_path)), str(output_path))
+
+    with open(output_path) as f:
+        merged = json.load(f)
+
+    image_ids = [image['id'] for image in merged['images']]
+    annotation_ids = [annotation['id'] for annotation in merged['annotations']]
+
+    assert counts == {"parts": 3, "images": 18, "annotations": 36}
+    assert len(set(image_ids)) == len(image_ids) == 18
+    assert len(set(annotation_ids)) == len(annotation_ids) == 36
+    assert {annotation['image_id'] for annotation in merged['annotations']} <= set(image_ids)
+    assert merged['categories'] == CATEGORIES
+
+    # Every part keeps its residue of the IDs modulo num_shards
+    assert sorted({image_id % 3 for image_id in image_ids}) == [0, 1, 2]
+
+
+def test_colliding_parts_are_rejected(tmp_path):
+
+    write_part(tmp_path, 0, 2, ["a.jpg"])
+    write_part(tmp_path, 1, 2, ["b.jpg"], id_offset=0)
+
+    with pytest.raises(ValueError):
+        merge_coco(find_partial_annotations(str(tmp_path)), str(tmp_path / "merged.json"))
+
+    assert not (tmp_path / "merged.json").exists()
+
+
+def test_missing_part_is_rejected(tmp_path):
+
+    write_part(tmp_path, 0, 3, ["a.jpg"])
+    write_part(tmp_path, 2, 3, ["b.jpg"])
+
+    with pytest.raises(ValueError):
+        find_partial_annotations(str(tmp_path))
+
+
+def test_handler_reports_errors(tmp_path):
+
+    result = app_merge_parts.handler({"annotations_dir": str(tmp_path / "missing"),
+                                      "output_annotation_path": str(tmp_path / "merged.json")}, "")
+
+    assert not result['success']
+    assert result['error']['code'] == 102
+
+    # No part in the directory
+    result = app_merge_parts.handler({"annotations_dir": str(tmp_path),
+                                      "output_annotation_path": str(tmp_path / "merged.json")}, "")
+
+    assert not result['success']
+    assert result['error']['code'] == 401
+
+    write_part(tmp_path, 0, 1, ["a.jpg"])
+    result = app_merge_parts.handler({"annotations_dir": str(tmp_path),
+                                      "output_annotation_path": str(tmp_path / "merged.json")}, "")
+
+    assert result['success']
+    assert result['result']['images'] == 3
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+import pytest
+from utils.sequence import video_frame_indices, iter_video_frames
+
+
+def test_frame_numbers_come_from_the_file_names():
+
+    # Every 10th frame kept, listed out of order
+    image_records = [{"file_name": "frame_000030.jpg"},
+                     {"file_name": "frame_000010.jpg"},
+                     {"file_name": "frame_000020.jpg"}]
+
+    assert video_frame_indices(image_records) == [30, 10, 20]
+
+
+def test_declared_frame_indices_take_precedence():
+
+    image_records = [{"file_name": "frame_000010.jpg", "frame_index": 3},
+                     {"file_name": "frame_000020.jpg", "frame_id": 5},
+                     {"file_name": "clip/frame_000030.png"}]
+
+    assert video_frame_indices(image_records) == [3, 5, 30]
+
+
+def test_file_name_without_frame_number():
+
+    with pytest.raises(ValueError, match="frame_index"):
+        video_frame_indices([{"file_name": "frame_000010.jpg"}, {"file_name": "cover.jpg"}])
+
+
+def test_subsampled_frames_are_decoded_from_their_position(tmp_path):
+
+    video_path = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+
+    # The gray level of a frame gives its number
+    for frame_index in range(40):
+        writer.write(np.full((48, 64, 3), frame_index * 6, dtype=np.uint8))
+    writer.release()
+
+    image_records = [{"file_name": f"frame_{frame_index:06d}.jpg"} for frame_index in (10, 20, 30)]
+    frames = dict(iter_video_frames(video_path, video_frame_indices(image_records)))
+
+    assert sorted(frames) == [10, 20, 30]
+
+    for frame_index, frame in frames.items():
+        assert abs(float(frame.mean()) - frame_index * 6) < 3
@@ -0,0 +1,82 @@
+import os
+import tarfile
+import numpy as np
+from utils.image_source import ArrayImageSource
+from utils.shard_writer import ShardWriter, ShardReader, encode_tiles
+
+
+def make_entry(image, tile_size, count):
+    """
+    A `TileSelector.run()`-like entry of `count` tiles along the diagonal of the image.
+    """
+    tiles = []
+    tiles_annotations = []
+
+    for tile_id in range(count):
+        x_start = y_start = tile_id * 8
+        x_end, y_end = x_start + tile_size, y_start + tile_size
+
+        tiles.append({"id": tile_id, "coordinates": [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end]})
+        tiles_annotations.append({"tile_id": tile_id,
+                                  "polygons": [[1, 1, 5, 1, 5, 5]],
+                                  "label_indices": [tile_id % 3]})
+
+    return {"tiles": tiles,
+            "tiles_annotations": tiles_annotations,
+            "encoded_tiles": encode_tiles(tiles, ArrayImageSource(image), tile_format="png")}
+
+
+def test_round_trip(tmp_path):
+
+    image = np.random.default_rng(0).integers(0, 256, (256, 256, 3), dtype=np.uint8)
+    entry = make_entry(image, 64, 20)
+
+    with ShardWriter(str(tmp_path), max_shard_bytes=40 * 1024) as shard_writer:
+        tile_locations = shard_writer.add_entry(entry, file_name="image.png", tile_format="png")
+
+    reader = ShardReader(str(tmp_path))
+
+    assert len(reader) == 20
+    assert shard_writer.shard_count > 1
+
+    for tile in entry['tiles']:
+        location = tile_locations[tile['id']]
+        x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+
+        np.testing.assert_array_equal(reader.read_tile(location), image[y_start:y_end, x_start:x_end])
+
+        record = reader.read_record(location)
+        assert record['source_file_name'] == "image.png"
+        assert record['crop_box'] == [x_start, y_start, x_end, y_end]
+        assert record['label_indices'] == [tile['id'] % 3]
+
+
+def test_shards_stay_under_the_limit(tmp_path):
+
+    image = np.random.default_rng(1).integers(0, 256, (256, 256, 3), dtype=np.uint8)
+    max_shard_bytes = 30 * 1024
+
+    with ShardWriter(str(tmp_path), max_shard_bytes=max_shard_bytes) as shard_writer:
+        shard_writer.add_entry(make_entry(image, 48, 24), file_name="x" * 120 + ".png", tile_format="png")
+
+    shards = [name for name in os.listdir(tmp_path) if name.endswith(".tar")]
+
+    assert len(shards) == shard_writer.shard_count > 1
+
+    for name in shards:
+        assert os.path.getsize(tmp_path / name) <= max_shard_bytes
+
+        # Shards are plain tar files
+        with tarfile.open(tmp_path / name) as tar:
+            assert len(tar.getnames()) % 2 == 0
+
+
+def test_writers_sharing_a_directory(tmp_path):
+
+    image = np.random.default_rng(2).integers(0, 256, (128, 128, 3), dtype=np.uint8)
+
+    for name in ("a.png", "b.png"):
+        with ShardWriter(str(tmp_path), shard_prefix=f"shard.{name}", index_file_name=f"{name}.index.jsonl") as shard_writer:
+            shard_writer.add_entry(make_entry(image, 32, 4), file_name=name, tile_format="png")
+
+    assert len(ShardReader(str(tmp_path))) == 8
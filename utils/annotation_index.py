@@ -0,0 +1,232 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Tuple, List, Dict, Iterator
+
+
+# Bump when the pickled layout changes so stale sidecars are rebuilt
+INDEX_VERSION = 2
+
+# Private per-user directory of the sidecars. Pickles are only read from a directory no one else can write to
+INDEX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "roi_cropping", "annotation_index")
+
+# Indexes kept in memory by `load` once `enable_memory_cache` is called, most recently used last
+_memory_cache: "OrderedDict[str, Tuple]" = OrderedDict()
+_memory_cache_size = 0
+_memory_cache_lock = threading.Lock()
+
+
+def image_shard(file_name: str, num_shards: int)-> int:
+    """
+    Returns the shard an image belongs to when a dataset is split across `num_shards` nodes.
+
+    The shard only depends on the file name (through a hash that does not vary between
+    processes or machines), so every node computes the same partition independently, and
+    adding or removing other images never moves an image to another shard.
+
+    Args:
+        file_name (str): Image file name.
+        num_shards (int): Number of shards.
+
+    Returns:
+        int: Shard index in [0, num_shards).
+    """
+    digest = hashlib.md5(file_name.encode('utf-8')).digest()
+
+    return int.from_bytes(digest[:8], 'little') % num_shards
+
+
+def enable_memory_cache(max_entries: int = 8)-> None:
+    """
+    Keeps the last `max_entries` indexes returned by `AnnotationIndex.load` in memory.
+
+    Meant for long-running processes handling many jobs, such as the batch runner. A job
+    sharing its annotation file with an earlier one gets the same index object back, without
+    reading the sidecar again, as long as the file is unchanged. Indexes are shared between
+    jobs, so they must be treated as read-only. 0 disables the cache.
+
+    Args:
+        max_entries (int): Maximum number of annotation files kept in memory.
+    """
+    global _memory_cache_size
+
+    with _memory_cache_lock:
+        _memory_cache_size = max_entries
+        while len(_memory_cache) > max_entries:
+            _memory_cache.popitem(last=False)
+
+
+class AnnotationIndex():
+
+    def __init__(self, categories: List, images: Dict[str, Dict], annotations: Dict[str, List])-> None:
+        """
+        Lightweight COCO index keyed by image file name.
+
+        Args:
+            categories (List): COCO categories.
+            images (Dict[str, Dict]): Image record per file name, in dataset order.
+            annotations (Dict[str, List]): Annotations per file name, in dataset order.
+        """
+        self.categories = categories
+        self.images = images
+        self.annotations = annotations
+
+    @classmethod
+    def from_coco(cls, coco_data: Dict)-> "AnnotationIndex":
+        """
+        Builds the index from a parsed COCO dictionary.
+
+        When several image records share a file name the first one is used. Annotations keep
+        their order in the dataset, as with `pycocotools.coco.COCO.getAnnIds`.
+
+        Args:
+            coco_data (Dict): COCO dataset with "images", "annotations" and "categories".
+
+        Returns:
+            AnnotationIndex: The index.
+        """
+        images = {}
+        annotations = {}
+        file_names = {}
+
+        for image in coco_data['images']:
+            if image['file_name'] not in images:
+                images[image['file_name']] = image
+                annotations[image['file_name']] = []
+                file_names.setdefault(image['id'], image['file_name'])
+
+        for annotation in coco_data['annotations']:
+            file_name = file_names.get(annotation['image_id'])
+            if file_name is not None:
+                annotations[file_name].append(annotation)
+
+        return cls(categories=coco_data.get('categories', []),
+                   images=images,
+                   annotations=annotations)
+
+    @classmethod
+    def load(cls, annotation_path: str, use_cache: bool = True, cache_dir: str = None)-> "AnnotationIndex":
+        """
+        Loads the index of a COCO annotation file, going through a binary sidecar.
+
+        The sidecar stores the index together with the JSON file's path, modification time
+        and size. When they still match, the JSON is not parsed again. Otherwise the JSON is
+        parsed and the sidecar is rewritten. Sidecars are pickles, so they are kept in a
+        private directory (`cache_dir`, created with mode 0700) rather than next to the
+        annotation file, and are only read when the directory and the sidecar belong to the
+        current user and are not writable by anyone else. A sidecar that cannot be written
+        or trusted is skipped silently.
+
+        When `enable_memory_cache` was called, the indexes are also kept in memory between 
+        calls, checked against the same signature.
+
+        Args:
+            annotation_path (str): Path to the COCO JSON file.
+            use_cache (bool): Whether to read and write the sidecar.
+            cache_dir (str): Directory of the sidecars. Defaults to `INDEX_CACHE_DIR`.
+
+        Returns:
+            AnnotationIndex: The index.
+        """
+        stat = os.stat(annotation_path)
+        signature = (INDEX_VERSION, os.path.abspath(annotation_path), stat.st_mtime_ns, stat.st_size)
+
+        if not _memory_cache_size:
+            return cls.__load(annotation_path, signature, use_cache, cache_dir or INDEX_CACHE_DIR)
+
+        memory_key = os.path.abspath(annotation_path)
+
+        with _memory_cache_lock:
+            cached = _memory_cache.get(memory_key)
+            if cached is not None and cached[0] == signature:
+                _memory_cache.move_to_end(memory_key)
+                return cached[1]
+
+        index = cls.__load(annotation_path, signature, use_cache, cache_dir or INDEX_CACHE_DIR)
+
+        with _memory_cache_lock:
+            _memory_cache[memory_key] = (signature, index)
+            _memory_cache.move_to_end(memory_key)
+            while len(_memory_cache) > _memory_cache_size:
+                _memory_cache.popitem(last=False)
+
+        return index
+
+    @staticmethod
+    def __is_private(path: str)-> bool:
+
+        # Owned by the current user and writable by no one else
+        stat = os.stat(path)
+
+        if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+            return False
+
+        return not stat.st_mode & 0o022
+
+    @classmethod
+    def __load(cls, annotation_path: str, signature: Tuple, use_cache: bool, cache_dir: str)-> "AnnotationIndex":
+
+        sidecar_path = os.path.join(cache_dir, hashlib.sha256(signature[1].encode('utf-8')).hexdigest() + ".pkl")
+
+        if use_cache:
+            try:
+                os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+                use_cache = cls.__is_private(cache_dir)
+            except OSError:
+                use_cache = False
+
+        if use_cache and os.path.exists(sidecar_path) and cls.__is_private(sidecar_path):
+            try:
+                with open(sidecar_path, 'rb') as f:
+                    cached_signature, state = pickle.load(f)
+                if cached_signature == signature:
+                    return cls(**state)
+            except Exception:
+                pass
+
+        with open(annotation_path, 'r') as f:
+            index = cls.from_coco(json.load(f))
+
+        if use_cache:
+            state = {"categories": index.categories,
+                     "images": index.images,
+                     "annotations": index.annotations}
+            try:
+                temporary_path = f"{sidecar_path}.{os.getpid()}.tmp"
+                with os.fdopen(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                    pickle.dump((signature, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temporary_path, sidecar_path)
+            except OSError:
+                pass
+
+        return index
+
+    def __len__(self)-> int:
+
+        return len(self.images)
+
+    def __contains__(self, file_name: str)-> bool:
+
+        return file_name in self.images
+
+    def __iter__(self)-> Iterator[str]:
+
+        return iter(self.images)
+
+    def get(self, file_name: str)-> Tuple[Dict, List]:
+        """
+        Returns the image record and the annotations of an image.
+
+        Args:
+            file_name (str): Image file name as written in the COCO "images" records.
+
+        Returns:
+            Tuple[Dict, List]: Image record and its annotations.
+
+        Raises:
+            KeyError: If the file name is not part of the dataset.
+        """
+        return self.images[file_name], self.annotations[file_name]
@@ -0,0 +1,249 @@
+import numpy as np
+from typing import List, Dict, Iterator
+from utils.helper import tile_file_name
+from utils.tile_result import CompactTileResult, flat_polygon_bboxes
+from utils.coco_writer import CocoWriter
+
+
+class CocoBuilder():
+
+    def __init__(self, categories: List, id_step: int = 1, id_offset: int = 0, image_index: int = 0, annotation_index: int = 0)-> None:
+        """
+        COCO records built from `TileSelector.run()` results. The pipelines and
+        `append_to_coco` all go through it.
+
+        The builder allocates the IDs: the n-th image and the n-th annotation get the ID
+        `n * id_step + id_offset`, so the partial outputs of `num_shards` nodes using
+        `id_step=num_shards` and their `shard_index` as offset never share an ID. Records
+        are kept as columns (per-tile NumPy arrays for the boxes and areas, lists for the
+        rest) and only turned into COCO dicts by `flush`, `to_dict`, `images`, `annotations`
+        or `export`. Annotations are joined to their tile through a dict index, and the boxes
+        of a tile are computed in one pass over its polygons, so adding a tile costs time
+        linear in its own annotations.
+
+        Flushing into a `CocoWriter` after each image keeps the builder to one image at a time:
+
+            builder = CocoBuilder(categories)
+            with CocoWriter(output_annotation_path, categories) as writer:
+                for file_name, results in images_results:
+                    builder.add_entry(results, file_name)
+                    builder.flush(writer)
+
+        Args:
+            categories (List): COCO categories of the dataset.
+            id_step (int): Spacing of the IDs.
+            id_offset (int): Offset of the IDs, in [0, id_step).
+            image_index (int): Index of the first image added, e.g. the number of images
+                already in the dataset the records are appended to.
+            annotation_index (int): Index of the first annotation added.
+        """
+        self.categories = categories
+        self.id_step = id_step
+        self.id_offset = id_offset
+
+        # Records before the columns, already flushed or in the target dataset
+        self.image_index = image_index
+        self.annotation_index = annotation_index
+
+        # Image columns
+        self.file_names: List[str] = []
+        self.heights: List[int] = []
+        self.widths: List[int] = []
+        self.source_file_names: List[str] = []
+        self.crop_boxes: List[List[int]] = []
+        self.annotation_counts: List[int] = []
+
+        # Annotation columns, boxes and areas as one array per tile
+        self.category_ids: List[int] = []
+        self.bboxes: List[np.ndarray] = []
+        self.areas: List[np.ndarray] = []
+        self.segmentations: List[List] = []
+
+    @property
+    def num_images(self)-> int:
+
+        return self.image_index + len(self.file_names)
+
+    @property
+    def num_annotations(self)-> int:
+
+        return self.annotation_index + len(self.category_ids)
+
+    def __id(self, index: int)-> int:
+
+        return index * self.id_step + self.id_offset
+
+    def __add_tile(self, tile_name: str, source_file_name: str, tile_box: List, include_crop: bool, bboxes: np.ndarray, label_indices: List, polygons: List)-> int:
+
+        x_start, y_start, x_end, y_end = tile_box
+
+        image_id = self.__id(self.num_images)
+
+        self.file_names.append(tile_name)
+        self.heights.append(y_end - y_start)
+        self.widths.append(x_end - x_start)
+        self.source_file_names.append(source_file_name if include_crop else None)
+        self.crop_boxes.append([x_start, y_start, x_end, y_end] if include_crop else None)
+        self.annotation_counts.append(len(label_indices))
+
+        self.category_ids.extend(label_indices)
+        self.bboxes.append(bboxes)
+        self.areas.append(bboxes[:, 2] * bboxes[:, 3])
+        self.segmentations.extend(polygons)
+
+        return image_id
+
+    def add_entry(self, entry: Dict, file_name: str, tile_format: str = "jpg", include_crop: bool = False, tile_locations: Dict = None)-> List[int]:
+        """
+        Adds the tiles of one image and their annotations.
+
+        Args:
+            entry (Dict): Result of `TileSelector.run()`, as a dict or a `CompactTileResult`.
+                Pixel data is not needed.
+            file_name (str): File name of the source image, used to name the tiles.
+            tile_format (str): Extension of the saved tiles.
+            include_crop (bool): Also record the source image ("source_file_name") and the
+                tile rectangle ("crop_box") in each image record.
+            tile_locations (Dict): Optional file name per tile id replacing the tile file
+                names, e.g. the locations returned by `ShardWriter.add_entry`.
+
+        Returns:
+            List[int]: IDs given to the tiles, in order.
+        """
+        image_ids = []
+
+        def tile_name(tile_id: int)-> str:
+
+            return tile_locations[tile_id] if tile_locations is not None else tile_file_name(file_name, tile_id, tile_format)
+
+        if isinstance(entry, CompactTileResult):
+            annotation_offsets = entry.annotation_offsets.tolist()
+            label_indices = entry.label_indices.tolist()
+            polygon_offsets = entry.polygon_offsets.tolist()
+            polygon_coordinates = entry.polygon_coordinates.tolist()
+            bboxes = entry.polygon_bboxes()
+
+            for tile_index, tile in enumerate(entry.tiles):
+                start, end = annotation_offsets[tile_index], annotation_offsets[tile_index + 1]
+
+                image_ids.append(self.__add_tile(tile_name(tile.id),
+                                                 file_name,
+                                                 tile.box,
+                                                 include_crop,
+                                                 bboxes[start:end],
+                                                 label_indices[start:end],
+                                                 [polygon_coordinates[polygon_offsets[row]:polygon_offsets[row + 1]] for row in range(start, end)]))
+
+            return image_ids
+
+        # Tiles are joined to their annotations through an index instead of a scan per tile
+        tiles_annotations = {}
+        for tile_annotations in entry['tiles_annotations']:
+            tiles_annotations.setdefault(tile_annotations['tile_id'], []).append(tile_annotations)
+
+        for tile in entry['tiles']:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+
+            polygons = []
+            label_indices = []
+            for tile_annotations in tiles_annotations.get(tile['id'], []):
+                polygons.extend(tile_annotations['polygons'])
+                label_indices.extend(tile_annotations['label_indices'])
+
+            polygon_offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+            np.cumsum([len(polygon) for polygon in polygons], out=polygon_offsets[1:])
+
+            # One buffer for the polygons of the tile, boxes in a single reduction
+            polygon_coordinates = np.array([value for polygon in polygons for value in polygon]) if polygons else np.zeros(0, dtype=np.int64)
+
+            image_ids.append(self.__add_tile(tile_name(tile['id']),
+                                             file_name,
+                                             [x_start, y_start, x_end, y_end],
+                                             include_crop,
+                                             flat_polygon_bboxes(polygon_coordinates, polygon_offsets),
+                                             label_indices,
+                                             polygons))
+
+        return image_ids
+
+    def images(self)-> Iterator[Dict]:
+        """
+        Yields the COCO image records.
+        """
+        for index, file_name in enumerate(self.file_names):
+
+            image_info = {"id": self.__id(self.image_index + index),
+                          "file_name": file_name,
+                          "height": self.heights[index],
+                          "width": self.widths[index]}
+
+            if self.crop_boxes[index] is not None:
+                image_info["source_file_name"] = self.source_file_names[index]
+                image_info["crop_box"] = self.crop_boxes[index]
+
+            yield image_info
+
+    def annotations(self)-> Iterator[Dict]:
+        """
+        Yields the COCO annotation records.
+        """
+        row = 0
+
+        for index, (bboxes, areas) in enumerate(zip(self.bboxes, self.areas)):
+            image_id = self.__id(self.image_index + index)
+
+            for bbox, area in zip(bboxes.tolist(), areas.tolist()):
+
+                yield {"id": self.__id(self.annotation_index + row),
+                       "image_id": image_id,
+                       "category_id": self.category_ids[row],
+                       "bbox": bbox,
+                       "area": area,
+                       "segmentation": [self.segmentations[row]],
+                       "iscrowd": 0}
+
+                row += 1
+
+    def flush(self, coco_data: Dict)-> Dict:
+        """
+        Appends the records added since the last flush to a COCO dataset and clears them.
+        The IDs keep counting from the flushed records.
+
+        Args:
+            coco_data (Dict): COCO dataset dictionary, or a `CocoWriter` streaming one.
+
+        Returns:
+            Dict: `coco_data`, with the new images and annotations.
+        """
+        for image_info in self.images():
+            coco_data['images'].append(image_info)
+        for annotation_info in self.annotations():
+            coco_data['annotations'].append(annotation_info)
+
+        self.image_index, self.annotation_index = self.num_images, self.num_annotations
+
+        for column in (self.file_names, self.heights, self.widths, self.source_file_names, self.crop_boxes,
+                       self.annotation_counts, self.category_ids, self.bboxes, self.areas, self.segmentations):
+            column.clear()
+
+        return coco_data
+
+    def to_dict(self)-> Dict:
+        """
+        Returns the dataset as a COCO dictionary.
+        """
+        return {"images": list(self.images()),
+                "annotations": list(self.annotations()),
+                "categories": self.categories}
+
+    def export(self, output_annotation_path: str, indent: int = None)-> None:
+        """
+        Writes the records not flushed yet as a COCO JSON file, one record at a time
+        (`CocoWriter`), so the whole dictionary is never built.
+
+        Args:
+            output_annotation_path (str): Path of the COCO file.
+            indent (int): Optional JSON indentation.
+        """
+        with CocoWriter(output_annotation_path, self.categories, indent=indent) as writer:
+            self.flush(writer)
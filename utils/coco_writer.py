@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import shutil
+from typing import List, Dict
+
+
+class RecordStream():
+
+    def __init__(self, path: str, separators: tuple, indent: int = None)-> None:
+        """
+        Append-only JSON array body written straight to disk.
+
+        Provides the `append` / `len` subset of the list interface used by `append_to_coco`,
+        so it can stand in for the "images" and "annotations" lists of a COCO dictionary.
+
+        Args:
+            path (str): Part file holding the comma separated records.
+            separators (tuple): JSON separators used for every record.
+            indent (int): Optional JSON indentation of every record.
+        """
+        self.path = path
+        self.separators = separators
+        self.indent = indent
+
+        self.file = open(path, 'w')
+        self.count = 0
+
+    def append(self, record: Dict)-> None:
+
+        if self.count:
+            self.file.write(',')
+        json.dump(record, self.file, separators=self.separators, indent=self.indent)
+        self.count += 1
+
+    def __len__(self)-> int:
+
+        return self.count
+
+    def close(self)-> None:
+
+        if not self.file.closed:
+            self.file.close()
+
+
+class CocoWriter():
+
+    def __init__(self, output_annotation_path: str, categories: List, indent: int = None)-> None:
+        """
+        Streams a COCO annotation file to disk while it is being built.
+
+        Image and annotation records go to two part files as soon as they are appended, so
+        memory stays flat however large the dataset grows. `close` concatenates the parts
+        into the final JSON and moves it into place atomically. A half-written run never
+        leaves a truncated annotation file behind.
+
+        The writer can be passed as `coco_data` to `append_to_coco`:
+
+            with CocoWriter(path, categories) as writer:
+                append_to_coco(coco_data=writer, entry=results, file_name=image_name)
+
+        Args:
+            output_annotation_path (str): Final path of the COCO JSON file.
+            categories (List): COCO categories written with the dataset.
+            indent (int): Optional JSON indentation. Compact separators are used by default.
+        """
+        self.output_annotation_path = output_annotation_path
+        self.categories = categories
+        self.indent = indent
+        self.separators = (',', ':') if indent is None else (',', ': ')
+
+        self.images = RecordStream(f"{output_annotation_path}.images.part", self.separators, indent)
+        self.annotations = RecordStream(f"{output_annotation_path}.annotations.part", self.separators, indent)
+
+    def __getitem__(self, key: str)-> RecordStream:
+
+        if key == 'images':
+            return self.images
+        if key == 'annotations':
+            return self.annotations
+        if key == 'categories':
+            return self.categories
+
+        raise KeyError(key)
+
+    def close(self)-> None:
+        """
+        Writes the final COCO file and removes the part files.
+        """
+        self.images.close()
+        self.annotations.close()
+
+        temporary_path = f"{self.output_annotation_path}.tmp"
+
+        with open(temporary_path, 'w') as f:
+            f.write('{"images":[')
+            with open(self.images.path, 'r') as part:
+                shutil.copyfileobj(part, f)
+            f.write('],"annotations":[')
+            with open(self.annotations.path, 'r') as part:
+                shutil.copyfileobj(part, f)
+            f.write('],"categories":')
+            json.dump(self.categories, f, separators=self.separators, indent=self.indent)
+            f.write('}')
+
+        os.replace(temporary_path, self.output_annotation_path)
+        self.__remove_parts()
+
+    def abort(self)-> None:
+        """
+        Discards everything written so far without touching the final path.
+        """
+        self.images.close()
+        self.annotations.close()
+        self.__remove_parts()
+
+    def __remove_parts(self)-> None:
+
+        for path in (self.images.path, self.annotations.path, f"{self.output_annotation_path}.tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self)-> "CocoWriter":
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback)-> None:
+
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+PART_PATTERN = re.compile(r"\.part-(\d{5})-of-(\d{5})\.json$")
+
+
+def find_partial_annotations(annotations_dir: str)-> List[str]:
+    """
+    Returns the partial COCO files written by the nodes of a multi-node run
+    ("output_<name>.part-<k>-of-<n>.json"), in shard order.
+
+    Args:
+        annotations_dir (str): Directory holding the partial files.
+
+    Returns:
+        List[str]: Paths of the partial files.
+
+    Raises:
+        ValueError: If no partial file is found, or if a shard is missing or belongs to a
+            run with another shard count.
+    """
+    parts = {}
+
+    for file_name in os.listdir(annotations_dir):
+        match = PART_PATTERN.search(file_name)
+        if match:
+            parts[(int(match.group(2)), int(match.group(1)))] = os.path.join(annotations_dir, file_name)
+
+    if not parts:
+        raise ValueError(f"No partial annotation file found in {annotations_dir}.")
+
+    num_shards = {num_shards for num_shards, _ in parts}
+    if len(num_shards) > 1 or len(parts) != next(iter(num_shards)):
+        raise ValueError(f"The partial annotation files of {annotations_dir} do not form one complete run: {sorted(parts.values())}.")
+
+    return [parts[key] for key in sorted(parts)]
+
+
+def merge_coco(partial_annotation_paths: List[str], output_annotation_path: str, indent: int = None)-> Dict:
+    """
+    Merges the partial COCO files of a multi-node run into one file.
+
+    Only the annotation files are read, one at a time, and their records are streamed into
+    a `CocoWriter`, so the tiles are never touched. The IDs of the parts are kept as they
+    are: the nodes number their records with `id_step=num_shards` and their shard index as
+    offset (`append_to_coco`), so they never collide.
+
+    Args:
+        partial_annotation_paths (List[str]): Partial COCO files, in the order they are merged.
+        output_annotation_path (str): Path of the merged COCO file.
+        indent (int): Optional JSON indentation.
+
+    Returns:
+        Dict: Number of merged "parts", "images" and "annotations".
+
+    Raises:
+        ValueError: If the parts have different categories or share an image or
+            annotation ID.
+    """
+    categories = None
+    image_ids = set()
+    annotation_ids = set()
+
+    writer = None
+
+    try:
+        for partial_annotation_path in partial_annotation_paths:
+            with open(partial_annotation_path, 'r') as f:
+                coco_data = json.load(f)
+
+            if writer is None:
+                categories = coco_data['categories']
+                writer = CocoWriter(output_annotation_path, categories, indent=indent)
+            elif coco_data['categories'] != categories:
+                raise ValueError(f"The categories of {partial_annotation_path} differ from the ones of {partial_annotation_paths[0]}.")
+
+            for key, records, ids in (("image", coco_data['images'], image_ids), ("annotation", coco_data['annotations'], annotation_ids)):
+                part_ids = {record['id'] for record in records}
+
+                if len(part_ids) != len(records) or not ids.isdisjoint(part_ids):
+                    raise ValueError(f"Duplicate {key} IDs in {partial_annotation_path}, were the parts written with the same num_shards?")
+
+                ids.update(part_ids)
+
+            for image in coco_data['images']:
+                writer['images'].append(image)
+            for annotation in coco_data['annotations']:
+                writer['annotations'].append(annotation)
+
+            del coco_data
+
+        if writer is None:
+            raise ValueError("No partial annotation file to merge.")
+
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    writer.close()
+
+    return {"parts": len(partial_annotation_paths),
+            "images": len(image_ids),
+            "annotations": len(annotation_ids)}
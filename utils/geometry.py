@@ -0,0 +1,259 @@
+import numpy as np
+from typing import Tuple, List, Dict
+import pyclipper
+
+
+def get_area(polygon: List)-> float:
+    """
+    Calculates the absolute area of a polygon with pyclipper.
+
+    Args:
+        polygon (List): Flat [x1, y1, x2, y2, ...] list or pyclipper path(s).
+
+    Returns:
+        float: Absolute polygon area.
+    """
+    polygon = np.array(polygon, dtype=np.float64).reshape(-1, 2).tolist()
+    area = abs(pyclipper.Area(polygon))
+
+    return area
+
+
+def get_intersection(polygon1: List, polygon2: List)-> List:
+    """
+    Computes the intersection of two polygons with pyclipper.
+
+    Args:
+        polygon1 (List): Subject polygon as a flat coordinate list.
+        polygon2 (List): Clip polygon as a flat coordinate list.
+
+    Returns:
+        List: pyclipper solution, a list of closed paths of [x, y] integer points.
+    """
+    polygon1 = np.array(polygon1, dtype=np.float64).reshape(-1, 2).tolist()
+    polygon2 = np.array(polygon2, dtype=np.float64).reshape(-1, 2).tolist()
+
+    clipper = pyclipper.Pyclipper()
+    clipper.AddPath(polygon1, pyclipper.PT_SUBJECT, True)
+    clipper.AddPath(polygon2, pyclipper.PT_CLIP, True)
+
+    intersection = clipper.Execute(pyclipper.CT_INTERSECTION,
+                                   pyclipper.PFT_NONZERO,
+                                   pyclipper.PFT_NONZERO)
+    return intersection
+
+
+def annotation_to_polygon(image_annotation: Dict)-> List:
+    """
+    Returns the polygon of a COCO annotation. If `segmentation` is absent, the bounding box
+    is converted into a rectangle polygon.
+
+    Args:
+        image_annotation (Dict): COCO annotation with `bbox` and optionally `segmentation`.
+
+    Returns:
+        List: Flat [x1, y1, x2, y2, ...] polygon.
+    """
+    if not image_annotation.get('segmentation'):
+        x_min, y_min, w, h = image_annotation['bbox']
+        polygon = [x_min, y_min, x_min+w, y_min, x_min+w, y_min+h, x_min, y_min+h]
+    else:
+        polygon = image_annotation['segmentation'][0]
+
+    return polygon
+
+
+def tile_boxes_from_coordinates(tiles: List)-> np.ndarray:
+    """
+    Converts tile polygons into an (T, 4) array of [x_start, y_start, x_end, y_end] boxes.
+
+    Args:
+        tiles (List[dict]): Tiles with 8-int "coordinates" as produced by TileSelector.
+
+    Returns:
+        np.ndarray: int64 array of tile boxes.
+    """
+    coordinates = np.array([tile['coordinates'] for tile in tiles], dtype=np.int64).reshape(-1, 8)
+
+    return coordinates[:, [0, 1, 4, 5]]
+
+
+class AnnotationGeometry():
+
+    def __init__(self, image_annotations: List)-> None:
+        """
+        Builds the geometry table of one image's annotations.
+
+        The table holds, per annotation, its polygon, the polygon bounding box, its area and
+        whether it is an axis-aligned rectangle. Coordinates are truncated to integers the same
+        way pyclipper does, so every value computed from the table matches a pyclipper result.
+
+        Args:
+            image_annotations (List): COCO annotations of a single image.
+        """
+        self.image_annotations = image_annotations
+        self.polygons = [annotation_to_polygon(image_annotation) for image_annotation in image_annotations]
+        self.label_indices = [image_annotation['category_id'] for image_annotation in image_annotations]
+
+        num_annotations = len(self.polygons)
+
+        self.boxes = np.zeros((num_annotations, 4), dtype=np.int64)
+        self.is_rectangle = np.zeros(num_annotations, dtype=bool)
+        self.areas = np.zeros(num_annotations, dtype=np.float64)
+
+        for annotation_id, polygon in enumerate(self.polygons):
+
+            points = np.trunc(np.array(polygon, dtype=np.float64).reshape(-1, 2)).astype(np.int64)
+
+            self.boxes[annotation_id, :2] = points.min(axis=0)
+            self.boxes[annotation_id, 2:] = points.max(axis=0)
+            self.is_rectangle[annotation_id] = self.__is_rectangle(points)
+
+            if self.is_rectangle[annotation_id]:
+                x_min, y_min, x_max, y_max = self.boxes[annotation_id]
+                self.areas[annotation_id] = (x_max - x_min) * (y_max - y_min)
+            else:
+                self.areas[annotation_id] = get_area(polygon)
+
+        # pyclipper paths of polygons lying strictly inside a tile, computed on first use
+        self.__inner_paths: Dict[int, List] = {}
+
+        self.clipper_calls = 0
+
+    @staticmethod
+    def __is_rectangle(points: np.ndarray)-> bool:
+
+        if len(points) != 4:
+            return False
+
+        x, y = points[:, 0], points[:, 1]
+
+        horizontal_first = y[0] == y[1] and x[1] == x[2] and y[2] == y[3] and x[3] == x[0]
+        vertical_first = x[0] == x[1] and y[1] == y[2] and x[2] == x[3] and y[3] == y[0]
+
+        return bool((horizontal_first or vertical_first) and x.min() < x.max() and y.min() < y.max())
+
+    def __len__(self)-> int:
+
+        return len(self.polygons)
+
+    def __clip(self, annotation_id: int, tile_box: np.ndarray)-> List:
+
+        x_start, y_start, x_end, y_end = (int(value) for value in tile_box)
+        self.clipper_calls += 1
+
+        return get_intersection(self.polygons[annotation_id],
+                                [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end])
+
+    def __inner_path(self, annotation_id: int)-> List:
+
+        # A polygon strictly inside a tile is returned by pyclipper exactly as when it is
+        # clipped against any larger rectangle, so one clip serves every enclosing tile.
+        if annotation_id not in self.__inner_paths:
+            x_min, y_min, x_max, y_max = self.boxes[annotation_id]
+            self.__inner_paths[annotation_id] = self.__clip(annotation_id, [x_min - 1, y_min - 1, x_max + 1, y_max + 1])
+
+        return self.__inner_paths[annotation_id]
+
+    def intersect(self, tile_boxes: np.ndarray)-> Tuple[np.ndarray, Dict]:
+        """
+        Computes the tiles x annotations intersection-area matrix.
+
+        Rectangles are intersected in one broadcasted pass over the box arrays. Polygons are
+        settled from their bounding box when they lie fully outside (area 0) or strictly inside
+        a tile, and only polygons crossing a tile edge are clipped with pyclipper.
+
+        Args:
+            tile_boxes (np.ndarray): (T, 4) array of [x_start, y_start, x_end, y_end] tile boxes.
+
+        Returns:
+            Tuple[np.ndarray, Dict]:
+                - (T, N) float64 matrix of intersection areas.
+                - pyclipper intersections of the clipped pairs keyed by (tile_index, annotation_id).
+        """
+        tile_boxes = np.asarray(tile_boxes, dtype=np.int64).reshape(-1, 4)
+        boxes = self.boxes
+
+        overlap_width = np.minimum(tile_boxes[:, None, 2], boxes[None, :, 2]) - np.maximum(tile_boxes[:, None, 0], boxes[None, :, 0])
+        overlap_height = np.minimum(tile_boxes[:, None, 3], boxes[None, :, 3]) - np.maximum(tile_boxes[:, None, 1], boxes[None, :, 1])
+
+        areas = (np.clip(overlap_width, 0, None) * np.clip(overlap_height, 0, None)).astype(np.float64)
+
+        clipped = {}
+        polygon_ids = np.flatnonzero(~self.is_rectangle)
+
+        if len(polygon_ids):
+            polygon_boxes = boxes[polygon_ids]
+
+            strictly_inside = ((tile_boxes[:, None, 0] < polygon_boxes[None, :, 0]) &
+                               (tile_boxes[:, None, 1] < polygon_boxes[None, :, 1]) &
+                               (tile_boxes[:, None, 2] > polygon_boxes[None, :, 2]) &
+                               (tile_boxes[:, None, 3] > polygon_boxes[None, :, 3]))
+            overlapping = (overlap_width[:, polygon_ids] > 0) & (overlap_height[:, polygon_ids] > 0)
+
+            areas[:, polygon_ids] = 0
+
+            for tile_index, column in zip(*np.nonzero(strictly_inside)):
+                annotation_id = polygon_ids[column]
+                areas[tile_index, annotation_id] = get_area(self.__inner_path(annotation_id))
+
+            for tile_index, column in zip(*np.nonzero(overlapping & ~strictly_inside)):
+                annotation_id = polygon_ids[column]
+                intersection = self.__clip(annotation_id, tile_boxes[tile_index])
+
+                clipped[(tile_index, annotation_id)] = intersection
+                areas[tile_index, annotation_id] = get_area(intersection)
+
+        return areas, clipped
+
+    def visibility(self, intersection_areas: np.ndarray)-> np.ndarray:
+        """
+        Converts an intersection-area matrix into visibility ratios (intersection / annotation area).
+
+        Args:
+            intersection_areas (np.ndarray): (T, N) matrix returned by `intersect`.
+
+        Returns:
+            np.ndarray: (T, N) float64 matrix of visibility ratios.
+        """
+        if np.any(self.areas == 0):
+            raise ZeroDivisionError(f"Annotation {int(np.flatnonzero(self.areas == 0)[0])} has zero area.")
+
+        return intersection_areas / self.areas
+
+    def intersection_path(self, annotation_id: int, tile_index: int, tile_box: np.ndarray, clipped: Dict)-> List:
+        """
+        Returns the pyclipper intersection of an annotation with a tile, reusing the work done
+        by `intersect`.
+
+        Args:
+            annotation_id (int): Index of the annotation in the table.
+            tile_index (int): Row of the tile in the matrix passed to `intersect`.
+            tile_box (np.ndarray): [x_start, y_start, x_end, y_end] of the tile.
+            clipped (Dict): Clipped pairs returned by `intersect`.
+
+        Returns:
+            List: Intersection in pyclipper format, a list of closed paths.
+        """
+        if (tile_index, annotation_id) in clipped:
+            return clipped[(tile_index, annotation_id)]
+
+        if not self.is_rectangle[annotation_id]:
+            x_start, y_start, x_end, y_end = tile_box
+            x_min, y_min, x_max, y_max = self.boxes[annotation_id]
+
+            if x_start < x_min and y_start < y_min and x_end > x_max and y_end > y_max:
+                return self.__inner_path(annotation_id)
+
+            return self.__clip(annotation_id, tile_box)
+
+        x_min, y_min = np.maximum(self.boxes[annotation_id, :2], tile_box[:2])
+        x_max, y_max = np.minimum(self.boxes[annotation_id, 2:], tile_box[2:])
+
+        if x_min >= x_max or y_min >= y_max:
+            return []
+
+        # Same vertex order pyclipper produces for the intersection of two rectangles
+        x_min, y_min, x_max, y_max = int(x_min), int(y_min), int(x_max), int(y_max)
+
+        return [[[x_max, y_max], [x_min, y_max], [x_min, y_min], [x_max, y_min]]]
@@ -2,14 +2,18 @@ from typing import List, Dict
 import os
 import cv2
 import json
+from utils.tile_result import CompactTileResult
 
-def report(success=True, result=None, error=None, summary_code=200):
+def report(success=True, result=None, error=None, summary_code=200, metrics=None):
     summary={
         "success" : success,
         "result" : result,
         "error" : error
     }
 
+    if metrics is not None:
+        summary["metrics"] = metrics
+
     return summary
 
 def create_error(code, message, details, filename, lineno, type=None):
@@ -27,97 +31,145 @@ def create_error(code, message, details, filename, lineno, type=None):
 
     return error
 
-def append_to_coco(coco_data: Dict, entry:Dict, file_name:str)-> Dict:
+def tile_file_name(file_name:str, tile_id:int, tile_format:str="jpg")-> str:
+    """
+    Returns the file name of a tile, built from the original image name and the tile ID.
+
+    Args:
+        file_name (str): Original filename of the full image.
+        tile_id (int): Tile identifier.
+        tile_format (str): Tile file extension.
+
+    Returns:
+        str: Tile file name.
+    """
+    return f"{file_name[:-4]}_{tile_id}.{tile_format}"
+
+def append_to_coco(coco_data: Dict, entry:Dict, file_name:str, tile_format:str="jpg", include_crop:bool=False, tile_locations:Dict=None, id_step:int=1, id_offset:int=0)-> Dict:
     """
     Appends tiled image and annotation data to an existing COCO-format dataset.
 
     This function processes a set of image tiles and their annotations from a single 
-    original image entry and integrates them into an existing COCO dataset dictionary.
+    original image entry and integrates them into an existing COCO dataset dictionary, 
+    through a `utils.coco_builder.CocoBuilder` numbering the records after those already 
+    in `coco_data`.
 
     Args:
     coco_data (Dict): Existing COCO dataset dictionary with keys like "images" and "annotations".
     entry (Dict): Dictionary containing:
-        - "tiles": List of tiles with image data and IDs.
+        - "tiles": List of tiles with IDs and coordinates. Image data is not required.
         - "tiles_annotations": Corresponding annotations per tile with polygons and labels.
+        A `CompactTileResult` is also accepted.
     file_name (str): Original filename of the full image; used to generate tile filenames.
+    tile_format (str): Extension of the saved tiles ("jpg", "png" or "webp").
+    include_crop (bool): Also record the source image ("source_file_name") and the tile 
+        rectangle in it ("crop_box" as [x_start, y_start, x_end, y_end]) in each image entry.
+    tile_locations (Dict): Optional file name per tile id replacing the tile file names, e.g. 
+        the "<shard>/<tile file name>" locations returned by `ShardWriter.add_entry`.
+    id_step (int): Spacing of the image and annotation IDs. The n-th record gets the ID 
+        `n * id_step + id_offset`, so the partial outputs of `num_shards` nodes using 
+        `id_step=num_shards` and their `shard_index` as offset never share an ID.
+    id_offset (int): Offset of the IDs, in [0, id_step).
 
     Returns:
         Dict: Updated COCO dataset dictionary including the new tiles and annotations.
     """
-    def convert_polygon_to_bbox(polygon:List)->List:
-        
-        xs = polygon[0::2]
-        ys = polygon[1::2]
-
-        x_min, y_min = min(xs), min(ys)
-        x_max, y_max = max(xs), max(ys)
-
-        return [x_min, y_min, x_max-x_min, y_max-y_min]
-
-    image_id = len(coco_data['images'])
-    annotation_id = len(coco_data['annotations'])
-
-    for tile in entry['tiles']:
-        
-        tile_height, tile_width = tile['data'].shape[:2]
-
-        image_info = {"id":image_id,
-                      "file_name":f"{file_name[:-4]}_{tile['id']}.jpg",
-                      "height":tile_height,
-                      "width":tile_width}
-        
-        coco_data['images'].append(image_info)
-
-        for tile_annotations in entry['tiles_annotations']:
-            if tile_annotations['tile_id']==tile['id']:
-                for polygon, label_index in zip(tile_annotations['polygons'], tile_annotations['label_indices']):   
-                    
-                    bbox = convert_polygon_to_bbox(polygon)
-                    
-                    annotation_info = {"id": annotation_id,
-                                       "image_id": image_id,
-                                       "category_id": label_index,
-                                       "bbox":bbox,
-                                       "area":bbox[2]*bbox[3],
-                                       "segmentation":[polygon],
-                                       "iscrowd":0}
-                    
-                    coco_data['annotations'].append(annotation_info)
-                    annotation_id+=1
-        image_id+=1
-
-    return coco_data
+    # Imported here as utils.coco_builder imports this module
+    from utils.coco_builder import CocoBuilder
+
+    coco_builder = CocoBuilder(categories=None,
+                               id_step=id_step,
+                               id_offset=id_offset,
+                               image_index=len(coco_data['images']),
+                               annotation_index=len(coco_data['annotations']))
+
+    coco_builder.add_entry(entry=entry,
+                           file_name=file_name,
+                           tile_format=tile_format,
+                           include_crop=include_crop,
+                           tile_locations=tile_locations)
+
+    return coco_builder.flush(coco_data)
+
+
+def strip_tile_data(entry: Dict)-> Dict:
+    """
+    Returns a copy of a TileSelector result without the tile pixel arrays.
+
+    The compact result holds everything `append_to_coco` needs and is cheap to send 
+    between processes.
+
+    Args:
+        entry (Dict): Result of `TileSelector.run()`.
+
+    Returns:
+        Dict: The same result where each tile only keeps its 'id' and 'coordinates'. A 
+        `CompactTileResult` is returned as a `CompactTileResult` without pixels.
+    """
+    if isinstance(entry, CompactTileResult):
+        return entry.without_data()
+
+    tiles = [{"id": tile['id'], "coordinates": tile['coordinates']} for tile in entry['tiles']]
+
+    return {"tiles": tiles,
+            "tiles_annotations": entry['tiles_annotations']}
 
     
-def save_results(output_dir:str, entry:Dict, file_name:str)-> None:
+def save_results(output_dir:str, entry:Dict, file_name:str, tile_writer=None, image_source=None)-> None:
     """
     Saves the image tiles from the entry to disk with filenames based on the original image.
 
     Args:
         output_dir (str): Path to the directory where the tiles will be saved.
         entry (Dict): Dictionary containing a list of tiles under the 'tiles' key. Each tile 
-            must have 'id' and 'data' keys.
+            must have 'id' and 'data' keys, or 'id' and 'coordinates' when `image_source` is given. 
+            A `CompactTileResult` is read the same way through its `TileRecord`s.
         file_name (str): Original filename of the full image, used as a base for tile filenames.
+        tile_writer (TileWriter): Optional background writer (`utils.tile_writer.TileWriter`). 
+            Tiles are then queued in its codec and written asynchronously, call its `flush` 
+            before relying on the files. Without it, tiles are written synchronously as JPEG.
+        image_source (ImageSource): Optional source (`utils.image_source`) the pixels of tiles 
+            without 'data' are read from. Tiles are read one at a time, right before being 
+            written or queued, so only a few tiles are held in memory at once.
 
     Returns:
         None
     """
     tiles = entry['tiles']
     for tile in tiles:
-        output_path=os.path.join(output_dir, f"{file_name[:-4]}_{tile['id']}.jpg")
-        cv2.imwrite(output_path, tile['data'])
+        if 'data' in tile:
+            data = tile['data']
+        else:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+            data = image_source.read_region(x_start, y_start, x_end, y_end)
 
+        if tile_writer is None:
+            output_path=os.path.join(output_dir, tile_file_name(file_name, tile['id']))
+            cv2.imwrite(output_path, data)
+        else:
+            output_path=os.path.join(output_dir, tile_file_name(file_name, tile['id'], tile_writer.tile_format))
+            tile_writer.submit(output_path, data)
 
-def export_annotation(data:Dict, output_annotation_path:str)-> None:
+
+def export_annotation(data:Dict, output_annotation_path:str, indent:int=None)-> None:
     """
     Exports annotation data to a JSON file.
 
+    The file is written next to its destination and moved into place atomically. The 
+    pipelines stream their output with `utils.coco_writer.CocoWriter` instead; this 
+    function is meant for annotation sets already held in memory.
+
     Args:
         data (Dict): The annotation data to be saved, typically in COCO or similar format.
         output_annotation_path (str): File path where the JSON annotation will be written.
+        indent (int): Optional JSON indentation. Compact separators are used by default.
 
     Returns:
         None
     """
-    with open(output_annotation_path, 'w') as f:
-        json.dump(data,f, indent=4)
\ No newline at end of file
+    separators = (',', ':') if indent is None else (',', ': ')
+
+    temporary_path = f"{output_annotation_path}.tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(data, f, indent=indent, separators=separators)
+    os.replace(temporary_path, output_annotation_path)
\ No newline at end of file
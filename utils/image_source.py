@@ -0,0 +1,306 @@
+import os
+import mmap
+from abc import ABC, abstractmethod
+from typing import Tuple
+import numpy as np
+import cv2
+
+
+class ImageSizeError(ValueError):
+    """
+    Raised by `open_image_source` when an image does not have the size declared by its record.
+    """
+
+
+def check_region(shape: Tuple, x_start: int, y_start: int, x_end: int, y_end: int)-> None:
+    """
+    Raises a ValueError when the rectangle [x_start, x_end) x [y_start, y_end) is not
+    inside an image of the given shape, instead of letting a read return a truncated region.
+    """
+    height, width = shape[:2]
+
+    if not (0 <= x_start <= x_end <= width and 0 <= y_start <= y_end <= height):
+        raise ValueError(f"The region ({x_start}, {y_start}, {x_end}, {y_end}) is outside the {width}x{height} image.")
+
+
+class ImageSource(ABC):
+    """
+    Read access to the pixels of an image, one rectangular region at a time.
+
+    `shape` is (height, width) or (height, width, channels) and `dtype` the type of the
+    samples, and regions come back in the channel order of `cv2.imread` (BGR). Windowed
+    sources only read the requested region, so images larger than memory can be tiled.
+    """
+
+    shape: Tuple
+    dtype: np.dtype = np.dtype(np.uint8)
+
+    @abstractmethod
+    def read_region(self, x_start: int, y_start: int, x_end: int, y_end: int)-> np.ndarray:
+        """
+        Returns the pixels of the rectangle [x_start, x_end) x [y_start, y_end).
+
+        Raises:
+            ValueError: If the rectangle is not inside the image (`check_region`).
+        """
+        raise NotImplementedError
+
+    def close(self)-> None:
+
+        pass
+
+    def __enter__(self)-> "ImageSource":
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback)-> None:
+
+        self.close()
+
+
+class ArrayImageSource(ImageSource):
+
+    def __init__(self, image: np.ndarray)-> None:
+        """
+        Image held in memory, e.g. decoded by `cv2.imread`. Regions are views of the array.
+        """
+        self.image = image
+        self.shape = image.shape
+        self.dtype = image.dtype
+
+    def read_region(self, x_start: int, y_start: int, x_end: int, y_end: int)-> np.ndarray:
+
+        check_region(self.shape, x_start, y_start, x_end, y_end)
+
+        return self.image[y_start:y_end, x_start:x_end]
+
+    def close(self)-> None:
+
+        self.image = None
+
+
+class MemmapImageSource(ImageSource):
+
+    def __init__(self, image_path: str, image_size: Tuple = None, channels: int = None, offset: int = 0)-> None:
+        """
+        Memory-mapped uint8 image: a NumPy `.npy` array of shape (H, W) or (H, W, C), or a
+        headerless raw file of row-major (H, W) or (H, W, C) pixels.
+
+        Only the pages under a requested region are read from disk. Every region is copied
+        out of the mapping and the pages of its rows are released right away, so the mapped
+        file never accumulates in the process memory.
+
+        Args:
+            image_path (str): Path to the `.npy` or raw file, stored in BGR order.
+            image_size (Tuple): (height, width) of a raw file, e.g. from the COCO image record.
+                Unused for `.npy` files.
+            channels (int): Channel count of a raw file. By default it is derived from the
+                file size and `image_size`, and must be 1, 3 or 4.
+            offset (int): Bytes to skip at the start of a raw file.
+        """
+        self.file = open(image_path, 'rb')
+
+        try:
+            if image_path.endswith(".npy"):
+                shape, dtype, fortran_order, offset = self.__read_npy_header(self.file)
+            else:
+                shape, dtype, fortran_order = self.__raw_shape(image_path, image_size, channels, offset), np.dtype(np.uint8), False
+
+            if dtype != np.uint8 or len(shape) not in (2, 3):
+                raise ValueError(f"The image {image_path} should be a 2D or 3D uint8 array, got {dtype} {shape}.")
+
+            # A raw file carries no size, a wrong one would map shifted rows
+            if os.path.getsize(image_path) != offset + int(np.prod(shape)):
+                raise ValueError(f"The image {image_path} has {os.path.getsize(image_path)} bytes, {offset + int(np.prod(shape))} expected for the shape {shape}.")
+
+            # The mapping is kept to release the pages of the regions read
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+
+        self.array = np.ndarray(shape, dtype=np.uint8, buffer=self.mapping, offset=offset, order='F' if fortran_order else 'C')
+        self.shape = self.array.shape
+
+        # Rows are contiguous in the file only in C order
+        self.data_offset = None if fortran_order else offset
+        self.row_bytes = self.array.strides[0]
+
+    @staticmethod
+    def __read_npy_header(file)-> Tuple:
+
+        version = np.lib.format.read_magic(file)
+
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+
+        return shape, dtype, fortran_order, file.tell()
+
+    @staticmethod
+    def __raw_shape(image_path: str, image_size: Tuple, channels: int, offset: int)-> Tuple:
+
+        if image_size is None:
+            raise ValueError(f"The size of the raw image {image_path} is needed to read it.")
+
+        height, width = image_size
+
+        if channels is None:
+            channels, remainder = divmod(os.path.getsize(image_path) - offset, height * width)
+
+            if remainder or channels not in (1, 3, 4):
+                raise ImageSizeError(f"The raw image {image_path} has {os.path.getsize(image_path)} bytes, which is not a {width}x{height} image of 1, 3 or 4 channels.")
+
+        return (height, width) + ((channels,) if channels > 1 else ())
+
+    def read_region(self, x_start: int, y_start: int, x_end: int, y_end: int)-> np.ndarray:
+
+        check_region(self.shape, x_start, y_start, x_end, y_end)
+
+        region = np.array(self.array[y_start:y_end, x_start:x_end])
+
+        # The kernel maps whole pages around every row touched, far more than the tile
+        if self.data_offset is not None and y_end > y_start and hasattr(mmap, 'MADV_DONTNEED'):
+            start = self.data_offset + y_start * self.row_bytes
+            end = self.data_offset + y_end * self.row_bytes
+            start -= start % mmap.PAGESIZE
+            self.mapping.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+        return region
+
+    def close(self)-> None:
+
+        # The array exports the buffer of the mapping, it has to go first
+        self.array = None
+
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+        if not self.file.closed:
+            self.file.close()
+
+
+class NetpbmImageSource(ImageSource):
+
+    def __init__(self, image_path: str)-> None:
+        """
+        Binary PPM (P6) or PGM (P5) image with 8-bit samples, read row strip by row strip.
+
+        A region is assembled from one positioned read per row, covering only its columns,
+        so memory stays bounded by the region itself whatever the image width.
+
+        Args:
+            image_path (str): Path to the Netpbm file.
+        """
+        self.file = open(image_path, 'rb')
+
+        magic, width, height, maxval, self.offset = self.__read_header(self.file)
+
+        if magic not in (b"P5", b"P6") or maxval > 255:
+            self.file.close()
+            raise ValueError(f"The image {image_path} should be a binary 8-bit PPM or PGM file.")
+
+        self.channels = 3 if magic == b"P6" else 1
+        self.shape = (height, width, 3) if self.channels == 3 else (height, width)
+
+    @staticmethod
+    def __read_header(file)-> Tuple:
+
+        fields = []
+        token = b""
+
+        while len(fields) < 4:
+            char = file.read(1)
+
+            if not char:
+                raise ValueError("Truncated Netpbm header.")
+            if char == b"#":
+                file.readline()
+            elif char.isspace():
+                if token:
+                    fields.append(token)
+                    token = b""
+            else:
+                token += char
+
+        # A single whitespace separates the header from the pixels
+        return fields[0], int(fields[1]), int(fields[2]), int(fields[3]), file.tell()
+
+    def read_region(self, x_start: int, y_start: int, x_end: int, y_end: int)-> np.ndarray:
+
+        check_region(self.shape, x_start, y_start, x_end, y_end)
+
+        width = self.shape[1]
+        row_bytes = (x_end - x_start) * self.channels
+
+        region = np.empty((y_end - y_start, row_bytes), dtype=np.uint8)
+        file_descriptor = self.file.fileno()
+
+        for row in range(y_start, y_end):
+            position = self.offset + (row * width + x_start) * self.channels
+            region[row - y_start] = np.frombuffer(os.pread(file_descriptor, row_bytes, position), dtype=np.uint8)
+
+        if self.channels == 1:
+            return region
+
+        # Netpbm stores RGB
+        return np.ascontiguousarray(region.reshape(y_end - y_start, x_end - x_start, 3)[:, :, ::-1])
+
+    def close(self)-> None:
+
+        if not self.file.closed:
+            self.file.close()
+
+
+def is_windowed(image_path: str)-> bool:
+    """
+    Whether `open_image_source` reads the image by regions rather than decoding it whole.
+    Opening a windowed source only reads its header.
+    """
+    return os.path.splitext(image_path)[1].lower() in (".npy", ".raw", ".ppm", ".pgm", ".pnm")
+
+
+def open_image_source(image_path: str, image_size: Tuple = None)-> ImageSource:
+    """
+    Opens an image for region reads, picking the source from its extension.
+
+    `.npy` and `.raw` files are memory-mapped and PPM/PGM files are read by row strips, so
+    only the regions asked for are ever read (`is_windowed`). Other formats are decoded
+    whole by `cv2.imread`, as 3 channel 8-bit images.
+
+    Tiles may be planned from the size declared by the COCO record, so when `image_size`
+    is given the size of the image is checked against it.
+
+    Args:
+        image_path (str): Path to the image.
+        image_size (Tuple): (height, width) the image is expected to have, required for
+            raw files.
+
+    Returns:
+        ImageSource: The opened source, to be closed after use.
+
+    Raises:
+        ValueError: If the image cannot be read.
+        ImageSizeError: If its size differs from `image_size`.
+    """
+    extension = os.path.splitext(image_path)[1].lower()
+
+    if extension in (".npy", ".raw"):
+        source = MemmapImageSource(image_path, image_size=image_size)
+    elif extension in (".ppm", ".pgm", ".pnm"):
+        source = NetpbmImageSource(image_path)
+    else:
+        image = cv2.imread(image_path)
+
+        if image is None:
+            raise ValueError(f"The image {image_path} could not be read.")
+
+        source = ArrayImageSource(image)
+
+    if image_size is not None and tuple(source.shape[:2]) != tuple(image_size):
+        source.close()
+        raise ImageSizeError(f"The image {image_path} is {source.shape[1]}x{source.shape[0]} but its record declares {image_size[1]}x{image_size[0]} (width x height).")
+
+    return source
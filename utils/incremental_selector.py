@@ -0,0 +1,357 @@
+from typing import Tuple, List, Dict
+from utils.geometry import AnnotationGeometry, tile_boxes_from_coordinates
+from utils.set_cover import to_bitset, lazy_greedy_cover
+from utils.spatial_index import GridIndex
+from utils.instrumentation import StageMetrics
+from utils.tile_selector import plan_tiles
+
+
+class IncrementalTileSelector():
+
+    def __init__(self, image_size: Tuple, tile_size: Tuple, stride: Tuple, image_annotations: List = (), polygon_visibility_threshold: float = 0.8, metrics: StageMetrics = None)-> None:
+        """
+        Tile selection kept up to date while the annotations of an image are edited, e.g. by
+        a labeling tool.
+
+        The tile lattice (`plan_tiles`) and a grid index over the tile boxes are built once.
+        Every annotation keeps the set of tiles it is visible in, and every tile the set of
+        annotations it covers. An edit only clips the annotation against the tiles under its
+        box, and the cover is repaired locally: a newly uncovered annotation gets the
+        candidate tile covering the most uncovered annotations, then the selected tiles
+        around the edit that became redundant are dropped.
+
+        The initial annotations are selected like `TileSelector.run()` (same greedy cover).
+        Local repairs never leave an annotation uncovered, but after many edits the
+        selection can drift from what a full pass would choose. `reselect` runs the greedy
+        cover again over the current coverage, without clipping anything.
+
+        Annotations are identified by a key: the `annotation_id` given to `add_annotation`,
+        or else their COCO "id", or else a generated integer.
+
+        Args:
+            image_size (Tuple): (image_height, image_width).
+            tile_size (Tuple): (tile_height, tile_width).
+            stride (Tuple): (stride_height, stride_width).
+            image_annotations (List): Initial COCO annotations of the image.
+            polygon_visibility_threshold (float): Minimum visible area ratio of a polygon in a tile.
+            metrics (StageMetrics): Receives the "clipper_calls" counter. A new one is created
+                when None, available as `self.metrics`.
+        """
+        self.image_size = tuple(image_size)
+        self.tile_size = tile_size
+        self.stride = stride
+        self.polygon_visibility_threshold = polygon_visibility_threshold
+        self.metrics = metrics if metrics is not None else StageMetrics()
+
+        self.tiles = plan_tiles(self.image_size, tile_size, stride)
+        self.tile_boxes = tile_boxes_from_coordinates(self.tiles)
+        self.tile_index = GridIndex(self.tile_boxes, stride)
+
+        # Annotations covered by every tile, and number of selected tiles covering every annotation
+        self.tile_members: List[set] = [set() for _ in self.tiles]
+        self.cover_counts: Dict = {}
+        self.selected: set = set()
+
+        # Per annotation: the COCO annotation, its geometry, the clipped paths and the tiles it is visible in
+        self.annotations: Dict = {}
+        self.order: Dict = {}
+        self.next_key = 0
+        self.next_order = 0
+
+        for image_annotation in image_annotations:
+            key = self.__make_key(image_annotation, None)
+            self.__index(key, image_annotation)
+
+        self.__replace_selection(self.__greedy_cover())
+
+    def __len__(self)-> int:
+
+        return len(self.annotations)
+
+    def __contains__(self, key)-> bool:
+
+        return key in self.annotations
+
+    def __make_key(self, image_annotation: Dict, annotation_id):
+
+        if annotation_id is None:
+            annotation_id = image_annotation.get('id')
+
+        if annotation_id is None:
+            while self.next_key in self.annotations:
+                self.next_key += 1
+            annotation_id = self.next_key
+
+        if annotation_id in self.annotations:
+            raise ValueError(f"The annotation {annotation_id} is already in the selector.")
+
+        return annotation_id
+
+    def __index(self, key, image_annotation: Dict)-> None:
+        """
+        Clips an annotation against the tiles under its box and registers its coverage.
+        """
+        geometry = AnnotationGeometry([image_annotation])
+        x_min, y_min, x_max, y_max = geometry.boxes[0].tolist()
+
+        candidate_tiles = self.tile_index.query(x_min, y_min, x_max, y_max)
+
+        intersection_areas, clipped = geometry.intersect(self.tile_boxes[candidate_tiles])
+        visible = geometry.visibility(intersection_areas)[:, 0] >= self.polygon_visibility_threshold
+
+        tiles = {tile_index: row for row, tile_index in enumerate(candidate_tiles) if visible[row]}
+
+        self.metrics.count("clipper_calls", geometry.clipper_calls)
+
+        self.annotations[key] = {"annotation": image_annotation,
+                                 "geometry": geometry,
+                                 "clipped": clipped,
+                                 "tiles": tiles}
+
+        if key not in self.order:
+            self.order[key] = self.next_order
+            self.next_order += 1
+
+        for tile_index in tiles:
+            self.tile_members[tile_index].add(key)
+
+        self.cover_counts[key] = sum(1 for tile_index in tiles if tile_index in self.selected)
+
+    def __unindex(self, key)-> Dict:
+
+        annotation = self.annotations.pop(key)
+
+        for tile_index in annotation['tiles']:
+            self.tile_members[tile_index].discard(key)
+
+        del self.cover_counts[key]
+
+        return annotation
+
+    def __select(self, tile_index: int)-> None:
+
+        self.selected.add(tile_index)
+
+        for key in self.tile_members[tile_index]:
+            self.cover_counts[key] += 1
+
+    def __deselect(self, tile_index: int)-> None:
+
+        self.selected.discard(tile_index)
+
+        for key in self.tile_members[tile_index]:
+            self.cover_counts[key] -= 1
+
+    def __cover(self, key)-> List[int]:
+        """
+        Selects a tile for an uncovered annotation, preferring the candidate covering the
+        most uncovered annotations, then the most annotations, then the first tile.
+        """
+        if self.cover_counts[key] or not self.annotations[key]['tiles']:
+            return []
+
+        def score(tile_index: int)-> Tuple:
+
+            members = self.tile_members[tile_index]
+            uncovered = sum(1 for member in members if not self.cover_counts[member])
+
+            return (-uncovered, -len(members), tile_index)
+
+        tile_index = min(self.annotations[key]['tiles'], key=score)
+        self.__select(tile_index)
+
+        return [tile_index]
+
+    def __prune(self, tile_indices)-> List[int]:
+        """
+        Drops the selected tiles among `tile_indices` whose annotations are all covered by
+        another selected tile.
+        """
+        pruned = []
+
+        for tile_index in sorted(tile_indices):
+            if tile_index in self.selected and all(self.cover_counts[key] >= 2 for key in self.tile_members[tile_index]):
+                self.__deselect(tile_index)
+                pruned.append(tile_index)
+
+        return pruned
+
+    def __neighbour_tiles(self, tile_indices)-> set:
+
+        # Selected tiles sharing an annotation with the given tiles
+        neighbours = set()
+
+        for tile_index in tile_indices:
+            for key in self.tile_members[tile_index]:
+                neighbours.update(tile for tile in self.annotations[key]['tiles'] if tile in self.selected)
+
+        return neighbours - set(tile_indices)
+
+    def __changes(self, selected: List[int], deselected: List[int])-> Dict:
+
+        added = set(selected) - set(deselected)
+        removed = set(deselected) - set(selected)
+
+        return {"selected_tiles": [self.tiles[tile_index]['id'] for tile_index in sorted(added)],
+                "deselected_tiles": [self.tiles[tile_index]['id'] for tile_index in sorted(removed)]}
+
+    def add_annotation(self, image_annotation: Dict, annotation_id = None)-> Dict:
+        """
+        Adds an annotation and repairs the selection around it.
+
+        Args:
+            image_annotation (Dict): COCO annotation ("segmentation" or "bbox", "category_id").
+            annotation_id: Key of the annotation, see the class description.
+
+        Returns:
+            Dict: Ids of the tiles that entered ("selected_tiles") and left
+            ("deselected_tiles") the selection.
+        """
+        key = self.__make_key(image_annotation, annotation_id)
+        self.__index(key, image_annotation)
+
+        selected = self.__cover(key)
+        deselected = self.__prune(self.__neighbour_tiles(selected))
+
+        return self.__changes(selected, deselected)
+
+    def remove_annotation(self, annotation_id)-> Dict:
+        """
+        Removes an annotation and drops the selected tiles it alone justified.
+
+        Args:
+            annotation_id: Key of the annotation.
+
+        Returns:
+            Dict: Ids of the tiles that left the selection ("deselected_tiles"), and an
+            empty "selected_tiles".
+        """
+        if annotation_id not in self.annotations:
+            raise KeyError(annotation_id)
+
+        annotation = self.__unindex(annotation_id)
+        del self.order[annotation_id]
+
+        deselected = self.__prune(tile_index for tile_index in annotation['tiles'] if tile_index in self.selected)
+
+        return self.__changes([], deselected)
+
+    def update_annotation(self, annotation_id, image_annotation: Dict)-> Dict:
+        """
+        Replaces an annotation, e.g. after it was moved or reshaped, keeping its key and its
+        position in the results.
+
+        Args:
+            annotation_id: Key of the annotation.
+            image_annotation (Dict): New COCO annotation.
+
+        Returns:
+            Dict: Ids of the tiles that entered ("selected_tiles") and left
+            ("deselected_tiles") the selection.
+        """
+        if annotation_id not in self.annotations:
+            raise KeyError(annotation_id)
+
+        previous = self.__unindex(annotation_id)
+        self.__index(annotation_id, image_annotation)
+
+        selected = self.__cover(annotation_id)
+        deselected = self.__prune(self.__neighbour_tiles(selected) |
+                                  {tile_index for tile_index in previous['tiles'] if tile_index in self.selected})
+
+        return self.__changes(selected, deselected)
+
+    def __greedy_cover(self)-> List[int]:
+
+        bits = {key: bit for bit, key in enumerate(self.annotations)}
+        coverages = [to_bitset(bits[key] for key in members) for members in self.tile_members]
+
+        universe = to_bitset(bits[key] for key, annotation in self.annotations.items() if annotation['tiles'])
+        selected_indices, _ = lazy_greedy_cover(coverages, universe)
+
+        return selected_indices
+
+    def __replace_selection(self, tile_indices: List[int])-> None:
+
+        for tile_index in list(self.selected):
+            self.__deselect(tile_index)
+        for tile_index in tile_indices:
+            self.__select(tile_index)
+
+    def reselect(self)-> Dict:
+        """
+        Recomputes the selection with the greedy cover of `TileSelector` over the current
+        coverage, then drops the tiles made redundant by later picks. The current selection
+        is kept when it already uses fewer tiles, since local repairs often prune better
+        than the greedy cover alone.
+
+        Returns:
+            Dict: Ids of the tiles that entered ("selected_tiles") and left
+            ("deselected_tiles") the selection.
+        """
+        previous = set(self.selected)
+
+        self.__replace_selection(self.__greedy_cover())
+        self.__prune(list(self.selected))
+
+        if len(self.selected) >= len(previous):
+            self.__replace_selection(sorted(previous))
+
+        return self.__changes(sorted(self.selected - previous), sorted(previous - self.selected))
+
+    @property
+    def uncovered_annotations(self)-> List:
+        """
+        Keys of the annotations no tile shows above the visibility threshold, which no
+        selection can cover.
+        """
+        return [key for key in self.annotations if not self.annotations[key]['tiles']]
+
+    def run(self)-> Dict:
+        """
+        Returns the current selection in the format of `TileSelector.run()` without pixels.
+
+        Polygons are computed for the selected tiles only, from the paths clipped when the
+        annotations were added. "selected_annotation_ids" holds annotation keys, and the
+        annotations of a tile come in the order they were added.
+
+        Returns:
+            Dict: "tiles" (with "id" and "coordinates") and "tiles_annotations" (with
+            "tile_id", "selected_annotation_ids", "polygons" and "label_indices"), in tile order.
+        """
+        tiles = []
+        tiles_annotations = []
+
+        for tile_index in sorted(self.selected):
+            tile = self.tiles[tile_index]
+            tile_box = self.tile_boxes[tile_index]
+            x_start, y_start = tile['coordinates'][:2]
+
+            selected_annotation_ids = []
+            polygons = []
+            label_indices = []
+
+            for key in sorted(self.tile_members[tile_index], key=self.order.__getitem__):
+                annotation = self.annotations[key]
+                clipper_calls = annotation['geometry'].clipper_calls
+
+                intersection = annotation['geometry'].intersection_path(0, annotation['tiles'][tile_index], tile_box, annotation['clipped'])
+                self.metrics.count("clipper_calls", annotation['geometry'].clipper_calls - clipper_calls)
+
+                polygon = []
+                for point in intersection[0]:
+                    polygon.append(point[0] - x_start)
+                    polygon.append(point[1] - y_start)
+
+                selected_annotation_ids.append(key)
+                polygons.append(polygon)
+                label_indices.append(annotation['geometry'].label_indices[0])
+
+            tiles.append({"id": tile['id'], "coordinates": tile['coordinates']})
+            tiles_annotations.append({"tile_id": tile['id'],
+                                      "selected_annotation_ids": selected_annotation_ids,
+                                      "polygons": polygons,
+                                      "label_indices": label_indices})
+
+        return {"tiles": tiles,
+                "tiles_annotations": tiles_annotations}
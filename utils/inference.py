@@ -0,0 +1,248 @@
+import numpy as np
+from typing import Tuple, List, Dict, Iterator
+from utils.tile_selector import plan_tiles
+from utils.image_source import ImageSource, ArrayImageSource
+from utils.instrumentation import StageMetrics
+
+
+def iter_tile_batches(image, tile_size: Tuple, stride: Tuple, batch_size: int = 8, metrics: StageMetrics = None)-> Iterator[Tuple[np.ndarray, List]]:
+    """
+    Streams the tiles of an image in fixed-size batches for inference, without annotations.
+
+    Tiles are planned on the same grid as `TileSelector` (`plan_tiles`) and read from the
+    image one batch at a time, so with a windowed source (`utils.image_source`) only the
+    current batch is ever held in memory. An image smaller than the tile is padded with
+    zeros on its bottom and right sides, so every batch has the shape the detector expects.
+
+        for batch, tiles in iter_tile_batches(image, (1280, 1280), (640, 640)):
+            for tile, detections in zip(tiles, model(batch)):
+                stitcher.add(tile, **detections)
+
+    Args:
+        image (np.ndarray | ImageSource): The full image, or a source reading its regions.
+        tile_size (Tuple): (tile_height, tile_width).
+        stride (Tuple): (stride_height, stride_width).
+        batch_size (int): Maximum number of tiles per batch. The last batch can be smaller.
+        metrics (StageMetrics): Optional collector of the "read_tiles" stage time and the
+            "inference_tiles" counter.
+
+    Yields:
+        Tuple[np.ndarray, List]: The stacked tiles, of shape (batch, tile_height, tile_width)
+        followed by the channel dimension of the image, and the tiles ("id" and
+        "coordinates", as returned by `plan_tiles`) in the same order. A new array is
+        allocated for every batch, so a batch can be kept while the next one is read.
+    """
+    source = image if isinstance(image, ImageSource) else ArrayImageSource(image)
+    metrics = metrics if metrics is not None else StageMetrics()
+
+    image_height, image_width = source.shape[:2]
+    tile_height, tile_width = tile_size
+
+    # Tiles larger than the image start at 0 and are padded
+    tiles = plan_tiles((max(image_height, tile_height), max(image_width, tile_width)), tile_size, stride)
+
+    for batch_start in range(0, len(tiles), batch_size):
+        batch_tiles = tiles[batch_start:batch_start + batch_size]
+
+        with metrics.stage("read_tiles"):
+            batch = None
+
+            for position, tile in enumerate(batch_tiles):
+                x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+                region = source.read_region(x_start, y_start, min(x_end, image_width), min(y_end, image_height))
+
+                if batch is None:
+                    batch = np.zeros((len(batch_tiles), tile_height, tile_width) + region.shape[2:], dtype=region.dtype)
+
+                batch[position, :region.shape[0], :region.shape[1]] = region
+
+        metrics.count("inference_tiles", len(batch_tiles))
+
+        yield batch, batch_tiles
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray)-> np.ndarray:
+    """
+    Returns the intersection over union of one box with each of `boxes`.
+
+    Args:
+        box (np.ndarray): Box as [x_start, y_start, x_end, y_end].
+        boxes (np.ndarray): Boxes of shape (N, 4) in the same format.
+
+    Returns:
+        np.ndarray: IoU of shape (N,), 0 where both boxes are empty.
+    """
+    intersection_width = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    intersection_height = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    intersection = intersection_width * intersection_height
+
+    box_area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = box_area + areas - intersection
+
+    return np.divide(intersection, union, out=np.zeros(len(boxes)), where=union > 0)
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5, labels: np.ndarray = None)-> np.ndarray:
+    """
+    Greedy non-maximum suppression: keeps the best scored box and drops every remaining box
+    overlapping it by more than `iou_threshold`, until no box remains.
+
+    Every step compares the kept box with all remaining boxes at once, so the Python loop
+    runs once per kept box rather than once per pair.
+
+    Args:
+        boxes (np.ndarray): Boxes of shape (N, 4) as [x_start, y_start, x_end, y_end].
+        scores (np.ndarray): Scores of shape (N,).
+        iou_threshold (float): Overlap above which the lower scored box is dropped.
+        labels (np.ndarray): Optional class labels of shape (N,). Boxes of different
+            classes never suppress each other.
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, by decreasing score.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+
+    if labels is not None and len(boxes):
+        # Shifting every class to its own region keeps a single pass for all classes
+        _, class_indices = np.unique(labels, return_inverse=True)
+        span = boxes.max() - min(boxes.min(), 0) + 1
+        boxes = boxes + (class_indices.reshape(-1) * span)[:, None]
+
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+
+    while order.size:
+        best = order[0]
+        keep.append(best)
+
+        remaining = order[1:]
+        order = remaining[box_iou(boxes[best], boxes[remaining]) <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+class TileStitcher():
+
+    def __init__(self, image_size: Tuple, edge_margin: int = 0, stride: Tuple = None)-> None:
+        """
+        Maps the detections of the tiles of an image back to image coordinates and merges
+        the duplicates found by overlapping tiles.
+
+        Detections are buffered per tile by `add` and merged once by `merge` with
+        `non_max_suppression`.
+
+        Args:
+            image_size (Tuple): (image_height, image_width).
+            edge_margin (int): Detections of a tile whose box comes within this many
+                pixels of an edge shared with a neighbouring tile are dropped when they fit,
+                margin included, in the overlap with that tile: the object is cut there and
+                the neighbouring tile sees it whole. Larger detections are kept and left to
+                the merge, since no tile holds them whole. Edges on the image border are
+                kept. 0 keeps every detection.
+            stride (Tuple): (stride_height, stride_width) of the tiles, required with
+                `edge_margin` to know the overlap of neighbouring tiles.
+        """
+        if edge_margin and stride is None:
+            raise ValueError("The stride of the tiles is needed to drop the detections cut by their edges.")
+
+        self.image_size = image_size
+        self.edge_margin = edge_margin
+        self.stride = stride
+
+        self.boxes = []
+        self.scores = []
+        self.labels = []
+        self.polygons = []
+
+    def __len__(self)-> int:
+
+        return sum(len(scores) for scores in self.scores)
+
+    def add(self, tile: Dict, boxes: np.ndarray, scores: np.ndarray, labels: np.ndarray = None, polygons: List = None)-> None:
+        """
+        Adds the detections of one tile.
+
+        Args:
+            tile (Dict): Tile with "coordinates", as yielded by `iter_tile_batches`.
+            boxes (np.ndarray): Boxes of shape (N, 4) as [x_start, y_start, x_end, y_end]
+                relative to the tile.
+            scores (np.ndarray): Scores of shape (N,).
+            labels (np.ndarray): Optional class labels of shape (N,). Defaults to 0.
+            polygons (List): Optional polygon per detection as a flat [x1, y1, x2, y2, ...]
+                list relative to the tile.
+        """
+        image_height, image_width = self.image_size
+        x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+        labels = np.zeros(len(scores), dtype=np.int64) if labels is None else np.asarray(labels).reshape(-1)
+
+        if self.edge_margin:
+            margin = self.edge_margin
+            stride_height, stride_width = self.stride
+            cut = np.zeros(len(boxes), dtype=bool)
+
+            # The previous tile ends at tile size - stride, the next one starts at stride
+            if x_start > 0:
+                cut |= (boxes[:, 0] < margin) & (boxes[:, 2] < x_end - x_start - stride_width - margin)
+            if y_start > 0:
+                cut |= (boxes[:, 1] < margin) & (boxes[:, 3] < y_end - y_start - stride_height - margin)
+            if x_end < image_width:
+                cut |= (boxes[:, 2] > x_end - x_start - margin) & (boxes[:, 0] > stride_width + margin)
+            if y_end < image_height:
+                cut |= (boxes[:, 3] > y_end - y_start - margin) & (boxes[:, 1] > stride_height + margin)
+
+            kept = np.flatnonzero(~cut)
+            boxes, scores, labels = boxes[kept], scores[kept], labels[kept]
+
+            if polygons is not None:
+                polygons = [polygons[index] for index in kept]
+
+        offset = np.array([x_start, y_start, x_start, y_start], dtype=np.float64)
+        boxes = boxes + offset
+
+        # Padding past the image border is not part of the image
+        np.clip(boxes[:, 0::2], 0, image_width, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, image_height, out=boxes[:, 1::2])
+
+        self.boxes.append(boxes)
+        self.scores.append(scores)
+        self.labels.append(labels)
+
+        if polygons is None:
+            self.polygons.extend([None] * len(scores))
+        else:
+            for polygon in polygons:
+                points = np.asarray(polygon, dtype=np.float64).reshape(-1, 2) + offset[:2]
+                self.polygons.append(points.reshape(-1).tolist())
+
+    def merge(self, iou_threshold: float = 0.5, class_agnostic: bool = False)-> Dict:
+        """
+        Returns the detections of the whole image, duplicates removed.
+
+        Args:
+            iou_threshold (float): Overlap above which the lower scored of two detections
+                is dropped.
+            class_agnostic (bool): Also merge overlapping detections of different classes.
+
+        Returns:
+            Dict: "boxes" (N, 4) in image coordinates, "scores" (N,), "labels" (N,) and
+            "polygons" (a list of N flat polygons in image coordinates, None for the
+            detections added without one), by decreasing score.
+        """
+        if not self.scores:
+            return {"boxes": np.zeros((0, 4)), "scores": np.zeros(0), "labels": np.zeros(0, dtype=np.int64), "polygons": []}
+
+        boxes = np.concatenate(self.boxes)
+        scores = np.concatenate(self.scores)
+        labels = np.concatenate(self.labels)
+
+        keep = non_max_suppression(boxes, scores, iou_threshold, labels=None if class_agnostic else labels)
+
+        return {"boxes": boxes[keep],
+                "scores": scores[keep],
+                "labels": labels[keep],
+                "polygons": [self.polygons[index] for index in keep]}
@@ -0,0 +1,132 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import List, Dict
+
+
+class StageMetrics():
+
+    def __init__(self)-> None:
+        """
+        Per-stage timers and named counters of a unit of work (an image or a whole run).
+
+        Every stage accumulates its wall time, the CPU time of the calling thread and the
+        number of times it was entered. CPU time is taken per thread, so the work of the
+        background tile writer is not charged to the stage that happens to be running.
+
+            metrics = StageMetrics()
+            with metrics.stage("decode"):
+                image = cv2.imread(path)
+            metrics.count("selected_tiles", len(tiles))
+        """
+        self.stages: Dict[str, Dict] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+    def add_time(self, name: str, wall_seconds: float, cpu_seconds: float, calls: int = 1)-> None:
+
+        stage = self.stages.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0})
+        stage['wall_seconds'] += wall_seconds
+        stage['cpu_seconds'] += cpu_seconds
+        stage['calls'] += calls
+
+    def count(self, name: str, value: int = 1)-> None:
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, metrics: Dict)-> None:
+        """
+        Adds the stages and counters of another unit of work, e.g. an image processed in a
+        worker process, given as returned by `to_dict`.
+        """
+        for name, stage in metrics.get('stages', {}).items():
+            self.add_time(name, stage['wall_seconds'], stage['cpu_seconds'], stage['calls'])
+
+        for name, value in metrics.get('counters', {}).items():
+            self.count(name, value)
+
+    def to_dict(self)-> Dict:
+        """
+        Returns:
+            Dict: Plain copy of the metrics, {"stages": {name: {"wall_seconds", "cpu_seconds",
+            "calls"}}, "counters": {name: value}}, that can be pickled or dumped as JSON.
+        """
+        return {"stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": dict(self.counters)}
+
+
+class MetricsHook():
+    """
+    Receives the metrics of a pipeline run. Subclass it to export them to a monitoring
+    system and pass the instances in the "metrics_hooks" argument of the pipelines.
+    """
+
+    def on_image(self, file_name: str, metrics: Dict)-> None:
+        """
+        Called in the main process once an image is processed, in input order.
+
+        Args:
+            file_name (str): File name of the source image.
+            metrics (Dict): Metrics of the image, as returned by `StageMetrics.to_dict`.
+        """
+
+    def on_complete(self, metrics: Dict)-> None:
+        """
+        Called once with the metrics of the whole run, as returned in the report.
+        """
+
+    def close(self)-> None:
+        """
+        Called when the run ends, whether it succeeded or not.
+        """
+
+
+class JsonlTraceHook(MetricsHook):
+
+    def __init__(self, trace_path: str)-> None:
+        """
+        Writes the metrics of every image as one JSON line, followed by a last line holding
+        the metrics of the whole run under "summary".
+
+        Args:
+            trace_path (str): Path of the JSONL trace, overwritten.
+        """
+        self.file = open(trace_path, 'w')
+
+    def on_image(self, file_name: str, metrics: Dict)-> None:
+
+        self.file.write(json.dumps({"file_name": file_name, **metrics}, separators=(',', ':')))
+        self.file.write('\n')
+
+    def on_complete(self, metrics: Dict)-> None:
+
+        self.file.write(json.dumps({"summary": metrics}, separators=(',', ':')))
+        self.file.write('\n')
+
+    def close(self)-> None:
+
+        if not self.file.closed:
+            self.file.close()
+
+
+def create_hooks(arguments: Dict)-> List[MetricsHook]:
+    """
+    Returns the metrics hooks of a pipeline run: the "metrics_hooks" given by the caller
+    plus a `JsonlTraceHook` when "trace_path" is set.
+    """
+    hooks = list(arguments.get('metrics_hooks') or [])
+
+    if arguments.get('trace_path'):
+        hooks.append(JsonlTraceHook(arguments['trace_path']))
+
+    return hooks
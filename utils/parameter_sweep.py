@@ -0,0 +1,130 @@
+import itertools
+import numpy as np
+from typing import Tuple, List, Dict
+from utils.geometry import AnnotationGeometry, tile_boxes_from_coordinates
+from utils.set_cover import bitsets_from_mask, lazy_greedy_cover
+from utils.tile_selector import plan_tiles, MAX_MATRIX_CELLS
+
+
+class ParameterSweep():
+
+    def __init__(self, tile_sizes: List, strides: List, polygon_visibility_thresholds: List)-> None:
+        """
+        Evaluates a grid of tiling parameters over a dataset without touching pixels.
+
+        Every combination of tile size, stride and visibility threshold is scored as
+        `TileSelector.run()` would select tiles. Work is shared across the grid: each image's
+        geometry table is built once, and for a given tile lattice (tile size and stride) the
+        per-pair visibility ratios are computed once and reused for every threshold.
+
+        Args:
+            tile_sizes (List): Candidate (tile_height, tile_width) pairs.
+            strides (List): Candidate (stride_height, stride_width) pairs.
+            polygon_visibility_thresholds (List): Candidate visibility thresholds.
+        """
+        self.tile_sizes = [tuple(tile_size) for tile_size in tile_sizes]
+        self.strides = [tuple(stride) for stride in strides]
+        self.polygon_visibility_thresholds = [float(threshold) for threshold in polygon_visibility_thresholds]
+
+        self.totals = {combination: {"images": 0,
+                                     "skipped_images": 0,
+                                     "annotations": 0,
+                                     "selected_tiles": 0,
+                                     "dropped_annotations": 0,
+                                     "retained_pixels": 0,
+                                     "image_pixels": 0}
+                       for combination in itertools.product(self.tile_sizes, self.strides, self.polygon_visibility_thresholds)}
+
+    def __union_area(self, tile_boxes: np.ndarray)-> int:
+        """
+        Area of the union of tile boxes, so pixels shared by overlapping tiles count once.
+        """
+        if len(tile_boxes) == 0:
+            return 0
+
+        xs = np.unique(tile_boxes[:, [0, 2]])
+        ys = np.unique(tile_boxes[:, [1, 3]])
+        covered = np.zeros((len(ys) - 1, len(xs) - 1), dtype=bool)
+
+        for x_start, y_start, x_end, y_end in tile_boxes:
+            covered[np.searchsorted(ys, y_start):np.searchsorted(ys, y_end),
+                    np.searchsorted(xs, x_start):np.searchsorted(xs, x_end)] = True
+
+        return int((np.diff(ys)[:, None] * np.diff(xs)[None, :])[covered].sum())
+
+    def add_image(self, image_size: Tuple, image_annotations: List)-> None:
+        """
+        Scores every parameter combination on one image.
+
+        Args:
+            image_size (Tuple): (image_height, image_width).
+            image_annotations (List): COCO annotations of the image.
+        """
+        image_height, image_width = image_size
+        geometry = AnnotationGeometry(image_annotations)
+        universe = (1 << len(geometry)) - 1
+
+        for tile_size, stride in itertools.product(self.tile_sizes, self.strides):
+
+            if tile_size[0] > image_height or tile_size[1] > image_width:
+                for threshold in self.polygon_visibility_thresholds:
+                    self.totals[(tile_size, stride, threshold)]["skipped_images"] += 1
+                continue
+
+            tile_boxes = tile_boxes_from_coordinates(plan_tiles(image_size, tile_size, stride))
+            chunk_size = max(1, MAX_MATRIX_CELLS // max(len(geometry), 1))
+
+            coverages = {threshold: [] for threshold in self.polygon_visibility_thresholds}
+
+            for chunk_start in range(0, len(tile_boxes), chunk_size):
+
+                intersection_areas, _ = geometry.intersect(tile_boxes[chunk_start:chunk_start + chunk_size])
+                visibility = geometry.visibility(intersection_areas)
+
+                for threshold in self.polygon_visibility_thresholds:
+                    coverages[threshold] += bitsets_from_mask(visibility >= threshold)
+
+            for threshold in self.polygon_visibility_thresholds:
+
+                selected_indices, _ = lazy_greedy_cover(coverages[threshold], universe)
+
+                covered = 0
+                for index in selected_indices:
+                    covered |= coverages[threshold][index]
+
+                totals = self.totals[(tile_size, stride, threshold)]
+                totals["images"] += 1
+                totals["annotations"] += len(geometry)
+                totals["selected_tiles"] += len(selected_indices)
+                totals["dropped_annotations"] += len(geometry) - covered.bit_count()
+                totals["retained_pixels"] += self.__union_area(tile_boxes[sorted(selected_indices)])
+                totals["image_pixels"] += image_height * image_width
+
+    def results(self)-> List[Dict]:
+        """
+        Returns the aggregated score of every combination.
+
+        Returns:
+            List[dict]: One entry per combination with "tile_size", "stride", 
+            "polygon_visibility_threshold", "images", "skipped_images" (tile larger than the 
+            image), "annotations", "selected_tiles", "dropped_annotations" (annotations no tile 
+            shows above the threshold) and "retained_pixel_fraction" (pixels covered by the 
+            selected tiles over the pixels of the images, overlaps counted once).
+        """
+        results = []
+
+        for (tile_size, stride, threshold), totals in self.totals.items():
+
+            retained_pixel_fraction = totals["retained_pixels"] / totals["image_pixels"] if totals["image_pixels"] else 0.0
+
+            results.append({"tile_size": list(tile_size),
+                            "stride": list(stride),
+                            "polygon_visibility_threshold": threshold,
+                            "images": totals["images"],
+                            "skipped_images": totals["skipped_images"],
+                            "annotations": totals["annotations"],
+                            "selected_tiles": totals["selected_tiles"],
+                            "dropped_annotations": totals["dropped_annotations"],
+                            "retained_pixel_fraction": retained_pixel_fraction})
+
+        return results
@@ -0,0 +1,122 @@
+import os
+import json
+import pickle
+import hashlib
+from typing import List, Dict
+
+
+# Bump when the cached result layout changes so old entries are ignored
+CACHE_VERSION = 1
+
+
+class ResultCache():
+
+    def __init__(self, cache_dir: str, max_bytes: int = None)-> None:
+        """
+        On-disk cache of per-image tile selections, addressed by content.
+
+        An entry is keyed by a hash of the image file identity (name, size and modification
+        time), the image annotations and the tiling settings. It stores the compact result of
+        `process_image` (no pixels). A hit lets a run reuse the selection and the tiles already
+        written by a previous run, so an interrupted or re-launched run only processes images
+        whose inputs changed. Entries are evicted least recently used first once the cache
+        grows past `max_bytes`.
+
+        Args:
+            cache_dir (str): Directory holding the cache entries.
+            max_bytes (int): Size limit enforced by `evict`. No limit when None.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_path: str, image_annotations: List, settings: Dict)-> str:
+        """
+        Computes the cache key of an image.
+
+        Args:
+            image_path (str): Path to the source image.
+            image_annotations (List): COCO annotations of the image.
+            settings (Dict): Settings the result depends on, e.g. tile size, stride,
+                visibility threshold and output codec.
+
+        Returns:
+            str: Hex digest identifying the result.
+        """
+        stat = os.stat(image_path)
+
+        content = {"version": CACHE_VERSION,
+                   "image": [os.path.basename(image_path), stat.st_size, stat.st_mtime_ns],
+                   "annotations": image_annotations,
+                   "settings": settings}
+
+        return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    def __entry_path(self, key: str)-> str:
+
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def get(self, key: str)-> Dict:
+        """
+        Returns the cached result of a key, or None on a miss.
+
+        A hit refreshes the entry's modification time, which orders the eviction.
+        """
+        entry_path = self.__entry_path(key)
+
+        try:
+            with open(entry_path, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return result
+
+    def put(self, key: str, result: Dict)-> None:
+        """
+        Stores the result of a key. The entry is written atomically, so a run killed while
+        writing never leaves a corrupted entry.
+        """
+        entry_path = self.__entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        temporary_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, entry_path)
+
+    def evict(self)-> int:
+        """
+        Removes least recently used entries until the cache fits in `max_bytes`.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        if self.max_bytes is None:
+            return 0
+
+        entries = []
+        for root, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                if file_name.endswith('.pkl'):
+                    stat = os.stat(os.path.join(root, file_name))
+                    entries.append((stat.st_mtime_ns, stat.st_size, os.path.join(root, file_name)))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        removed = 0
+
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(entry_path)
+            total_bytes -= size
+            removed += 1
+
+        return removed
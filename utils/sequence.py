@@ -0,0 +1,301 @@
+import os
+import re
+import numpy as np
+import cv2
+from typing import Tuple, List, Dict, Iterator
+from utils.geometry import AnnotationGeometry, tile_boxes_from_coordinates
+from utils.set_cover import to_bitset, lazy_greedy_cover
+from utils.instrumentation import StageMetrics
+from utils.tile_selector import TileSelector, plan_tiles, plan_anchored_tiles
+
+
+def video_frame_indices(image_records: List[Dict])-> List[int]:
+    """
+    Returns the video frame of every COCO image record of a video.
+
+    A record carrying a "frame_index" (or "frame_id") uses it. Otherwise the frame number
+    is read from the trailing digits of its file name, so frames extracted as
+    `frame_000010.jpg`, `frame_000020.jpg`, ... match the video even when only every
+    n-th frame was kept.
+
+    Args:
+        image_records (List[Dict]): COCO image records of the frames.
+
+    Returns:
+        List[int]: Frame index of every record, in the same order.
+
+    Raises:
+        ValueError: If a record has neither a frame index nor a number at the end of its
+            file name.
+    """
+    frame_indices = []
+
+    for image_record in image_records:
+        frame_index = image_record.get('frame_index', image_record.get('frame_id'))
+
+        if frame_index is None:
+            match = re.search(r"(\d+)$", os.path.splitext(os.path.basename(image_record['file_name']))[0])
+
+            if match is None:
+                raise ValueError(f"No frame number in the file name {image_record['file_name']}, "
+                                 "set the \"frame_index\" of the video frame records.")
+
+            frame_index = match.group(1)
+
+        frame_indices.append(int(frame_index))
+
+    return frame_indices
+
+
+def iter_video_frames(video_path: str, frame_indices: List[int])-> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Decodes the given frames of a video with `cv2.VideoCapture`, in increasing order.
+
+    The video is read sequentially: frames in between are grabbed without being decoded
+    into an image, so skipping frames costs far less than reading them.
+
+    Args:
+        video_path (str): Path of the video file.
+        frame_indices (List[int]): Frames to decode. Duplicates are decoded once.
+
+    Yields:
+        Tuple[int, np.ndarray]: The frame index and the BGR frame, until the last wanted
+        frame or the end of the video.
+
+    Raises:
+        ValueError: If the video cannot be opened.
+    """
+    capture = cv2.VideoCapture(video_path)
+
+    if not capture.isOpened():
+        raise ValueError(f"The video {video_path} cannot be opened.")
+
+    try:
+        wanted = sorted(set(frame_indices))
+        position = 0
+
+        for frame_index in wanted:
+            while position < frame_index:
+                if not capture.grab():
+                    return
+                position += 1
+
+            success, frame = capture.read()
+            position += 1
+
+            if not success:
+                return
+
+            yield frame_index, frame
+    finally:
+        capture.release()
+
+
+class SequenceTileSelector():
+
+    def __init__(self, tile_size: Tuple, stride: Tuple, polygon_visibility_threshold: float = 0.8, selection_mode: str = "greedy", time_budget: float = 1.0, candidate_mode: str = "grid")-> None:
+        """
+        Tile selection over the frames of a video, reusing the tiles of the previous frame.
+
+        Consecutive frames usually have nearly the same annotations, so the tiles selected
+        for a frame often still cover the next one. `select` first clips the annotations of
+        the frame against the previous tiles only. When every annotation is visible in one
+        of them, the frame keeps a greedy cover drawn from those tiles, which drops the tiles
+        left empty. A frame whose annotations have the segmentation, bbox and category of
+        those of the previous one, ids aside, gets its selection back without clipping
+        anything. Otherwise, or when the frame size changes, the selection is recomputed
+        with `TileSelector`. Annotations that no candidate tile shows above the visibility
+        threshold are left out by `TileSelector` too, so they do not force a recomputation.
+
+        A reused selection has the output format of `TileSelector.run()` and keeps the ids
+        of the previous tiles. It covers every annotation but is not recomputed from the
+        whole candidate set, so it can hold a few more tiles than a fresh selection.
+
+            selector = SequenceTileSelector(tile_size, stride)
+            for image_size, annotations in frames:
+                results = selector.select(image_size, annotations)
+            selector.stats()  # "frames", "reused", "recomputed", "reuse_rate"
+
+        Args:
+            tile_size (Tuple): (tile_height, tile_width).
+            stride (Tuple): (stride_height, stride_width).
+            polygon_visibility_threshold (float): Minimum visible area ratio of a polygon in a tile.
+            selection_mode (str): Selection mode of the recomputations, see `TileSelector`.
+            time_budget (float): Time budget of the "exact" selection mode, see `TileSelector`.
+            candidate_mode (str): Candidate mode of the recomputations, see `TileSelector`.
+        """
+        self.tile_size = tile_size
+        self.stride = stride
+        self.polygon_visibility_threshold = polygon_visibility_threshold
+        self.selection_mode = selection_mode
+        self.time_budget = time_budget
+        self.candidate_mode = candidate_mode
+
+        # Tiles ("id" and "coordinates") selected for the previous frame, its size, annotation geometry and selection
+        self.previous_tiles: List[Dict] = []
+        self.previous_size: Tuple = None
+        self.previous_geometry: List = None
+        self.previous_results: Dict = None
+
+        self.frames = 0
+        self.reused = 0
+
+    def reset(self)-> None:
+        """
+        Forgets the previous frame, e.g. at a cut or at the start of another video.
+        """
+        self.previous_tiles = []
+        self.previous_size = None
+        self.previous_geometry = None
+        self.previous_results = None
+
+    def stats(self)-> Dict:
+        """
+        Returns:
+            Dict: "frames" selected, "reused" and "recomputed" selections and the
+            "reuse_rate".
+        """
+        return {"frames": self.frames,
+                "reused": self.reused,
+                "recomputed": self.frames - self.reused,
+                "reuse_rate": self.reused / self.frames if self.frames else 0.0}
+
+    @staticmethod
+    def __geometry(image_annotations: List)-> List[Tuple]:
+        """
+        The fields of the annotations the selection depends on, without their ids.
+        """
+        return [(image_annotation.get('segmentation'), image_annotation.get('bbox'), image_annotation['category_id'])
+                for image_annotation in image_annotations]
+
+    def __coverable(self, image_size: Tuple, image_annotations: List, metrics: StageMetrics)-> bool:
+        """
+        Whether one of the annotations is visible in a candidate tile of `TileSelector`.
+        """
+        geometry = AnnotationGeometry(image_annotations)
+
+        if self.candidate_mode == "anchored":
+            tiles = plan_anchored_tiles(image_size, self.tile_size, geometry.boxes)
+        else:
+            tiles = plan_tiles(image_size, self.tile_size, self.stride)
+
+        intersection_areas, _ = geometry.intersect(tile_boxes_from_coordinates(tiles))
+        metrics.count("clipper_calls", geometry.clipper_calls)
+
+        return bool((geometry.visibility(intersection_areas) >= self.polygon_visibility_threshold).any())
+
+    def __reuse(self, image_size: Tuple, image_annotations: List, metrics: StageMetrics)-> Dict:
+        """
+        Covers the annotations of a frame with the previous tiles.
+
+        Returns:
+            Dict: The selection in the format of `TileSelector.run()`, or None when the
+            previous tiles miss an annotation that a candidate tile shows.
+        """
+        geometry = AnnotationGeometry(image_annotations)
+        tile_boxes = tile_boxes_from_coordinates(self.previous_tiles)
+
+        intersection_areas, clipped = geometry.intersect(tile_boxes)
+        visible = geometry.visibility(intersection_areas) >= self.polygon_visibility_threshold
+        metrics.count("clipper_calls", geometry.clipper_calls)
+
+        covered = visible.any(axis=0)
+
+        if not covered.all():
+            missing = np.flatnonzero(~covered).tolist()
+            if self.__coverable(image_size, [image_annotations[annotation_id] for annotation_id in missing], metrics):
+                return None
+
+        memberships = [np.flatnonzero(row).tolist() for row in visible]
+        selected_indices, _ = lazy_greedy_cover([to_bitset(membership) for membership in memberships],
+                                                to_bitset(np.flatnonzero(covered).tolist()))
+
+        clipper_calls = geometry.clipper_calls
+
+        tiles = []
+        tiles_annotations = []
+
+        for tile_index in sorted(selected_indices):
+            tile = self.previous_tiles[tile_index]
+            x_start, y_start = tile['coordinates'][:2]
+
+            polygons = []
+
+            for annotation_id in memberships[tile_index]:
+                intersection = geometry.intersection_path(annotation_id, tile_index, tile_boxes[tile_index], clipped)
+
+                polygon = []
+                for point in intersection[0]:
+                    polygon.append(point[0] - x_start)
+                    polygon.append(point[1] - y_start)
+
+                polygons.append(polygon)
+
+            tiles.append({"id": tile['id'], "coordinates": list(tile['coordinates'])})
+            tiles_annotations.append({"tile_id": tile['id'],
+                                      "selected_annotation_ids": memberships[tile_index],
+                                      "polygons": polygons,
+                                      "label_indices": [geometry.label_indices[annotation_id] for annotation_id in memberships[tile_index]]})
+
+        metrics.count("clipper_calls", geometry.clipper_calls - clipper_calls)
+
+        return {"tiles": tiles,
+                "tiles_annotations": tiles_annotations}
+
+    def select(self, image_size: Tuple, image_annotations: List, metrics: StageMetrics = None)-> Dict:
+        """
+        Selects the tiles of the next frame, without pixels.
+
+        Args:
+            image_size (Tuple): (image_height, image_width) of the frame.
+            image_annotations (List): COCO annotations of the frame.
+            metrics (StageMetrics): Optional collector of the stage timings and counters,
+                with the "check_reuse" stage and the "selections_reused" or
+                "selections_recomputed" counter.
+
+        Returns:
+            Dict: The selection in the format of `TileSelector.run()`. `crop_tiles` adds the
+            pixels of a decoded frame.
+        """
+        metrics = metrics if metrics is not None else StageMetrics()
+        image_size = tuple(image_size)
+
+        results = None
+        geometry = self.__geometry(image_annotations)
+
+        if self.previous_tiles and image_size == self.previous_size:
+            with metrics.stage("check_reuse"):
+                if geometry == self.previous_geometry:
+                    results = self.previous_results
+                else:
+                    results = self.__reuse(image_size, image_annotations, metrics)
+
+        self.frames += 1
+
+        if results is not None:
+            self.reused += 1
+            metrics.count("selections_reused")
+            metrics.count("selected_tiles", len(results['tiles']))
+        else:
+            tile_selector = TileSelector(image=None,
+                                         tile_size=self.tile_size,
+                                         stride=self.stride,
+                                         image_annotations=image_annotations,
+                                         polygon_visibility_threshold=self.polygon_visibility_threshold,
+                                         image_size=image_size,
+                                         metrics=metrics,
+                                         selection_mode=self.selection_mode,
+                                         time_budget=self.time_budget,
+                                         candidate_mode=self.candidate_mode)
+            results = tile_selector.run()
+            metrics.count("selections_recomputed")
+
+        self.previous_tiles = [{"id": tile['id'], "coordinates": tile['coordinates']} for tile in results['tiles']]
+        self.previous_size = image_size
+        self.previous_geometry = geometry
+        self.previous_results = {"tiles": self.previous_tiles,
+                                 "tiles_annotations": results['tiles_annotations']}
+
+        # Callers add the pixels to the tiles, the kept selection stays without them
+        return {"tiles": [dict(tile) for tile in self.previous_tiles],
+                "tiles_annotations": [dict(tile_annotations) for tile_annotations in results['tiles_annotations']]}
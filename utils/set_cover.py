@@ -0,0 +1,285 @@
+import sys
+import time
+import heapq
+import numpy as np
+from typing import Tuple, List, Dict
+
+
+def to_bitset(ids: List[int])-> int:
+    """
+    Packs a list of non-negative ids into an integer bitset (bit i set <=> id i present).
+
+    Args:
+        ids (List[int]): Ids to pack.
+
+    Returns:
+        int: The bitset.
+    """
+    bitset = 0
+    for element_id in ids:
+        bitset |= 1 << element_id
+
+    return bitset
+
+
+def lazy_greedy_cover(coverages: List[int], universe: int)-> Tuple[List[int], Dict]:
+    """
+    Greedy set cover with lazy (CELF) gain evaluation.
+
+    At every step the set covering the most still-uncovered elements is chosen, ties going to
+    the set with the lowest index, until the universe is covered or no set adds coverage.
+    Gains only shrink as elements get covered, so a gain computed in an earlier step is an
+    upper bound. Sets wait in a priority queue keyed by (-gain, index), and only the set on
+    top is re-evaluated when its gain is stale. A fresh gain on top is guaranteed to be the
+    best, and the tie-breaking matches a full scan in index order.
+
+    Args:
+        coverages (List[int]): Bitset of the elements covered by each set.
+        universe (int): Bitset of the elements to cover.
+
+    Returns:
+        Tuple[List[int], Dict]:
+            - Indices of the chosen sets, in selection order.
+            - Statistics with "gain_evaluations" done, "naive_gain_evaluations" a full scan per
+            step would have done and "saved_gain_evaluations".
+    """
+    remaining = universe
+
+    queue = []
+    for index, coverage in enumerate(coverages):
+        gain = (coverage & remaining).bit_count()
+        if gain:
+            queue.append((-gain, index, 0))
+    heapq.heapify(queue)
+
+    gain_evaluations = len(coverages)
+    selected = []
+
+    while remaining and queue:
+        _, index, step = heapq.heappop(queue)
+
+        if step == len(selected):
+            selected.append(index)
+            remaining &= ~coverages[index]
+            continue
+
+        gain = (coverages[index] & remaining).bit_count()
+        gain_evaluations += 1
+
+        if gain:
+            heapq.heappush(queue, (-gain, index, len(selected)))
+
+    # A full scan evaluates every set once per step, plus a last unproductive step when
+    # part of the universe cannot be covered at all
+    steps = len(selected) + (1 if remaining else 0)
+    naive_gain_evaluations = len(coverages) * steps
+
+    stats = {"gain_evaluations": gain_evaluations,
+             "naive_gain_evaluations": naive_gain_evaluations,
+             "saved_gain_evaluations": max(naive_gain_evaluations - gain_evaluations, 0)}
+
+    return selected, stats
+
+
+def bitsets_from_mask(mask: np.ndarray)-> List[int]:
+    """
+    Packs every row of a boolean (sets x elements) matrix into an integer bitset.
+
+    Args:
+        mask (np.ndarray): 2D boolean matrix, mask[i, j] is True when set i covers element j.
+
+    Returns:
+        List[int]: One bitset per row, bit j set <=> mask[i, j].
+    """
+    packed = np.packbits(np.asarray(mask, dtype=bool).reshape(len(mask), -1), axis=1, bitorder='little')
+
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+def prune_dominated(coverages: List[int], universe: int)-> List[int]:
+    """
+    Returns the indices of the sets worth considering for an optimal cover.
+
+    A set is dropped when it covers nothing of the universe, or when its coverage is a
+    subset of another set's (on ties the lowest index is kept). Some optimal cover always
+    avoids dominated sets, as they can be swapped for the set dominating them.
+
+    Args:
+        coverages (List[int]): Bitset of the elements covered by each set.
+        universe (int): Bitset of the elements to cover.
+
+    Returns:
+        List[int]: Indices of the non-dominated sets, in increasing order.
+    """
+    # Larger sets first, so a set can only be dominated by one already kept
+    order = sorted((index for index, coverage in enumerate(coverages) if coverage & universe),
+                   key=lambda index: (-(coverages[index] & universe).bit_count(), index))
+
+    kept = []
+    for index in order:
+        coverage = coverages[index] & universe
+        if not any(coverage & ~(coverages[other] & universe) == 0 for other in kept):
+            kept.append(index)
+
+    return sorted(kept)
+
+
+def split_components(coverages: List[int], indices: List[int], universe: int)-> List[Tuple[int, List[int]]]:
+    """
+    Splits a cover problem into independent sub-problems.
+
+    Two elements belong to the same component when a chain of sets links them. Components
+    share no set, so they can be solved one by one and their covers concatenated.
+
+    Args:
+        coverages (List[int]): Bitset of the elements covered by each set.
+        indices (List[int]): Indices of the sets to consider.
+        universe (int): Bitset of the elements to cover.
+
+    Returns:
+        List[Tuple[int, List[int]]]: (elements, set indices) of every component.
+    """
+    remaining_sets = list(indices)
+    components = []
+
+    while remaining_sets:
+        elements = coverages[remaining_sets[0]] & universe
+        members = []
+
+        grown = True
+        while grown:
+            grown = False
+            outside = []
+            for index in remaining_sets:
+                if coverages[index] & elements:
+                    members.append(index)
+                    if coverages[index] & universe & ~elements:
+                        elements |= coverages[index] & universe
+                        grown = True
+                else:
+                    outside.append(index)
+            remaining_sets = outside
+
+        components.append((elements, sorted(members)))
+
+    return components
+
+
+def exact_cover(coverages: List[int], universe: int, time_budget: float = None, initial: List[int] = None)-> Tuple[List[int], Dict]:
+    """
+    Minimum set cover by branch-and-bound, with a time budget.
+
+    The sets are first reduced to the non-dominated ones (`prune_dominated`) and the problem is
+    split into independent components (`split_components`). Each component starts from the
+    greedy cover as upper bound. The search branches on the uncovered element with the fewest
+    covering sets, trying the sets by decreasing gain, and cuts a branch as soon as
+    `chosen + ceil(uncovered / largest gain)` cannot beat the best cover found. Elements no set
+    covers are ignored, as in the greedy selection.
+
+    When the budget runs out, the best cover found so far is kept for the component being
+    solved and the greedy cover for the ones not reached.
+
+    Args:
+        coverages (List[int]): Bitset of the elements covered by each set.
+        universe (int): Bitset of the elements to cover.
+        time_budget (float): Seconds allowed for the search. No limit when None.
+        initial (List[int]): A known cover used as upper bound, the lazy greedy cover when None.
+
+    Returns:
+        Tuple[List[int], Dict]:
+            - Indices of the chosen sets, in increasing order.
+            - Statistics with "initial_sets" (size of the upper bound), "selected_sets",
+            "nodes" explored, "pruned_sets" (dominated sets dropped) and "optimal" (False when
+            the budget ran out before the search completed).
+    """
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+
+    if initial is None:
+        initial, _ = lazy_greedy_cover(coverages, universe)
+
+    coverable = 0
+    for coverage in coverages:
+        coverable |= coverage
+    universe &= coverable
+
+    candidates = prune_dominated(coverages, universe)
+
+    stats = {"initial_sets": len(initial),
+             "selected_sets": len(initial),
+             "nodes": 0,
+             "pruned_sets": sum(1 for coverage in coverages if coverage & universe) - len(candidates),
+             "optimal": True}
+
+    selected = []
+    out_of_time = False
+
+    for elements, members in split_components(coverages, candidates, universe):
+
+        # The initial cover restricted to the component still covers it
+        best = [index for index in initial if coverages[index] & elements]
+
+        # The search recurses once per chosen set
+        if out_of_time or len(best) <= 1 or len(best) >= sys.getrecursionlimit() - 50:
+            selected += best
+            stats['optimal'] &= len(best) <= 1
+            continue
+
+        # Sets able to cover each element, most covering first
+        covering = {}
+        for index in sorted(members, key=lambda index: -(coverages[index] & elements).bit_count()):
+            remaining = coverages[index] & elements
+            while remaining:
+                lowest = remaining & -remaining
+                covering.setdefault(lowest, []).append(index)
+                remaining ^= lowest
+
+        largest_gain = max((coverages[index] & elements).bit_count() for index in members)
+
+        def search(remaining: int, chosen: List[int])-> bool:
+            """
+            Explores the covers extending `chosen`, returns False once the budget is spent.
+            """
+            nonlocal best
+
+            stats['nodes'] += 1
+
+            if not remaining:
+                if len(chosen) < len(best):
+                    best = list(chosen)
+                return True
+
+            if len(chosen) + -(-remaining.bit_count() // largest_gain) >= len(best):
+                return True
+
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+
+            # Branch on the most constrained uncovered element
+            branch_on, bits = None, remaining
+            while bits:
+                lowest = bits & -bits
+                if branch_on is None or len(covering[lowest]) < len(covering[branch_on]):
+                    branch_on = lowest
+                bits ^= lowest
+
+            options = sorted(covering[branch_on], key=lambda index: -(coverages[index] & remaining).bit_count())
+
+            for index in options:
+                chosen.append(index)
+                completed = search(remaining & ~coverages[index], chosen)
+                chosen.pop()
+                if not completed:
+                    return False
+
+            return True
+
+        if not search(elements, []):
+            out_of_time = True
+            stats['optimal'] = False
+
+        selected += best
+
+    selected = sorted(set(selected))
+    stats['selected_sets'] = len(selected)
+
+    return selected, stats
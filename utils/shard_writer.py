@@ -0,0 +1,283 @@
+import os
+import io
+import json
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict
+import numpy as np
+import cv2
+from utils.helper import tile_file_name
+from utils.tile_writer import get_encode_params, encode_tile
+
+
+INDEX_FILE_NAME = "index.jsonl"
+
+
+def encode_tiles(tiles: List, image_source=None, tile_format: str = "jpg", quality: int = None, png_compression: int = None, num_threads: int = 4)-> Dict[int, bytes]:
+    """
+    Encodes the tiles of one image in memory on a thread pool.
+
+    Each thread reads the pixels of its tile (from "data", or from `image_source` by
+    "coordinates") right before encoding it, so only `num_threads` raw tiles are held at once.
+
+    Args:
+        tiles (List[dict]): Tiles with "id" and either "data" or "coordinates".
+        image_source (ImageSource): Source of the tiles without "data".
+        tile_format (str): One of "jpg", "png" or "webp".
+        quality (int): JPEG/WebP quality in [0, 100].
+        png_compression (int): PNG compression level in [0, 9].
+        num_threads (int): Number of encoding threads.
+
+    Returns:
+        Dict[int, bytes]: Encoded image per tile id.
+    """
+    params = get_encode_params(tile_format, quality, png_compression)
+
+    def encode(tile: Dict)-> bytes:
+
+        if 'data' in tile:
+            data = tile['data']
+        else:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+            data = image_source.read_region(x_start, y_start, x_end, y_end)
+
+        return encode_tile(data, tile_format, params)
+
+    with ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="tile-encoder") as executor:
+        encoded = list(executor.map(encode, tiles))
+
+    return {tile['id']: payload for tile, payload in zip(tiles, encoded)}
+
+
+class ShardWriter():
+
+    def __init__(self, shards_dir: str, max_shard_bytes: int = 1 << 30, shard_prefix: str = "shard", index_file_name: str = INDEX_FILE_NAME)-> None:
+        """
+        Packs encoded tiles into size-bounded tar shards (WebDataset layout).
+
+        Every tile is stored as `<tile name>.<format>` followed by its annotation record
+        `<tile name>.json`, both in the same shard. A new shard is started once the current
+        one would grow past `max_shard_bytes`. Shards are written under a temporary name and
+        renamed when complete.
+
+        `close` writes the index (`index.jsonl` by default) with one line per tile giving its 
+        shard and the byte offset and size of its image and record inside the shard, so a 
+        tile can be read with a single seek (`ShardReader`).
+
+        Args:
+            shards_dir (str): Output directory of the shards and the index.
+            max_shard_bytes (int): Size above which a new shard is started. A tile larger
+                than this gets a shard of its own.
+            shard_prefix (str): File name prefix of the shards.
+            index_file_name (str): File name of the index, ending with "index.jsonl". Writers 
+                sharing a directory, e.g. one per node, need distinct prefixes and index names.
+        """
+        self.shards_dir = shards_dir
+        self.max_shard_bytes = max_shard_bytes
+        self.shard_prefix = shard_prefix
+
+        os.makedirs(shards_dir, exist_ok=True)
+
+        self.index_path = os.path.join(shards_dir, index_file_name)
+        self.index_file = open(f"{self.index_path}.tmp", 'w')
+
+        self.shard_count = 0
+        self.shard_name = None
+        self.tar = None
+        self.tile_count = 0
+        self.bytes_written = 0
+
+    def __open_shard(self)-> None:
+
+        self.__close_shard()
+
+        self.shard_name = f"{self.shard_prefix}-{self.shard_count:06d}.tar"
+        self.tar = tarfile.open(os.path.join(self.shards_dir, f"{self.shard_name}.tmp"), 'w', format=tarfile.GNU_FORMAT)
+        self.shard_count += 1
+
+    def __close_shard(self)-> None:
+
+        if self.tar is None:
+            return
+
+        self.tar.close()
+        os.replace(os.path.join(self.shards_dir, f"{self.shard_name}.tmp"), os.path.join(self.shards_dir, self.shard_name))
+        self.tar = None
+
+    @staticmethod
+    def __member_bytes(name: str, size: int)-> int:
+        """
+        Bytes a member takes in a shard: its header blocks, long names included, and its
+        data padded to the tar block size.
+        """
+        member = tarfile.TarInfo(name)
+        member.size = size
+
+        header = member.tobuf(tarfile.GNU_FORMAT, tarfile.ENCODING, "surrogateescape")
+
+        return len(header) + -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+    @staticmethod
+    def __closed_shard_bytes(offset: int)-> int:
+        """
+        Size of a shard closed after `offset` bytes: two zero blocks end the archive, which
+        is padded to the tar record size.
+        """
+        return -(-(offset + 2 * tarfile.BLOCKSIZE) // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+
+    def __add_member(self, name: str, payload: bytes)-> Tuple[int, int]:
+
+        member = tarfile.TarInfo(name)
+        member.size = len(payload)
+
+        self.tar.addfile(member, io.BytesIO(payload))
+
+        # The data ends the member, padded to the tar block size
+        padded_size = -(-len(payload) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+        return self.tar.offset - padded_size, len(payload)
+
+    def add_entry(self, entry: Dict, file_name: str, tile_format: str = "jpg")-> Dict[int, str]:
+        """
+        Appends the selected tiles of one image.
+
+        Args:
+            entry (Dict): Result of `TileSelector.run()` with the encoded tiles under
+                "encoded_tiles" (`encode_tiles`), keyed by tile id.
+            file_name (str): File name of the source image.
+            tile_format (str): Extension of the encoded tiles.
+
+        Returns:
+            Dict[int, str]: Location of every tile as "<shard>/<tile file name>", used as
+            the COCO file name of the tile (`append_to_coco`).
+        """
+        tiles_annotations = {tile_annotations['tile_id']: tile_annotations for tile_annotations in entry['tiles_annotations']}
+        tile_locations = {}
+
+        for tile in entry['tiles']:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+            tile_annotations = tiles_annotations[tile['id']]
+            tile_name = tile_file_name(file_name, tile['id'], tile_format)
+
+            payload = entry['encoded_tiles'][tile['id']]
+            record = json.dumps({"file_name": tile_name,
+                                 "source_file_name": file_name,
+                                 "crop_box": [x_start, y_start, x_end, y_end],
+                                 "polygons": tile_annotations['polygons'],
+                                 "label_indices": tile_annotations['label_indices']}, separators=(',', ':')).encode()
+
+            record_name = f"{os.path.splitext(tile_name)[0]}.json"
+            tile_bytes = self.__member_bytes(tile_name, len(payload)) + self.__member_bytes(record_name, len(record))
+
+            if self.tar is None or (self.tar.offset and self.__closed_shard_bytes(self.tar.offset + tile_bytes) > self.max_shard_bytes):
+                self.__open_shard()
+
+            offset, size = self.__add_member(tile_name, payload)
+            record_offset, record_size = self.__add_member(record_name, record)
+
+            location = f"{self.shard_name}/{tile_name}"
+            tile_locations[tile['id']] = location
+
+            self.index_file.write(json.dumps({"file_name": location,
+                                              "shard": self.shard_name,
+                                              "offset": offset,
+                                              "size": size,
+                                              "record_offset": record_offset,
+                                              "record_size": record_size}, separators=(',', ':')))
+            self.index_file.write('\n')
+
+            self.tile_count += 1
+            self.bytes_written += size
+
+        return tile_locations
+
+    def close(self)-> None:
+        """
+        Completes the last shard and moves the index into place.
+        """
+        self.__close_shard()
+        self.index_file.close()
+        os.replace(self.index_file.name, self.index_path)
+
+    def abort(self)-> None:
+        """
+        Closes the files, leaving the completed shards but no index.
+        """
+        if self.tar is not None:
+            self.tar.close()
+            os.remove(os.path.join(self.shards_dir, f"{self.shard_name}.tmp"))
+            self.tar = None
+
+        self.index_file.close()
+        os.remove(self.index_file.name)
+
+    def __enter__(self)-> "ShardWriter":
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback)-> None:
+
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ShardReader():
+
+    def __init__(self, shards_dir: str)-> None:
+        """
+        Random-access reader of the tiles written by `ShardWriter`.
+
+        Tiles are looked up by their COCO file name ("<shard>/<tile file name>") in the
+        index and read with one seek, without scanning the shard. Every "*index.jsonl" file
+        of the directory is loaded, so the shards of several nodes can be read together.
+
+        Args:
+            shards_dir (str): Directory of the shards and their index.
+        """
+        self.shards_dir = shards_dir
+
+        self.index = {}
+
+        for index_file_name in sorted(os.listdir(shards_dir)):
+            if index_file_name.endswith(INDEX_FILE_NAME):
+                with open(os.path.join(shards_dir, index_file_name), 'r') as f:
+                    self.index.update((entry['file_name'], entry) for entry in map(json.loads, f))
+
+    def __len__(self)-> int:
+
+        return len(self.index)
+
+    def __contains__(self, file_name: str)-> bool:
+
+        return file_name in self.index
+
+    def __read(self, shard: str, offset: int, size: int)-> bytes:
+
+        with open(os.path.join(self.shards_dir, shard), 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def read_bytes(self, file_name: str)-> bytes:
+        """
+        Returns the encoded image of a tile.
+        """
+        entry = self.index[file_name]
+
+        return self.__read(entry['shard'], entry['offset'], entry['size'])
+
+    def read_tile(self, file_name: str)-> np.ndarray:
+        """
+        Returns the decoded pixels of a tile.
+        """
+        return cv2.imdecode(np.frombuffer(self.read_bytes(file_name), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def read_record(self, file_name: str)-> Dict:
+        """
+        Returns the annotation record stored with a tile ("file_name", "source_file_name",
+        "crop_box", "polygons" and "label_indices").
+        """
+        entry = self.index[file_name]
+
+        return json.loads(self.__read(entry['shard'], entry['record_offset'], entry['record_size']))
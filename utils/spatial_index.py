@@ -0,0 +1,64 @@
+import numpy as np
+from typing import Tuple, List, Dict
+
+
+class GridIndex():
+
+    def __init__(self, boxes: np.ndarray, cell_size: Tuple)-> None:
+        """
+        Builds a uniform grid over axis-aligned bounding boxes.
+
+        Every box is registered in each grid cell it touches. Cells are sized like the tiling
+        stride so that a tile query only visits the few cells lying under the tile.
+
+        Args:
+            boxes (np.ndarray): Array of shape (N, 4) with [x_min, y_min, x_max, y_max] per box.
+            cell_size (Tuple): Cell size as (cell_height, cell_width), typically the tiling stride.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.cell_height, self.cell_width = (max(int(size), 1) for size in cell_size)
+
+        self.cells: Dict[Tuple, List[int]] = {}
+
+        for box_id, (x_min, y_min, x_max, y_max) in enumerate(self.boxes):
+
+            row_start, row_end = self.__cell_range(y_min, y_max, self.cell_height)
+            col_start, col_end = self.__cell_range(x_min, x_max, self.cell_width)
+
+            for row in range(row_start, row_end + 1):
+                for col in range(col_start, col_end + 1):
+                    self.cells.setdefault((row, col), []).append(box_id)
+
+    @staticmethod
+    def __cell_range(start: float, end: float, cell_size: int)-> Tuple:
+
+        return int(np.floor(start / cell_size)), int(np.floor(end / cell_size))
+
+    def query(self, x_min: float, y_min: float, x_max: float, y_max: float)-> List[int]:
+        """
+        Returns the ids of all boxes whose extent intersects the query rectangle.
+
+        Boxes that only touch the rectangle border are included as well, the caller decides
+        whether a zero-area contact matters.
+
+        Args:
+            x_min, y_min, x_max, y_max (float): Query rectangle.
+
+        Returns:
+            List[int]: Sorted box ids, i.e. in the same order as the boxes were given.
+        """
+        row_start, row_end = self.__cell_range(y_min, y_max, self.cell_height)
+        col_start, col_end = self.__cell_range(x_min, x_max, self.cell_width)
+
+        candidate_ids = set()
+        for row in range(row_start, row_end + 1):
+            for col in range(col_start, col_end + 1):
+                candidate_ids.update(self.cells.get((row, col), ()))
+
+        candidate_ids = np.array(sorted(candidate_ids), dtype=np.int64)
+        boxes = self.boxes[candidate_ids]
+
+        overlapping = ((boxes[:, 0] <= x_max) & (boxes[:, 2] >= x_min) &
+                       (boxes[:, 1] <= y_max) & (boxes[:, 3] >= y_min))
+
+        return candidate_ids[overlapping].tolist()
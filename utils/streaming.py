@@ -0,0 +1,283 @@
+import queue
+import threading
+import time
+from typing import Tuple, List, Dict, Callable, Iterable, Iterator
+
+
+class BoundedQueue(queue.Queue):
+
+    def __init__(self, maxsize: int)-> None:
+        """
+        FIFO queue between two pipeline stages that records its own occupancy.
+
+        The occupancy is averaged over time, so a queue that is mostly full points at a
+        slow consumer and a queue that is mostly empty at a slow producer. The time the
+        producer spent blocked on a full queue and the consumer on an empty one is kept too.
+
+        Args:
+            maxsize (int): Capacity of the queue.
+        """
+        super().__init__(maxsize)
+
+        self.started = time.perf_counter()
+        self.last_change = self.started
+        self.occupancy_seconds = 0.0
+        self.max_occupancy = 0
+        self.put_wait_seconds = 0.0
+        self.get_wait_seconds = 0.0
+
+    def __record(self)-> None:
+
+        # Called with the queue mutex held, right before the size changes
+        now = time.perf_counter()
+        self.occupancy_seconds += len(self.queue) * (now - self.last_change)
+        self.last_change = now
+
+    def _put(self, item)-> None:
+
+        self.__record()
+        super()._put(item)
+        self.max_occupancy = max(self.max_occupancy, len(self.queue))
+
+    def _get(self):
+
+        self.__record()
+        return super()._get()
+
+    def put(self, item, block: bool = True, timeout: float = None)-> None:
+
+        start = time.perf_counter()
+        try:
+            super().put(item, block, timeout)
+        finally:
+            self.put_wait_seconds += time.perf_counter() - start
+
+    def get(self, block: bool = True, timeout: float = None):
+
+        start = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            self.get_wait_seconds += time.perf_counter() - start
+
+    def stats(self)-> Dict:
+        """
+        Returns:
+            Dict: "capacity", "mean_occupancy" (time-weighted), "max_occupancy",
+            "put_wait_seconds" and "get_wait_seconds".
+        """
+        with self.mutex:
+            self.__record()
+            elapsed = self.last_change - self.started
+
+            return {"capacity": self.maxsize,
+                    "mean_occupancy": self.occupancy_seconds / elapsed if elapsed > 0 else 0.0,
+                    "max_occupancy": self.max_occupancy,
+                    "put_wait_seconds": self.put_wait_seconds,
+                    "get_wait_seconds": self.get_wait_seconds}
+
+
+class ByteBudget():
+
+    def __init__(self, max_bytes: int = None)-> None:
+        """
+        Ceiling on the bytes held in flight by a pipeline.
+
+        A stage acquires the bytes of an item before materializing it, and the bytes are
+        released once the item left the pipeline. An item is always admitted when nothing
+        is in flight, so an item larger than the ceiling passes alone instead of blocking.
+
+        Args:
+            max_bytes (int): The ceiling. None disables it, the bytes are still counted.
+        """
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.peak_bytes = 0
+        self.wait_seconds = 0.0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def acquire(self, nbytes: int)-> None:
+        """
+        Blocks until `nbytes` fit under the ceiling.
+
+        Raises:
+            RuntimeError: If the budget is closed while waiting.
+        """
+        start = time.perf_counter()
+
+        with self.condition:
+            while (not self.closed and self.max_bytes is not None and self.in_flight
+                   and self.in_flight + nbytes > self.max_bytes):
+                self.condition.wait()
+
+            self.wait_seconds += time.perf_counter() - start
+
+            if self.closed:
+                raise RuntimeError("The byte budget was closed.")
+
+            self.in_flight += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.in_flight)
+
+    def release(self, nbytes: int)-> None:
+
+        with self.condition:
+            self.in_flight -= nbytes
+            self.condition.notify_all()
+
+    def close(self)-> None:
+        """
+        Wakes up every waiting stage, making its `acquire` fail.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self)-> Dict:
+        """
+        Returns:
+            Dict: "max_bytes", "peak_bytes" and "wait_seconds" (time spent blocked in
+            `acquire`, summed over the stages).
+        """
+        return {"max_bytes": self.max_bytes,
+                "peak_bytes": self.peak_bytes,
+                "wait_seconds": self.wait_seconds}
+
+
+class _Failure():
+
+    def __init__(self, exception: BaseException)-> None:
+
+        self.exception = exception
+
+
+_END = object()
+
+
+class StreamingPipeline():
+
+    def __init__(self, stages: List[Tuple[str, Callable]], queue_size: int = 2, byte_budget: ByteBudget = None)-> None:
+        """
+        Runs a chain of stages over a stream of items, each stage on its own thread.
+
+        Consecutive stages are joined by `BoundedQueue`s of `queue_size` items, so a stage
+        running ahead blocks once its output queue is full (backpressure) and the number of
+        items in flight stays bounded. Items come out in input order. Stages overlap as long
+        as they release the GIL, as decoding, clipping and encoding mostly do.
+
+            pipeline = StreamingPipeline([("select", select), ("read", read), ("write", write)])
+            for result in pipeline.run(items):
+                ...
+
+        The first exception raised by a stage stops the pipeline and is raised again by
+        `run` in the consumer.
+
+        Args:
+            stages (List[Tuple[str, Callable]]): (name, function) of every stage, in order.
+                Each function takes the output of the previous stage.
+            queue_size (int): Capacity of the queue in front of every stage and of the output.
+            byte_budget (ByteBudget): Optional budget used by the stages, closed when the
+                pipeline stops so no stage stays blocked on it.
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.byte_budget = byte_budget
+
+        self.queues: Dict[str, BoundedQueue] = {}
+        self.stop_event = threading.Event()
+
+    def __put(self, output_queue: BoundedQueue, item)-> bool:
+
+        while not self.stop_event.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def __get(self, input_queue: BoundedQueue):
+
+        while not self.stop_event.is_set():
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+        return _END
+
+    def __feed(self, items: Iterable, output_queue: BoundedQueue)-> None:
+
+        try:
+            for item in items:
+                if not self.__put(output_queue, item):
+                    return
+        except BaseException as e:
+            self.__put(output_queue, _Failure(e))
+            return
+
+        self.__put(output_queue, _END)
+
+    def __work(self, function: Callable, input_queue: BoundedQueue, output_queue: BoundedQueue)-> None:
+
+        while True:
+            item = self.__get(input_queue)
+
+            if item is _END or isinstance(item, _Failure):
+                self.__put(output_queue, item)
+                return
+
+            try:
+                result = function(item)
+            except BaseException as e:
+                self.__put(output_queue, _Failure(e))
+                return
+
+            if not self.__put(output_queue, result):
+                return
+
+    def run(self, items: Iterable)-> Iterator:
+        """
+        Yields the output of the last stage for every item, in input order.
+        """
+        self.queues = {name: BoundedQueue(self.queue_size) for name, _ in self.stages}
+        self.queues["output"] = BoundedQueue(self.queue_size)
+
+        names = [name for name, _ in self.stages] + ["output"]
+
+        threads = [threading.Thread(target=self.__feed, args=(items, self.queues[names[0]]), name="stream-feed", daemon=True)]
+
+        for (name, function), output_name in zip(self.stages, names[1:]):
+            threads.append(threading.Thread(target=self.__work,
+                                            args=(function, self.queues[name], self.queues[output_name]),
+                                            name=f"stream-{name}",
+                                            daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self.queues["output"].get()
+
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.exception
+
+                yield item
+        finally:
+            self.stop_event.set()
+            if self.byte_budget is not None:
+                self.byte_budget.close()
+            for thread in threads:
+                thread.join()
+
+    def stats(self)-> Dict:
+        """
+        Returns:
+            Dict: `BoundedQueue.stats` of the queue in front of every stage, by stage name,
+            and of the "output" queue read by the consumer.
+        """
+        return {name: bounded_queue.stats() for name, bounded_queue in self.queues.items()}
@@ -0,0 +1,235 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Tuple, Dict
+import numpy as np
+from utils.helper import tile_file_name
+from utils.image_source import ImageSource, ArrayImageSource, open_image_source
+
+
+# Windowed sources hold little memory but one file each
+MAX_OPEN_SOURCES = 64
+
+
+class ManifestWriter():
+
+    def __init__(self, manifest_path: str)-> None:
+        """
+        Streams a crop manifest: one JSON line per selected tile with the source image, the
+        tile rectangle in it and the tile-relative polygons. It replaces the tile files of
+        the "tiles" output mode. `VirtualTileDataset` serves the tiles from it.
+
+        The manifest is written next to its destination and moved into place at `close`.
+
+        Args:
+            manifest_path (str): Final path of the JSONL manifest.
+        """
+        self.manifest_path = manifest_path
+        self.temporary_path = f"{manifest_path}.tmp"
+
+        self.file = open(self.temporary_path, 'w')
+        self.count = 0
+
+    def add_entry(self, entry: Dict, file_name: str, tile_format: str = "jpg", image_size: Tuple = None)-> None:
+        """
+        Appends the selected tiles of one image.
+
+        Args:
+            entry (Dict): Result of `TileSelector.run()`, pixel data is not needed.
+            file_name (str): File name of the source image.
+            tile_format (str): Extension used for the virtual tile names, matching the COCO output.
+            image_size (Tuple): Optional (height, width) of the source image, written as
+                "source_size". Raw images cannot be read back without it.
+        """
+        tiles_annotations = {tile_annotations['tile_id']: tile_annotations for tile_annotations in entry['tiles_annotations']}
+
+        for tile in entry['tiles']:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+            tile_annotations = tiles_annotations[tile['id']]
+
+            record = {"file_name": tile_file_name(file_name, tile['id'], tile_format),
+                      "source_file_name": file_name,
+                      "crop_box": [x_start, y_start, x_end, y_end],
+                      "polygons": tile_annotations['polygons'],
+                      "label_indices": tile_annotations['label_indices']}
+
+            if image_size is not None:
+                record['source_size'] = list(image_size)
+
+            self.file.write(json.dumps(record, separators=(',', ':')))
+            self.file.write('\n')
+            self.count += 1
+
+    def close(self)-> None:
+
+        self.file.close()
+        os.replace(self.temporary_path, self.manifest_path)
+
+    def abort(self)-> None:
+
+        self.file.close()
+        if os.path.exists(self.temporary_path):
+            os.remove(self.temporary_path)
+
+    def __enter__(self)-> "ManifestWriter":
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback)-> None:
+
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class VirtualTileDataset():
+
+    def __init__(self, manifest_path: str, images_dir: str, cache_bytes: int = 1 << 30)-> None:
+        """
+        Random-access tile reader over a crop manifest.
+
+        Tiles are cropped on demand from the source images, so no tile file is ever created.
+        Source images are opened with `open_image_source`: `.npy`, `.raw` and PPM/PGM images
+        are read tile by tile, other formats are decoded whole. Open sources are kept in an
+        LRU cache bounded by `cache_bytes` of decoded images and `MAX_OPEN_SOURCES` sources.
+        Reading the tiles in manifest order opens each source image once, because the
+        manifest lists the tiles of an image together.
+
+        Args:
+            manifest_path (str): JSONL manifest written by `ManifestWriter`.
+            images_dir (str): Directory of the source images.
+            cache_bytes (int): Upper bound on the bytes of decoded images kept in memory. The
+                image being read is always kept, even when larger than the bound.
+        """
+        self.images_dir = images_dir
+        self.cache_bytes = cache_bytes
+
+        with open(manifest_path, 'r') as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+
+        self.cache: "OrderedDict[str, ImageSource]" = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+        # Sources being read are only closed by their last reader once evicted
+        self.readers: Dict[ImageSource, int] = {}
+        self.evicted = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self)-> int:
+
+        return len(self.records)
+
+    @staticmethod
+    def __source_bytes(source: ImageSource)-> int:
+
+        return source.image.nbytes if isinstance(source, ArrayImageSource) else 0
+
+    def __acquire(self, record: Dict)-> ImageSource:
+
+        source_file_name = record['source_file_name']
+
+        with self.lock:
+            if source_file_name in self.cache:
+                self.cache.move_to_end(source_file_name)
+                self.hits += 1
+
+                source = self.cache[source_file_name]
+                self.readers[source] = self.readers.get(source, 0) + 1
+                return source
+
+        source = open_image_source(os.path.join(self.images_dir, source_file_name), record.get('source_size'))
+
+        with self.lock:
+            self.misses += 1
+
+            # Another reader opened it meanwhile
+            if source_file_name in self.cache:
+                source.close()
+                source = self.cache[source_file_name]
+            else:
+                self.cache[source_file_name] = source
+                self.cached_bytes += self.__source_bytes(source)
+
+            self.readers[source] = self.readers.get(source, 0) + 1
+
+            while (self.cached_bytes > self.cache_bytes or len(self.cache) > MAX_OPEN_SOURCES) and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= self.__source_bytes(evicted)
+
+                if evicted in self.readers:
+                    self.evicted.add(evicted)
+                else:
+                    evicted.close()
+
+        return source
+
+    def __release(self, source: ImageSource)-> None:
+
+        with self.lock:
+            self.readers[source] -= 1
+
+            if self.readers[source] == 0:
+                del self.readers[source]
+
+                if source in self.evicted:
+                    self.evicted.remove(source)
+                    source.close()
+
+    def __getitem__(self, index: int)-> Tuple[np.ndarray, Dict]:
+        """
+        Returns the pixels of a tile and its manifest record.
+
+        Args:
+            index (int): Tile position in the manifest.
+
+        Returns:
+            Tuple[np.ndarray, Dict]: The tile image, which the caller owns, and its record
+            with "file_name", "source_file_name", "crop_box", "polygons" and "label_indices".
+        """
+        record = self.records[index]
+        source = self.__acquire(record)
+
+        x_start, y_start, x_end, y_end = record['crop_box']
+
+        try:
+            tile = source.read_region(x_start, y_start, x_end, y_end)
+        finally:
+            self.__release(source)
+
+        # Regions of a decoded image are views of the cached array
+        if isinstance(source, ArrayImageSource):
+            tile = tile.copy()
+
+        return tile, record
+
+    def close(self)-> None:
+        """
+        Closes the cached sources.
+        """
+        with self.lock:
+            for source in self.cache.values():
+                if source in self.readers:
+                    self.evicted.add(source)
+                else:
+                    source.close()
+
+            self.cache.clear()
+            self.cached_bytes = 0
+
+    def __iter__(self):
+
+        for index in range(len(self)):
+            yield self[index]
+
+    def __enter__(self)-> "VirtualTileDataset":
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback)-> None:
+
+        self.close()
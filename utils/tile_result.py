@@ -0,0 +1,205 @@
+import numpy as np
+from typing import Tuple, List, Dict
+
+
+def flat_polygon_bboxes(polygon_coordinates: np.ndarray, polygon_offsets: np.ndarray)-> np.ndarray:
+    """
+    Returns the COCO bounding box [x, y, width, height] of polygons stored in a flat
+    [x1, y1, x2, y2, ...] buffer, computed for all polygons at once.
+
+    Args:
+        polygon_coordinates (np.ndarray): Flat coordinates of all polygons.
+        polygon_offsets (np.ndarray): (M + 1,) start of every polygon in the buffer.
+
+    Returns:
+        np.ndarray: (M, 4) boxes with the dtype of the coordinates, zeros for empty polygons.
+    """
+    polygon_coordinates = np.asarray(polygon_coordinates)
+    bboxes = np.zeros((len(polygon_offsets) - 1, 4), dtype=polygon_coordinates.dtype)
+
+    rows = np.flatnonzero(np.diff(polygon_offsets) > 0)
+
+    if len(rows):
+        xs = polygon_coordinates[0::2]
+        ys = polygon_coordinates[1::2]
+        starts = np.asarray(polygon_offsets)[rows] // 2
+
+        x_min, y_min = np.minimum.reduceat(xs, starts), np.minimum.reduceat(ys, starts)
+        x_max, y_max = np.maximum.reduceat(xs, starts), np.maximum.reduceat(ys, starts)
+
+        # reduceat runs up to the next start, empty polygons in between have no values
+        bboxes[rows] = np.stack([x_min, y_min, x_max - x_min, y_max - y_min], axis=1)
+
+    return bboxes
+
+
+class TileRecord():
+    """
+    One tile of a `CompactTileResult`: its id, its box as (x_start, y_start, x_end, y_end)
+    and its pixels when they were cropped.
+
+    Item access mirrors the dict form of the tiles ("id", "coordinates", "data"), so code
+    written for `TileSelector.run()` dicts, such as `save_results`, reads it unchanged.
+    """
+
+    __slots__ = ("id", "box", "data")
+
+    def __init__(self, tile_id: int, box: Tuple, data: np.ndarray = None)-> None:
+
+        self.id = tile_id
+        self.box = box
+        self.data = data
+
+    @property
+    def coordinates(self)-> List[int]:
+
+        x_start, y_start, x_end, y_end = self.box
+
+        return [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end]
+
+    def __getitem__(self, key: str):
+
+        if key == 'id':
+            return self.id
+        if key == 'coordinates':
+            return self.coordinates
+        if key == 'data' and self.data is not None:
+            return self.data
+
+        raise KeyError(key)
+
+    def __contains__(self, key: str)-> bool:
+
+        return key in ('id', 'coordinates') or (key == 'data' and self.data is not None)
+
+    def to_dict(self)-> Dict:
+
+        tile = {"id": self.id, "coordinates": self.coordinates}
+
+        if self.data is not None:
+            tile['data'] = self.data
+
+        return tile
+
+
+class CompactTileResult():
+
+    __slots__ = ("tiles", "annotation_offsets", "annotation_ids", "label_indices", "polygon_offsets", "polygon_coordinates")
+
+    def __init__(self, tiles: List[TileRecord], annotation_offsets: np.ndarray, annotation_ids: np.ndarray, label_indices: np.ndarray, polygon_offsets: np.ndarray, polygon_coordinates: np.ndarray)-> None:
+        """
+        Array-backed form of a `TileSelector.run()` result, returned by `run(compact=True)`.
+
+        The annotations of the tiles are stored in CSR layout: the annotations of the i-th
+        tile are the rows `annotation_offsets[i]:annotation_offsets[i + 1]` of
+        `annotation_ids` and `label_indices`, and the polygon of the j-th row is
+        `polygon_coordinates[polygon_offsets[j]:polygon_offsets[j + 1]]`, a flat
+        [x1, y1, x2, y2, ...] buffer relative to the tile. A dense image thus costs a few
+        arrays instead of one Python list per polygon.
+
+        `append_to_coco` and `save_results` accept it directly. `entry["tiles"]` gives the
+        `TileRecord`s, and `to_dict` (or `entry["tiles_annotations"]`) converts it back to
+        the dict form.
+
+        Args:
+            tiles (List[TileRecord]): The tiles.
+            annotation_offsets (np.ndarray): int64 (T + 1,) row pointer of the tiles.
+            annotation_ids (np.ndarray): int64 (M,) annotation index of every row.
+            label_indices (np.ndarray): int64 (M,) category of every row.
+            polygon_offsets (np.ndarray): int64 (M + 1,) row pointer into the coordinates.
+            polygon_coordinates (np.ndarray): int64 flat polygon coordinates.
+        """
+        self.tiles = tiles
+        self.annotation_offsets = annotation_offsets
+        self.annotation_ids = annotation_ids
+        self.label_indices = label_indices
+        self.polygon_offsets = polygon_offsets
+        self.polygon_coordinates = polygon_coordinates
+
+    @classmethod
+    def from_dict(cls, entry: Dict)-> "CompactTileResult":
+        """
+        Builds the compact form of a `TileSelector.run()` dict result.
+        """
+        tiles_annotations = {tile_annotations['tile_id']: tile_annotations for tile_annotations in entry['tiles_annotations']}
+
+        tiles = []
+        annotation_counts = []
+        annotation_ids = []
+        label_indices = []
+        polygons = []
+
+        for tile in entry['tiles']:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+            tiles.append(TileRecord(tile['id'], (x_start, y_start, x_end, y_end), tile.get('data')))
+
+            tile_annotations = tiles_annotations[tile['id']]
+            annotation_counts.append(len(tile_annotations['label_indices']))
+            annotation_ids.extend(tile_annotations.get('selected_annotation_ids', [-1] * len(tile_annotations['label_indices'])))
+            label_indices.extend(tile_annotations['label_indices'])
+            polygons.extend(tile_annotations['polygons'])
+
+        return cls(tiles=tiles,
+                   annotation_offsets=np.concatenate(([0], np.cumsum(annotation_counts, dtype=np.int64))).astype(np.int64),
+                   annotation_ids=np.array(annotation_ids, dtype=np.int64),
+                   label_indices=np.array(label_indices, dtype=np.int64),
+                   polygon_offsets=np.concatenate(([0], np.cumsum([len(polygon) for polygon in polygons], dtype=np.int64))).astype(np.int64),
+                   polygon_coordinates=np.array([value for polygon in polygons for value in polygon], dtype=np.int64))
+
+    def __len__(self)-> int:
+
+        return len(self.tiles)
+
+    def __getitem__(self, key: str):
+
+        if key == 'tiles':
+            return self.tiles
+        if key == 'tiles_annotations':
+            return self.to_dict()['tiles_annotations']
+
+        raise KeyError(key)
+
+    def polygons(self, tile_index: int)-> List[np.ndarray]:
+        """
+        Returns the polygons of a tile as views of the coordinate buffer.
+        """
+        rows = range(self.annotation_offsets[tile_index], self.annotation_offsets[tile_index + 1])
+
+        return [self.polygon_coordinates[self.polygon_offsets[row]:self.polygon_offsets[row + 1]] for row in rows]
+
+    def polygon_bboxes(self)-> np.ndarray:
+        """
+        Returns the COCO bounding box [x, y, width, height] of every row (`flat_polygon_bboxes`).
+        """
+        return flat_polygon_bboxes(self.polygon_coordinates, self.polygon_offsets)
+
+    def without_data(self)-> "CompactTileResult":
+        """
+        Returns the same result with tiles that carry no pixels, sharing the arrays.
+        """
+        tiles = [TileRecord(tile.id, tile.box) for tile in self.tiles]
+
+        return CompactTileResult(tiles, self.annotation_offsets, self.annotation_ids, self.label_indices, self.polygon_offsets, self.polygon_coordinates)
+
+    def to_dict(self)-> Dict:
+        """
+        Returns the dict form returned by `TileSelector.run()`, with Python ints.
+        """
+        annotation_offsets = self.annotation_offsets.tolist()
+        annotation_ids = self.annotation_ids.tolist()
+        label_indices = self.label_indices.tolist()
+        polygon_offsets = self.polygon_offsets.tolist()
+        polygon_coordinates = self.polygon_coordinates.tolist()
+
+        tiles_annotations = []
+
+        for tile_index, tile in enumerate(self.tiles):
+            start, end = annotation_offsets[tile_index], annotation_offsets[tile_index + 1]
+
+            tiles_annotations.append({"tile_id": tile.id,
+                                      "selected_annotation_ids": annotation_ids[start:end],
+                                      "polygons": [polygon_coordinates[polygon_offsets[row]:polygon_offsets[row + 1]] for row in range(start, end)],
+                                      "label_indices": label_indices[start:end]})
+
+        return {"tiles": [tile.to_dict() for tile in self.tiles],
+                "tiles_annotations": tiles_annotations}
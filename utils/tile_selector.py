@@ -1,100 +1,271 @@
 import numpy as np
 from typing import Tuple, List, Dict
-import pyclipper
+from utils.geometry import AnnotationGeometry, tile_boxes_from_coordinates
+from utils.set_cover import to_bitset, lazy_greedy_cover, exact_cover
+from utils.instrumentation import StageMetrics
+from utils.spatial_index import GridIndex
+from utils.image_source import ImageSource
+from utils.tile_result import TileRecord, CompactTileResult
+
+
+# Upper bound on the tiles x annotations cells evaluated at once in __group_polygons
+MAX_MATRIX_CELLS = 1 << 22
+
+# Ways of choosing the tiles covering all annotations, see __indentify_informative_tiles
+SELECTION_MODES = ("greedy", "exact")
+
+# Ways of proposing candidate tiles, see __tile_image
+CANDIDATE_MODES = ("grid", "anchored")
+
+
+def plan_tiles(image_size: Tuple, tile_size: Tuple, stride: Tuple)-> List:
+    """
+    Plans overlapping tiles over an image based on tile size and stride.
+
+    A window of size `tile_size` slides over the image with steps defined by `stride`. Full 
+    coverage is ensured by including tiles at the image edges even if the stride does not 
+    fit perfectly.
+
+    Steps:
+        1. Determine all possible vertical and horizontal start positions for tiles,
+        making sure to include the last tile starting positions to cover the edges.
+        2. For each (y_start, x_start) position, plan a tile of size `tile_size`.
+        3. Store its unique ID and the polygon coordinates of the tile in clockwise 
+        order: top-left, top-right, bottom-right, bottom-left.
+
+    Args:
+        image_size (Tuple): (image_height, image_width).
+        tile_size (Tuple): (tile_height, tile_width).
+        stride (Tuple): (stride_height, stride_width).
+
+    Returns:
+        List[dict]: A list of tiles where each tile contains:
+            - "id" (int): Unique tile identifier.
+            - "coordinates" (List[int]): List of 8 integers representing the four 
+            corner points of the tile polygon in clockwise order:
+            [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end].
+    """
+    tiles = []
+
+    image_height, image_width = image_size
+    tile_height, tile_width = tile_size
+    stride_height, stride_width = stride
+
+    max_y = image_height - tile_height
+    max_x = image_width - tile_width
+
+    y_starts = list(range(0, max_y + 1, stride_height))
+    x_starts = list(range(0, max_x + 1, stride_width))
+
+    if y_starts[-1] != max_y:
+        y_starts.append(max_y)
+    if x_starts[-1] != max_x:
+        x_starts.append(max_x)
+    
+    tile_id = 0
+    
+    for y_start in y_starts:
+        y_end = y_start + tile_height
+        for x_start in x_starts:
+            x_end = x_start + tile_width
+            
+            tile = {
+                "id": tile_id,
+                "coordinates": [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end]}
+
+            tiles.append(tile)
+            
+            tile_id+=1
+    
+    return tiles
+
+
+def plan_anchored_tiles(image_size: Tuple, tile_size: Tuple, boxes: np.ndarray)-> List:
+    """
+    Plans candidate tiles anchored on the annotations instead of a stride lattice.
+
+    Every annotation proposes the tiles aligned on its bounding box: starting at its left or 
+    top edge and ending at its right or bottom edge, in both directions. The extent of its 
+    cluster, i.e. the annotations lying within one tile around it, proposes the same tiles 
+    plus the tile centered on it, so that neighbouring annotations can share a tile. Origins 
+    are clamped to the image and duplicates are removed. Every annotation that fits in a tile 
+    gets a candidate showing it entirely.
+
+    Empty areas of the image propose nothing, so sparse images get far fewer candidates 
+    than with `plan_tiles`. On images crowded with annotations the grid can be smaller.
+
+    Args:
+        image_size (Tuple): (image_height, image_width).
+        tile_size (Tuple): (tile_height, tile_width).
+        boxes (np.ndarray): (N, 4) annotation bounding boxes as [x_min, y_min, x_max, y_max].
+
+    Returns:
+        List[dict]: Tiles in the `plan_tiles` format, ordered by row then column, with 
+        consecutive ids.
+    """
+    image_height, image_width = image_size
+    tile_height, tile_width = tile_size
+
+    max_y = image_height - tile_height
+    max_x = image_width - tile_width
+
+    if max_y < 0 or max_x < 0:
+        raise ValueError(f"The tile size {tuple(tile_size)} is larger than the image {tuple(image_size)}.")
+
+    def alignments(start: int, end: int, size: int, limit: int, centered: bool)-> set:
+
+        origins = (start, end - size, (start + end - size) // 2) if centered else (start, end - size)
+
+        return {min(max(origin, 0), limit) for origin in origins}
+
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    grid_index = GridIndex(boxes, (tile_height, tile_width))
+
+    origins = set()
+
+    for x_min, y_min, x_max, y_max in boxes.tolist():
+
+        neighbour_ids = grid_index.query(x_min - tile_width, y_min - tile_height, x_max + tile_width, y_max + tile_height)
+        cluster_x_min, cluster_y_min = boxes[neighbour_ids, :2].min(axis=0).tolist()
+        cluster_x_max, cluster_y_max = boxes[neighbour_ids, 2:].max(axis=0).tolist()
+
+        for x_starts, y_starts in ((alignments(x_min, x_max, tile_width, max_x, False), alignments(y_min, y_max, tile_height, max_y, False)),
+                                   (alignments(cluster_x_min, cluster_x_max, tile_width, max_x, True), alignments(cluster_y_min, cluster_y_max, tile_height, max_y, True))):
+            origins.update((y_start, x_start) for y_start in y_starts for x_start in x_starts)
+
+    tiles = []
+
+    for tile_id, (y_start, x_start) in enumerate(sorted(origins)):
+        y_end = y_start + tile_height
+        x_end = x_start + tile_width
+
+        tiles.append({"id": tile_id,
+                      "coordinates": [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end]})
+
+    return tiles
+
 
+def crop_tiles(image: np.ndarray, tiles: List)-> List:
+    """
+    Materializes the pixels of tiles planned without an image.
+
+    Args:
+        image (np.ndarray): The full image.
+        tiles (List[dict]): Tiles with "id" and "coordinates", e.g. from a pixel-free 
+            `TileSelector.run()`.
+
+    Returns:
+        List[dict]: Copies of the tiles with their image data under "data".
+    """
+    cropped_tiles = []
+
+    for tile in tiles:
+        x_start, y_start, x_end, _, _, y_end, _, _ = tile['coordinates']
+        cropped_tiles.append({**tile, "data": image[y_start:y_end, x_start:x_end]})
+
+    return cropped_tiles
 
 
 class TileSelector():
     
-    def __init__(self, image: np.ndarray, tile_size: Tuple, stride: Tuple, image_annotations:List, polygon_visibility_threshold:float = 0.8)-> None:
-        
+    def __init__(self, image: np.ndarray, tile_size: Tuple, stride: Tuple, image_annotations:List, polygon_visibility_threshold:float = 0.8, image_size: Tuple = None, metrics: StageMetrics = None, selection_mode: str = "greedy", time_budget: float = 1.0, candidate_mode: str = "grid")-> None:
+        """
+        Args:
+            image (np.ndarray): The image to tile. May be None when `image_size` is given, the 
+                selection is then planned without pixels and the returned tiles carry no "data". 
+                An `ImageSource` only provides the size, its pixels are read tile by tile when 
+                saving (`save_results`) and the returned tiles carry no "data" either.
+            tile_size (Tuple): (tile_height, tile_width).
+            stride (Tuple): (stride_height, stride_width).
+            image_annotations (List): COCO annotations of the image.
+            polygon_visibility_threshold (float): Minimum visible area ratio of a polygon in a tile.
+            image_size (Tuple): (image_height, image_width), e.g. from the COCO image record. 
+                Ignored when `image` is given.
+            metrics (StageMetrics): Receives the stage timings and counters of `run`. A new 
+                one is created when None, available as `self.metrics`.
+            selection_mode (str): "greedy" (default) or "exact" for a minimum tile cover.
+            time_budget (float): Seconds allowed to the exact search of one image, after 
+                which the best selection found is kept. No limit when None.
+            candidate_mode (str): "grid" (default) proposes every stride position as a 
+                candidate tile, "anchored" proposes tiles aligned on the annotations 
+                (`plan_anchored_tiles`), in which case `stride` is not used.
+        """
+        if image is None and image_size is None:
+            raise ValueError("TileSelector needs either an image or an image_size.")
+
+        if selection_mode not in SELECTION_MODES:
+            raise ValueError(f"Unsupported selection mode {selection_mode}, expected one of {list(SELECTION_MODES)}.")
+
+        if candidate_mode not in CANDIDATE_MODES:
+            raise ValueError(f"Unsupported candidate mode {candidate_mode}, expected one of {list(CANDIDATE_MODES)}.")
+
         self.image = image
+        self.image_size = tuple(image.shape[:2]) if image is not None else tuple(image_size)
         self.image_annotations = image_annotations
         
         # Set the parameters
         self.tile_size = tile_size
         self.stride = stride
         self.polygon_visibility_threshold = polygon_visibility_threshold
+        self.selection_mode = selection_mode
+        self.time_budget = time_budget
+        self.candidate_mode = candidate_mode
+
+        # Built on first use, shared by the candidate planning and the polygon grouping
+        self.__geometry = None
+
+        # Gain evaluation counts of the last tile selection
+        self.selection_stats = {}
+
+        self.metrics = metrics if metrics is not None else StageMetrics()
 
 
     def __tile_image(self)-> List:
         """
-        Splits the input image into overlapping tiles based on tile size and stride.
-
-        This method divides the image into smaller tiles by sliding a window of size 
-        `tile_size` over the image with steps defined by `stride`. It ensures full coverage 
-        by including tiles at the image edges even if the stride does not fit perfectly.
-
-        Steps:
-            1. Determine all possible vertical and horizontal start positions for tiles,
-            making sure to include the last tile starting positions to cover the edges.
-            2. For each (y_start, x_start) position, extract a tile of size `tile_size` from 
-            the image.
-            3. Store the tile image data, its unique ID, and the polygon coordinates of the tile 
-            in clockwise order: top-left, top-right, bottom-right, bottom-left.
+        Splits the input image into overlapping tiles based on tile size and stride (`plan_tiles`).
+
+        Only the image size is used here. Pixels are cropped in `run` for the selected tiles only.
+
+        In the "anchored" candidate mode the tiles are instead aligned on the annotation 
+        bounding boxes (`plan_anchored_tiles`), with the same output format.
         
         Returns:
             List[dict]: A list of tiles where each tile contains:
                 - "id" (int): Unique tile identifier.
-                - "data" (np.ndarray): The image data of the tile.
                 - "coordinates" (List[int]): List of 8 integers representing the four 
                 corner points of the tile polygon in clockwise order:
                 [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end].
         """
-        tiles = []
+        if self.candidate_mode == "anchored":
+            return plan_anchored_tiles(self.image_size, self.tile_size, self.__get_geometry().boxes)
 
-        image_height, image_width = self.image.shape[:2]
-        tile_height, tile_width = self.tile_size
-        stride_height, stride_width = self.stride
+        return plan_tiles(self.image_size, self.tile_size, self.stride)
 
-        max_y = image_height - tile_height
-        max_x = image_width - tile_width
+    def __get_geometry(self)-> AnnotationGeometry:
 
-        y_starts = list(range(0, max_y + 1, stride_height))
-        x_starts = list(range(0, max_x + 1, stride_width))
+        if self.__geometry is None:
+            self.__geometry = AnnotationGeometry(self.image_annotations)
 
-        if y_starts[-1] != max_y:
-            y_starts.append(max_y)
-        if x_starts[-1] != max_x:
-            x_starts.append(max_x)
-        
-        tile_id = 0
-        
-        for y_start in y_starts:
-            y_end = y_start + tile_height
-            for x_start in x_starts:
-                x_end = x_start + tile_width
-                
-                tiled_image = self.image[y_start:y_end, x_start:x_end]
-                tile = {
-                    "id": tile_id,
-                    "data": tiled_image,
-                    "coordinates": [x_start, y_start, x_end, y_start, x_end, y_end, x_start, y_end]}
-
-                tiles.append(tile)
-                
-                tile_id+=1
-        
-        return tiles
+        return self.__geometry
 
     def __group_polygons(self, tiles:List)-> List:
         """
         Assigns image annotations to tiles based on polygon overlap and visibility threshold.
 
         This method processes each tile and determines which annotations belong to it by:
-            1. Converting each annotation into a polygon. If `segmentation` is absent, 
-            the bounding box is converted into a rectangle polygon.
-            2. Computing the polygon intersection between the annotation and the tile.
-            3. Calculating the area of both the annotation polygon and the intersection polygon.
-            4. Computing the visibility ratio as intersection_area / annotation_area.
-            5. Including the annotation in the tile if the visibility ratio is 
+            1. Building the geometry table of the image annotations (`AnnotationGeometry`). If 
+            `segmentation` is absent, the bounding box is converted into a rectangle polygon.
+            2. Computing the tiles x annotations intersection-area matrix. Rectangles are 
+            intersected in one broadcasted pass, and pyclipper is only used for polygons 
+            crossing a tile edge.
+            3. Computing the visibility ratio as intersection_area / annotation_area.
+            4. Including the annotation in the tile if the visibility ratio is 
             greater than or equal to the configured `polygon_visibility_threshold`.
-            6. Adjusting the polygon coordinates of the intersection relative to the tile's top-left corner.
+            5. Adjusting the polygon coordinates of the intersection relative to the tile's top-left corner.
+
+        Tiles are processed in chunks so the matrix never holds more than `MAX_MATRIX_CELLS` entries.
 
         Inner helper functions:
-            - get_area(polygon): Calculates the absolute area of a polygon.
-            - get_intersection(polygon1, polygon2): Computes polygon intersection points 
-            using pyclipper.
             - adjust_polygon(tile_coordinates, polygon): Translates polygon points to be relative 
             to the tile coordinates.
 
@@ -110,27 +281,6 @@ class TileSelector():
                 - "label_indices" (List[int]): Category IDs corresponding to each assigned annotation.
         """
 
-        def get_area(polygon:List)->int:
-
-            polygon = np.array(polygon, dtype=np.float64).reshape(-1, 2).tolist()
-            area = abs(pyclipper.Area(polygon))
-
-            return area
-
-        def get_intersection(polygon1, polygon2)-> List:
-            
-            polygon1 = np.array(polygon1, dtype=np.float64).reshape(-1, 2).tolist()
-            polygon2 = np.array(polygon2, dtype=np.float64).reshape(-1, 2).tolist()
-
-            clipper = pyclipper.Pyclipper()
-            clipper.AddPath(polygon1, pyclipper.PT_SUBJECT, True)
-            clipper.AddPath(polygon2, pyclipper.PT_CLIP, True)
-
-            intersection = clipper.Execute(pyclipper.CT_INTERSECTION,
-                                       pyclipper.PFT_NONZERO,
-                                       pyclipper.PFT_NONZERO)
-            return intersection 
-
         def adjust_polygon(tile_coordinates: np.ndarray, polygon: List)-> List:
             
             adjusted_polygon = []
@@ -141,49 +291,121 @@ class TileSelector():
             
             return adjusted_polygon
 
+        geometry = self.__get_geometry()
+        clipper_calls = geometry.clipper_calls
+        tile_boxes = tile_boxes_from_coordinates(tiles)
+
+        chunk_size = max(1, MAX_MATRIX_CELLS // max(len(geometry), 1))
+
         tiles_annotations= []
 
-        for tile in tiles:
+        for chunk_start in range(0, len(tiles), chunk_size):
 
-            selected_annotation_ids = []
-            selected_polygons = []
-            selected_label_indices = []
+            chunk_boxes = tile_boxes[chunk_start:chunk_start + chunk_size]
 
-            for selected_id, image_annotation in enumerate(self.image_annotations):
-                
-                if not image_annotation.get('segmentation'):
-                    x_min, y_min, w, h =  image_annotation['bbox']
-                    polygon = [x_min, y_min, x_min+w, y_min, x_min+w, y_min+h, x_min, y_min+h]
-                else:    
-                    polygon = image_annotation['segmentation'][0]
-               
-                intersection = get_intersection(polygon, tile['coordinates'])
-                
+            intersection_areas, clipped = geometry.intersect(chunk_boxes)
+            visibility = geometry.visibility(intersection_areas)
 
-                polygon_area = get_area(polygon)   
-                intersection_area = get_area(intersection)
-                
-                polygon_visibility = intersection_area/polygon_area
+            for tile_index, tile_box in enumerate(chunk_boxes):
+
+                tile = tiles[chunk_start + tile_index]
+
+                selected_annotation_ids = []
+                selected_polygons = []
+                selected_label_indices = []
+
+                for selected_id in np.flatnonzero(visibility[tile_index] >= self.polygon_visibility_threshold).tolist():
 
-                if polygon_visibility >= self.polygon_visibility_threshold:
-                    
+                    intersection = geometry.intersection_path(selected_id, tile_index, tile_box, clipped)
                     adjusted_polygon = adjust_polygon(tile['coordinates'], intersection)
-                    
+
                     selected_polygons.append(adjusted_polygon)
                     selected_annotation_ids.append(selected_id)
-                    selected_label_indices.append(image_annotation['category_id'])
+                    selected_label_indices.append(geometry.label_indices[selected_id])
 
-            tile_annotations={
-                "tile_id" : tile['id'],
-                "selected_annotation_ids" : selected_annotation_ids,
-                "polygons" : selected_polygons,
-                "label_indices" : selected_label_indices}
-            
-            tiles_annotations.append(tile_annotations)
+                tile_annotations={
+                    "tile_id" : tile['id'],
+                    "selected_annotation_ids" : selected_annotation_ids,
+                    "polygons" : selected_polygons,
+                    "label_indices" : selected_label_indices}
+                
+                tiles_annotations.append(tile_annotations)
+
+        self.metrics.count("clipper_calls", geometry.clipper_calls - clipper_calls)
         
         return tiles_annotations
     
-    def __indentify_informative_tiles(self, tiles_annotations: List)-> List:
+    def __group_memberships(self, tiles: List)-> Tuple[List, List]:
+        """
+        Assigns image annotations to tiles like `__group_polygons`, without computing the 
+        tile polygons, for the compact result.
+
+        Returns:
+            Tuple[List, List]:
+                - The indices of the annotations assigned to every tile, as int64 arrays.
+                - For every tile, the pyclipper intersections of its chunk (`AnnotationGeometry.intersect`) 
+                and its row in the chunk, so the polygons of the selected tiles can be built 
+                afterwards without clipping again (`__build_compact`).
+        """
+        geometry = self.__get_geometry()
+        clipper_calls = geometry.clipper_calls
+        tile_boxes = tile_boxes_from_coordinates(tiles)
+
+        chunk_size = max(1, MAX_MATRIX_CELLS // max(len(geometry), 1))
+
+        memberships = []
+        clipped_rows = []
+
+        for chunk_start in range(0, len(tiles), chunk_size):
+
+            chunk_boxes = tile_boxes[chunk_start:chunk_start + chunk_size]
+
+            intersection_areas, clipped = geometry.intersect(chunk_boxes)
+            selected = geometry.visibility(intersection_areas) >= self.polygon_visibility_threshold
+
+            for tile_index in range(len(chunk_boxes)):
+                memberships.append(np.flatnonzero(selected[tile_index]))
+                clipped_rows.append((clipped, tile_index))
+
+        self.metrics.count("clipper_calls", geometry.clipper_calls - clipper_calls)
+
+        return memberships, clipped_rows
+
+    def __build_compact(self, tiles: List, selected_indices: List, memberships: List, clipped_rows: List)-> CompactTileResult:
+        """
+        Builds the `CompactTileResult` of the selected tiles, computing their polygons only.
+        """
+        geometry = self.__get_geometry()
+        label_indices = np.asarray(geometry.label_indices, dtype=np.int64).reshape(-1)
+
+        records = []
+        selected_memberships = []
+        polygons = []
+
+        for index in selected_indices:
+            x_start, y_start, x_end, _, _, y_end, _, _ = tiles[index]['coordinates']
+            tile_box = np.array([x_start, y_start, x_end, y_end], dtype=np.int64)
+            clipped, tile_index = clipped_rows[index]
+
+            records.append(TileRecord(tiles[index]['id'], (x_start, y_start, x_end, y_end)))
+            selected_memberships.append(memberships[index])
+
+            for annotation_id in memberships[index].tolist():
+                intersection = geometry.intersection_path(annotation_id, tile_index, tile_box, clipped)
+                points = np.asarray(intersection[0] if intersection else [], dtype=np.int64).reshape(-1, 2)
+                polygons.append((points - tile_box[:2]).reshape(-1))
+
+        annotation_ids = np.concatenate(selected_memberships).astype(np.int64) if selected_memberships else np.zeros(0, dtype=np.int64)
+        annotation_counts = [len(membership) for membership in selected_memberships]
+
+        return CompactTileResult(tiles=records,
+                                 annotation_offsets=np.concatenate(([0], np.cumsum(annotation_counts))).astype(np.int64),
+                                 annotation_ids=annotation_ids,
+                                 label_indices=label_indices[annotation_ids] if len(annotation_ids) else np.zeros(0, dtype=np.int64),
+                                 polygon_offsets=np.concatenate(([0], np.cumsum([len(polygon) for polygon in polygons]))).astype(np.int64),
+                                 polygon_coordinates=np.concatenate(polygons).astype(np.int64) if polygons else np.zeros(0, dtype=np.int64))
+
+    def __indentify_informative_tiles(self, tile_ids: List, memberships: List)-> List:
         """
         Selects a minimal subset of tiles that collectively cover all annotations.
 
@@ -192,42 +414,48 @@ class TileSelector():
 
             1. Initialize the set of uncovered annotation IDs to all annotations.
             2. At each iteration, select the tile that covers the largest number of currently 
-            uncovered annotations.
+            uncovered annotations (the first such tile on ties).
             3. Add the selected tile's ID to the list of chosen tiles.
             4. Remove the newly covered annotations from the uncovered set.
             5. Repeat until no uncovered annotations remain or no tile adds new coverage.
 
+        Coverage is stored as integer bitsets and gains are evaluated lazily (`lazy_greedy_cover`), 
+        so a tile is only re-scored when it reaches the top of the priority queue. The gain 
+        evaluations done and saved are stored in `self.selection_stats`.
+
+        In the "exact" selection mode the greedy selection is then improved to a minimum cover 
+        by branch-and-bound (`exact_cover`) within `time_budget`. `self.selection_stats` also 
+        holds the "greedy_tiles" count, the "exact_tiles" count, the explored "nodes" and 
+        whether the result is "optimal", and the tiles saved are counted in `self.metrics` 
+        as "tiles_saved_by_exact".
+
         Args:
-            tiles_annotations (List[dict]): List of tiles with their assigned annotation IDs, 
-                where each dictionary includes:
-                    - "tile_id": Tile identifier.
-                    - "selected_annotation_ids": List of annotation indices covered by the tile.
+            tile_ids (List[int]): Identifier of every candidate tile.
+            memberships (List[List[int]]): Indices of the annotations assigned to every 
+                candidate tile ("selected_annotation_ids").
 
         Returns:
             List[int]: List of tile IDs that cover all annotations with minimal redundancy.
         """
-        selected_tile_ids = []
-        remaining_ids = set(range(len(self.image_annotations)))
+        coverages = [to_bitset(annotation_ids) for annotation_ids in memberships]
+        universe = (1 << len(self.image_annotations)) - 1
 
-        while remaining_ids:
-            best_tile = None
-            best_new_coverage = set()
+        selected_indices, self.selection_stats = lazy_greedy_cover(coverages, universe)
 
-            for tile_annotations in tiles_annotations:
-                new_covered = set(tile_annotations["selected_annotation_ids"]) & remaining_ids
-                if len(new_covered) > len(best_new_coverage):
-                    best_new_coverage = new_covered
-                    best_tile = tile_annotations
+        if self.selection_mode == "exact":
+            selected_indices, exact_stats = exact_cover(coverages, universe, self.time_budget, initial=selected_indices)
 
-            if best_tile is None:
-                break  
+            self.selection_stats.update({"greedy_tiles": exact_stats['initial_sets'],
+                                         "exact_tiles": exact_stats['selected_sets'],
+                                         "nodes": exact_stats['nodes'],
+                                         "optimal": exact_stats['optimal']})
 
-            selected_tile_ids.append(best_tile['tile_id'])
-            remaining_ids -= best_new_coverage
+            self.metrics.count("tiles_saved_by_exact", exact_stats['initial_sets'] - exact_stats['selected_sets'])
+            self.metrics.count("non_optimal_selections", 0 if exact_stats['optimal'] else 1)
         
-        return selected_tile_ids
+        return [tile_ids[index] for index in selected_indices]
     
-    def run(self)->Dict:
+    def run(self, compact: bool = False):
         """
         Identifies and returns the minimal set of informative image tiles 
         that collectively cover all annotations in the input image.
@@ -240,20 +468,72 @@ class TileSelector():
             selection algorithm (`__indentify_informative_tiles`).
             4. Filters and returns only the selected tiles and their corresponding annotations.
 
+        The gain evaluations saved by the lazy greedy selection are available afterwards in 
+        `self.selection_stats`. Each step is timed in `self.metrics` ("tile_image", 
+        "group_polygons", "select_tiles", "crop_tiles"), which also counts the 
+        "candidate_tiles", "selected_tiles" and "clipper_calls".
+
+        With `compact`, the result is a `CompactTileResult` holding the same tiles and 
+        annotations in flat arrays, and the polygons are only computed for the selected tiles 
+        (timed as "build_result").
+
+        Args:
+            compact (bool): Return a `CompactTileResult` instead of the dict form.
+
         Returns:
             Dict: A dictionary containing:
                 - "tiles" (List[dict]): List of selected tiles, each with tile ID, image data, 
-                and tile polygon coordinates.
+                and tile polygon coordinates. Image data is only present when the selector 
+                was given an image, and only the selected tiles are cropped.
                 - "tiles_annotations" (List[dict]): Corresponding annotations assigned to 
                 each selected tile.
         """
-        tiles = self.__tile_image()
-        tiles_annotations = self.__group_polygons(tiles)
+        with self.metrics.stage("tile_image"):
+            tiles = self.__tile_image()
+
+        if compact:
+            return self.__run_compact(tiles)
+
+        with self.metrics.stage("group_polygons"):
+            tiles_annotations = self.__group_polygons(tiles)
 
-        filtered_indices = self.__indentify_informative_tiles(tiles_annotations)
+        with self.metrics.stage("select_tiles"):
+            filtered_indices = set(self.__indentify_informative_tiles([tile_annotations['tile_id'] for tile_annotations in tiles_annotations],
+                                                                      [tile_annotations['selected_annotation_ids'] for tile_annotations in tiles_annotations]))
         
         informative_tiles = [tile for tile in tiles if tile['id'] in filtered_indices]
         informative_tiles_annotations = [tile_annotations for tile_annotations in tiles_annotations if tile_annotations['tile_id'] in filtered_indices]
 
+        self.metrics.count("candidate_tiles", len(tiles))
+        self.metrics.count("selected_tiles", len(informative_tiles))
+
+        if self.image is not None and not isinstance(self.image, ImageSource):
+            with self.metrics.stage("crop_tiles"):
+                informative_tiles = crop_tiles(self.image, informative_tiles)
+
         return {"tiles":informative_tiles,
-                "tiles_annotations":informative_tiles_annotations}        
\ No newline at end of file
+                "tiles_annotations":informative_tiles_annotations}        
+
+    def __run_compact(self, tiles: List)-> CompactTileResult:
+
+        with self.metrics.stage("group_polygons"):
+            memberships, clipped_rows = self.__group_memberships(tiles)
+
+        with self.metrics.stage("select_tiles"):
+            # Selected tile ids are positions in `tiles`
+            selected_indices = sorted(self.__indentify_informative_tiles(list(range(len(tiles))),
+                                                                         [membership.tolist() for membership in memberships]))
+
+        with self.metrics.stage("build_result"):
+            result = self.__build_compact(tiles, selected_indices, memberships, clipped_rows)
+
+        self.metrics.count("candidate_tiles", len(tiles))
+        self.metrics.count("selected_tiles", len(result))
+
+        if self.image is not None and not isinstance(self.image, ImageSource):
+            with self.metrics.stage("crop_tiles"):
+                for tile in result.tiles:
+                    x_start, y_start, x_end, y_end = tile.box
+                    tile.data = self.image[y_start:y_end, x_start:x_end]
+
+        return result
@@ -0,0 +1,157 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List
+import numpy as np
+import cv2
+
+
+# Supported output codecs and the OpenCV quality flag each of them understands
+TILE_FORMATS = {"jpg": cv2.IMWRITE_JPEG_QUALITY,
+                "png": None,
+                "webp": cv2.IMWRITE_WEBP_QUALITY}
+
+
+def get_encode_params(tile_format: str = "jpg", quality: int = None, png_compression: int = None)-> List[int]:
+    """
+    Builds the `cv2.imencode` parameters of an output codec.
+
+    Args:
+        tile_format (str): One of "jpg", "png" or "webp".
+        quality (int): JPEG/WebP quality in [0, 100]. OpenCV's default is used when None.
+        png_compression (int): PNG compression level in [0, 9]. OpenCV's default is used when None.
+
+    Returns:
+        List[int]: Flat list of (flag, value) pairs for `cv2.imencode`.
+    """
+    if tile_format not in TILE_FORMATS:
+        raise ValueError(f"Unsupported tile format {tile_format}, expected one of {list(TILE_FORMATS)}.")
+
+    params = []
+
+    if quality is not None and TILE_FORMATS[tile_format] is not None:
+        params += [TILE_FORMATS[tile_format], int(quality)]
+    if png_compression is not None and tile_format == "png":
+        params += [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+
+    return params
+
+
+def encode_tile(data: np.ndarray, tile_format: str = "jpg", params: List[int] = None)-> bytes:
+    """
+    Encodes a tile in memory.
+
+    Args:
+        data (np.ndarray): Tile pixels.
+        tile_format (str): One of "jpg", "png" or "webp".
+        params (List[int]): Parameters from `get_encode_params`.
+
+    Returns:
+        bytes: Encoded image.
+    """
+    success, buffer = cv2.imencode(f".{tile_format}", data, params or [])
+
+    if not success:
+        raise IOError(f"Could not encode tile as {tile_format}.")
+
+    return buffer.tobytes()
+
+
+class TileWriter():
+
+    def __init__(self, tile_format: str = "jpg", quality: int = None, png_compression: int = None, num_threads: int = 4, max_pending: int = None)-> None:
+        """
+        Background stage that encodes and writes tiles on a bounded thread pool.
+
+        `cv2.imencode` and file writes release the GIL, so tile selection of the next image
+        carries on while the previous tiles are encoded. At most `max_pending` tiles wait in
+        the pool, and `submit` blocks beyond that. Memory held by queued tiles stays bounded.
+        `flush` is the barrier that waits for every submitted tile and re-raises the first
+        write error.
+
+        Args:
+            tile_format (str): One of "jpg", "png" or "webp".
+            quality (int): JPEG/WebP quality in [0, 100].
+            png_compression (int): PNG compression level in [0, 9].
+            num_threads (int): Number of encoding threads.
+            max_pending (int): Maximum number of queued tiles, twice the thread count by default.
+        """
+        self.tile_format = tile_format
+        self.params = get_encode_params(tile_format, quality, png_compression)
+
+        self.executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="tile-writer")
+        self.slots = threading.BoundedSemaphore(max_pending or 2 * num_threads)
+
+        # Futures not known to have succeeded, write errors are read from them by `flush`
+        self.lock = threading.Lock()
+        self.pending: List[Future] = []
+
+        self.bytes_written = 0
+
+    def __write(self, output_path: str, data: np.ndarray)-> None:
+
+        encoded = encode_tile(data, self.tile_format, self.params)
+
+        with open(output_path, 'wb') as f:
+            f.write(encoded)
+
+        with self.lock:
+            self.bytes_written += len(encoded)
+
+    def __done(self, future: Future)-> None:
+
+        self.slots.release()
+
+    def submit(self, output_path: str, data: np.ndarray)-> None:
+        """
+        Queues a tile to be encoded and written to `output_path`.
+        """
+        self.slots.acquire()
+
+        future = self.executor.submit(self.__write, output_path, data)
+        future.add_done_callback(self.__done)
+
+        with self.lock:
+            # Failed tiles stay until the next flush reports them
+            self.pending = [pending for pending in self.pending if not pending.done() or pending.exception() is not None]
+            self.pending.append(future)
+
+    def flush(self)-> None:
+        """
+        Waits until every submitted tile is on disk.
+
+        Raises:
+            Exception: The first error raised while encoding or writing a tile.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+
+        # Errors belong to the futures taken above, a later flush never sees them again
+        error = next((error for error in (future.exception() for future in pending) if error is not None), None)
+
+        if error is not None:
+            raise error
+
+    def close(self)-> None:
+        """
+        Flushes the remaining tiles and stops the threads.
+        """
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self)-> "TileWriter":
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback)-> None:
+
+        if exc_type is None:
+            self.close()
+            return
+
+        # An exception is already propagating, a write error must not replace it
+        self.executor.shutdown(wait=True)
+
+        with self.lock:
+            self.pending = []